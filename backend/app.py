@@ -1,60 +1,201 @@
 # app.py
 """
-FastAPI server that mirrors training encodings:
+FastAPI server that mirrors training encodings (same lookup tables as the trainer, see encoding.py):
 - gender: Male/Female → 1/0
 - binaries: yes/no/true/false/1/0
 - radon_exposure: Low/Medium/High → one-hot (radon_low, radon_medium, radon_high)
 - alcohol_consumption: None/Moderate/Heavy → one-hot (alcohol_none, alcohol_moderate, alcohol_heavy)
 - age & pack_years standardized by saved scaler
+  (see inference.py: features are written straight into a float32 buffer, no pandas)
+
+Endpoints:
+- POST /predict        one PatientInput
+  (?explain=true, also on /predict/batch: exact TreeSHAP per input, see explain.py)
+  (BATCHING=1: concurrent /predict calls are micro-batched, see batcher.py)
+- POST /predict/batch  JSON array or NDJSON of PatientInput; scored as one vectorized batch
+                       (at most BATCH_MAX_ROWS rows, also for /predict/packed; 413 above)
+- POST /predict/packed fixed-width binary records of pre-encoded features in, float32 risks out
+                       (no JSON, no per-field parsing; format + client helper in packed.py / client.py)
+- POST /predict/cohort?group_by=&threshold=&pi_deploy=&quantile=   CSV, NDJSON or packed cohort, streamed
+                       through the scorer -> grouped counts over thresholds, mean + quantiles of
+                       risk_percentage (raw and per pi_deploy); no per-patient rows (see cohort.py)
+- POST /predict/sweep  one PatientInput + 1-2 axes (age/pack_years ranges, levels, pi_deploy list, …)
+                       -> whole risk curve/surface from one model call
+- GET  /cache/stats    hit/miss/eviction counters of the p_raw cache (CACHE_MAX_SIZE, CACHE_TTL_SECONDS)
+- GET  /monitor/drift?model_version=   live inputs + p_raw vs the training profile (PSI / KS, see drift.py)
+- GET  /models         loaded versions, active version, shadow + hot-reload stats (see registry.py)
+- POST /models/load?name=<dir under models/ | live>[&activate=true]
+- POST /models/activate?version=   atomic swap, no restart
+- POST /models/shadow?version=     shadow-score active traffic with a candidate (omit to stop)
+- POST /models/unload?version=
+- GET  /metrics        Prometheus text format: request/stage latency histograms, batch sizes, cache,
+                       process CPU/RSS (METRICS=0 turns the hot-path timers off, see metrics.py)
+- POST /admin/profile?seconds=&interval_ms=   folded stacks of the live worker (PROFILER_ENABLED=1)
+  (admin calls -- /models/load|activate|shadow|unload, /cache/invalidate, /admin/profile -- need
+   X-Admin-Token when ADMIN_TOKEN is set)
+/predict, /predict/batch, /predict/packed and /predict/cohort score with ?model_version= or the X-Model-Version header when given.
+The live artifacts are re-loaded and activated when they change (MODEL_WATCH_SECONDS, 0 = off);
+the live version they replace is unloaded unless it is being shadowed.
+
+Scoring runs on a fixed pool of INFERENCE_THREADS per worker, xgboost on BOOSTER_THREADS; both
+(and the worker count) are sized to the container's CPU quota, see serving.py.
+
+Registry, caches, metrics, profiler and drift monitor are per process: run one worker (the default)
+unless admin calls and /metrics reaching a single worker per request is acceptable.
 
 Run:
   uvicorn app:app --reload --port 8000
+  python serving.py --serve --port 8000     # threads from the CPU budget or serving_config.json
+  uvicorn app:app --workers 4 --port 8000   # model_compact.bin pages are shared; admin/metrics are per worker
 """
-from typing import Optional, Any, Dict
-import os, json
-import joblib
-import pandas as pd
-from fastapi import FastAPI, Query
-from pydantic import BaseModel
+from typing import Optional, Any, Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import os, json, asyncio, threading, time
+
+import serving
+# workers x inference threads x booster threads for this CPU budget (serving.py); the OMP/BLAS
+# thread counts only take effect when set before numpy / xgboost start their thread pools
+SERVING = serving.resolve()
+serving.apply_thread_env(SERVING)
+
+import numpy as np
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from pydantic import BaseModel, ValidationError
 from fastapi.middleware.cors import CORSMiddleware
 
+from batcher import MicroBatcher, QueueFullError
+from cache import PredictionCache
+from cohort import (DEFAULT_QUANTILES, DEFAULT_THRESHOLDS, MAX_GROUPS, CohortAggregator, CohortError, CohortReader,
+                    engine_columns as cohort_engine_columns, format_for)
+from drift import DriftMonitor
+from encoding import FIELDS, parse_record, parse_records
+from inference import prior_adjust_array, prior_adjust_grid
+from packed import (RECORD_DTYPE, RESPONSE_CONTENT_TYPE, PackedFormatError, check_content_type, decode_records,
+                    engine_columns)
+from metrics import SIZE_BUCKETS, CallbackCounter, Counter, Gauge, Histogram, MetricsRegistry, StackSampler
+from registry import (ArtifactWatcher, ModelRegistry, ModelVersion, ShadowScorer,
+                      artifact_signature, load_version)
+
 BASE_DIR = os.path.dirname(__file__)
-SCALER_PATH = os.path.join(BASE_DIR, "scaler.pkl")
-MODEL_PATH  = os.path.join(BASE_DIR, "model.pkl")
-META_PATH   = os.path.join(BASE_DIR, "meta.json")
-
-missing = [p for p in [SCALER_PATH, MODEL_PATH] if not os.path.exists(p)]
-if missing:
-    raise FileNotFoundError(f"Missing artifacts: {', '.join(os.path.basename(p) for p in missing)}")
-
-scaler = joblib.load(SCALER_PATH)
-model  = joblib.load(MODEL_PATH)
-
-meta: Dict[str, Any] = {}
-if os.path.exists(META_PATH):
-    with open(META_PATH, "r") as f:
-        meta = json.load(f)
-
-FEATURE_ORDER = meta.get("feature_order") or [
-    # fallback if meta missing (shouldn’t happen once you retrain)
-    "age","pack_years","gender","asbestos_exposure","secondhand_smoke_exposure",
-    "copd_diagnosis","family_history",
-    "radon_low","radon_medium","radon_high",
-    "alcohol_none","alcohol_moderate","alcohol_heavy",
-]
-NUMERIC_COLS   = meta.get("numeric_cols", ["age","pack_years"])
-BINARY_COLS    = meta.get("binary_cols", ["gender","asbestos_exposure","secondhand_smoke_exposure","copd_diagnosis","family_history"])
-ONE_HOT_COLS   = meta.get("one_hot_cols", ["radon_low","radon_medium","radon_high","alcohol_none","alcohol_moderate","alcohol_heavy"])
-RADON_LEVELS   = meta.get("radon_levels", ["low","medium","high"])
-ALCOHOL_LEVELS = meta.get("alcohol_levels", ["none","moderate","heavy"])
-PI_TRAIN = float(meta.get("pi_train")) if "pi_train" in meta else None
-
-# Optional override
+MODELS_DIR = os.getenv("MODELS_DIR") or os.path.join(BASE_DIR, "models")
+
+# Optional override (applies to every loaded version)
+PI_TRAIN_OVERRIDE: Optional[float] = None
 _env_pi_train = os.getenv("PI_TRAIN", "")
 if _env_pi_train:
-    try: PI_TRAIN = float(_env_pi_train)
+    try: PI_TRAIN_OVERRIDE = float(_env_pi_train)
     except: pass
 
+# Predictor: "model" = CalibratedClassifierCV, "fused" = fused.py kernel (model.pkl only for big batches),
+# "table" = exact risk_table.py lookup (risk_table.npz from `lungcancer.py --build-table`, built from model.pkl),
+# "auto" = fused when model_fused.npz was built from model.pkl
+PREDICTOR = os.getenv("PREDICTOR", "auto").strip().lower()
+FUSED_MAX_ROWS = int(os.getenv("FUSED_MAX_ROWS", "32"))
+# /predict/sweep grids use an up-to-date risk_table.npz when present (exact, ~1 ms per 10k points)
+SWEEP_TABLE = os.getenv("SWEEP_TABLE", "1").strip().lower() in ("1", "true", "yes", "on")
+# Serve from an up-to-date model_compact.bin (memory-mapped, shared by all workers, no sklearn/xgboost
+# import until model.pkl is needed); COMPACT_ARTIFACT=0 always unpickles
+COMPACT_ARTIFACT = os.getenv("COMPACT_ARTIFACT", "1").strip().lower() in ("1", "true", "yes", "on")
+
+# Without an up-to-date model_explain.npz the TreeSHAP tables are compiled (~10 s) on a background
+# thread right after a version loads, so no explain=true request pays for it; EXPLAIN_WARMUP=0
+# defers compiling to the first explain=true request instead
+EXPLAIN_WARMUP = os.getenv("EXPLAIN_WARMUP", "1").strip().lower() in ("1", "true", "yes", "on")
+
+def _load(path: str, version: Optional[str] = None) -> ModelVersion:
+    mv = load_version(path, version, PREDICTOR, FUSED_MAX_ROWS, PI_TRAIN_OVERRIDE, SWEEP_TABLE, COMPACT_ARTIFACT,
+                      SERVING.booster_threads)
+    if mv.has_compiled_explainer:
+        mv.explainer  # compiled tables load (or map) in well under a second
+    elif EXPLAIN_WARMUP:
+        threading.Thread(target=lambda: mv.explainer, name=f"explain-compile-{mv.version}", daemon=True).start()
+    return mv
+
+# Versioned artifact sets: the live directory (active at startup, MODEL_VERSION names it,
+# default = model.pkl digest) plus every models/<version>/ directory.
+registry = ModelRegistry()
+registry.add(_load(BASE_DIR, os.getenv("MODEL_VERSION") or None), activate=True)
+if os.path.isdir(MODELS_DIR):
+    for _name in sorted(os.listdir(MODELS_DIR)):
+        if os.path.exists(os.path.join(MODELS_DIR, _name, "model.pkl")):
+            registry.add(_load(os.path.join(MODELS_DIR, _name), _name))
+
+# Hot reload: poll the live directory every MODEL_WATCH_SECONDS (0 disables)
+MODEL_WATCH_SECONDS = float(os.getenv("MODEL_WATCH_SECONDS", "5"))
+watcher = ArtifactWatcher(BASE_DIR, registry.active.signature)
+
+# Shadow scoring of live traffic with a candidate version (SHADOW_VERSION or POST /models/shadow)
+shadow = ShadowScorer(int(os.getenv("SHADOW_MAX_PENDING", "8")))
+if os.getenv("SHADOW_VERSION"):
+    shadow.set_version(registry.get(os.getenv("SHADOW_VERSION")))
+
+# Admin endpoints (/models/*, /cache/invalidate, /admin/profile) require X-Admin-Token when ADMIN_TOKEN is set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Raw-probability cache keyed on (model version, predictor artifact digest, encoded row); CACHE_MAX_SIZE=0 disables it
+CACHE_MAX_SIZE = int(os.getenv("CACHE_MAX_SIZE", "10000"))
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "3600"))
+cache = PredictionCache(CACHE_MAX_SIZE, CACHE_TTL_SECONDS) if CACHE_MAX_SIZE > 0 else None
+# explain=true contributions, same keys as the p_raw cache
+explain_cache = PredictionCache(CACHE_MAX_SIZE, CACHE_TTL_SECONDS) if CACHE_MAX_SIZE > 0 else None
+
+# --------- metrics ----------
+# METRICS=0 turns the per-stage timers and request middleware off (/metrics still renders process stats)
+METRICS = os.getenv("METRICS", "1").strip().lower() in ("1", "true", "yes", "on")
+# POST /admin/profile stack sampling is off unless PROFILER_ENABLED=1
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "0").strip().lower() in ("1", "true", "yes", "on")
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+metrics = MetricsRegistry()
+REQUESTS = metrics.register(Counter("http_requests_total", "HTTP requests by route template and status.",
+                                    ("method", "route", "status")))
+REQUEST_SECONDS = metrics.register(Histogram("http_request_duration_seconds", "HTTP request latency by route template.",
+                                             ("method", "route")))
+STAGE_SECONDS = metrics.register(Histogram("predict_stage_seconds",
+                                           "Scoring pipeline stage latency (parse, encode, predict, model, explain, adjust, build, sweep, cohort).",
+                                           ("stage", "model_version")))
+BATCH_ROWS = metrics.register(Histogram("predict_batch_rows", "Rows per scoring call (after micro-batching).",
+                                        ("model_version",), SIZE_BUCKETS))
+MODEL_ROWS = metrics.register(Histogram("predict_model_rows", "Rows per model call (cache misses only).",
+                                        ("model_version",), SIZE_BUCKETS))
+ROWS_SCORED = metrics.register(Counter("predict_rows_total", "Rows scored.", ("model_version", "explain")))
+sampler = StackSampler()
+
+def _invalidate_caches(version: str) -> None:
+    """Drop the cached p_raw / contributions of a version that was (re)loaded or unloaded."""
+    if cache is not None:
+        cache.invalidate(version)
+        explain_cache.invalidate(version)
+
+def _forget_version(mv: ModelVersion) -> None:
+    """Drop what the server keeps about an unloaded version (shadow, caches, drift window)."""
+    if shadow.version is mv:
+        shadow.set_version(None)
+    _invalidate_caches(mv.version)
+    if monitor is not None:
+        monitor.forget(mv.version)
+
+def _retire_superseded(mv: ModelVersion) -> List[str]:
+    """Unload the live versions a reload of mv replaced (models/<version>/ sets and a version
+    under shadow traffic stay); returns their names."""
+    retired = registry.retire_superseded(mv, protect=(shadow.version,) if shadow.version is not None else ())
+    for old in retired:
+        _forget_version(old)
+    return [old.version for old in retired]
+
+def _observe(stage: str, mv: ModelVersion, seconds: float) -> None:
+    if METRICS:
+        STAGE_SECONDS.observe(seconds, stage, mv.version)
+
+# Drift monitor over scored traffic (DRIFT_MONITOR=0 disables); updates happen off the request path
+DRIFT_MONITOR = os.getenv("DRIFT_MONITOR", "1").strip().lower() in ("1", "true", "yes", "on")
+monitor = DriftMonitor(
+    float(os.getenv("DRIFT_WINDOW_SECONDS", "3600")), int(os.getenv("DRIFT_SLOTS", "12")),
+    int(os.getenv("DRIFT_MAX_PENDING", "10000")),
+) if DRIFT_MONITOR else None
+
 PI_DEPLOY = os.getenv("PI_DEPLOY", "")
 try: PI_DEPLOY = float(PI_DEPLOY) if PI_DEPLOY else None
 except: PI_DEPLOY = None
@@ -74,50 +215,107 @@ def prior_adjust(p: float, pi_train: float, pi_deploy: float) -> float:
     base = (pi_deploy / (1.0 - pi_deploy)) / (pi_train / (1.0 - pi_train))
     return _clip01((odds * base) / (1.0 + (odds * base)))
 
-# --------- parsers mirrored from training ----------
-def parse_yesno(v: Any) -> int:
-    if v is None: return 0
-    if isinstance(v, bool): return 1 if v else 0
-    s = str(v).strip().lower()
-    if s in {"1","y","Yes","true","t"}: return 1
-    if s in {"0","n","No","false","f"}: return 0
+# --------------- API -----------------
+# Every scoring call runs on this fixed pool (SERVING.inference_threads), not on the shared
+# anyio threadpool: concurrent requests queue here instead of oversubscribing the CPUs
+inference_executor = ThreadPoolExecutor(max_workers=SERVING.inference_threads, thread_name_prefix="inference")
+
+async def _run_inference(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(inference_executor, fn, *args)
+
+# Micro-batching of concurrent /predict calls (BATCHING=1): one model call per window
+BATCHING = os.getenv("BATCHING", "0").strip().lower() in ("1", "true", "yes", "on")
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "64"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "2"))
+BATCH_MAX_QUEUE = int(os.getenv("BATCH_MAX_QUEUE", "1024"))
+batcher: Optional[MicroBatcher] = None
+
+async def _watch_artifacts() -> None:
+    """Reload the live directory when its artifacts change and swap it in as the active version."""
+    while True:
+        await asyncio.sleep(MODEL_WATCH_SECONDS)
+        if not watcher.poll():
+            continue
+        sig = artifact_signature(BASE_DIR)
+        try:
+            mv = await run_in_threadpool(_load, BASE_DIR)
+        except Exception as e:
+            watcher.mark_failed(e)
+            print(f"Model reload failed, still serving {registry.active.version}: {e}", flush=True)
+            continue
+        registry.add(mv, activate=True)
+        _invalidate_caches(mv.version)
+        watcher.mark_loaded(sig)
+        retired = _retire_superseded(mv)
+        print(f"Model reloaded: active version {mv.version}"
+              + (f" (unloaded {', '.join(retired)})" if retired else ""), flush=True)
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    global batcher
+    if BATCHING:
+        batcher = MicroBatcher(_score_items, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, BATCH_MAX_QUEUE,
+                               executor=inference_executor)
+        await batcher.start()
+    watch_task = asyncio.create_task(_watch_artifacts()) if MODEL_WATCH_SECONDS > 0 else None
+    if monitor is not None:
+        monitor.start()
     try:
-        return 1 if float(s) >= 0.5 else 0
-    except:
-        return 0
-
-def parse_gender(v: Any) -> int:
-    s = str(v).strip().lower()
-    if s in {"Male","m","1"}:   return 1
-    if s in {"Female","f","0"}: return 0
-    return parse_yesno(v)
-
-def norm_radon(v: Any) -> str:
-    s = str(v).strip().lower()
-    if s in {"Low","l"}: return "Low"
-    if s in {"Medium","med","Mid","m"}: return "Medium"
-    if s in {"High","h"}: return "High"
-    if s in {"None","no","0","nil","null","n/a","na",""}: return "Low"  # 3-bucket scheme
-    return "Low"
-
-def norm_alcohol(v: Any) -> str:
-    s = str(v).strip().lower()
-    if s in {"None","no","0","nil","null","n/a","na",""}: return "None"
-    if s in {"Moderate","mod","Medium","light","low"}:    return "Moderate"
-    if s in {"Heavy","High","yes","1"}:                   return "Heavy"
-    return "none"
-
-def parse_float(val: Any, default: float = 0.0) -> float:
-    try: return float(val)
-    except: return default
+        yield
+    finally:
+        if watch_task is not None:
+            watch_task.cancel()
+        if monitor is not None:
+            monitor.stop()
+        if batcher is not None:
+            await batcher.stop()
+            batcher = None
+        shadow.shutdown()
 
-# --------------- API -----------------
-app = FastAPI(title="Lung Cancer Risk API (Calibrated XGBoost)", version="2.3")
+app = FastAPI(title="Lung Cancer Risk API (Calibrated XGBoost)", version="2.4", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware, allow_origins=["*"], allow_credentials=True,
     allow_methods=["*"], allow_headers=["*"],
 )
 
+class MetricsMiddleware:
+    """Pure ASGI (no BaseHTTPMiddleware task/stream overhead): counts and times every HTTP request,
+    labelled by route template so /predict?model_version=… does not explode the series."""
+
+    def __init__(self, app):
+        self.app = app
+        self._paths: Dict[Any, str] = {}
+
+    def _route(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        path = self._paths.get(endpoint)
+        if path is None:
+            path = next((r.path for r in scope["app"].routes if getattr(r, "endpoint", None) is endpoint), "unmatched")
+            self._paths[endpoint] = path
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS:
+            return await self.app(scope, receive, send)
+        t0 = time.perf_counter()
+        status = [500]
+
+        async def send_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            route = self._route(scope)
+            REQUESTS.inc(1, scope["method"], route, str(status[0]))
+            REQUEST_SECONDS.observe(time.perf_counter() - t0, scope["method"], route)
+
+app.add_middleware(MetricsMiddleware)
+
 class PatientInput(BaseModel):
     age: Any
     pack_years: Any
@@ -129,86 +327,651 @@ class PatientInput(BaseModel):
     alcohol_consumption: Any         # expect "none|moderate|heavy" (case-insensitive)
     family_history: Any
 
+def _parse_patient(p: PatientInput) -> Dict[str, Any]:
+    """Parse & normalize one patient's raw values (the `inputs_used` block; tables in encoding.py)."""
+    return parse_record(p.__dict__)
+
+def _resolve_version(query_version: Optional[str], header_version: Optional[str]) -> ModelVersion:
+    """?model_version= wins over the X-Model-Version header; neither = the active version."""
+    name = query_version or header_version
+    try:
+        return registry.get(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown model version: {name}")
+
+def _resolve_pi_deploy(mv: ModelVersion, pi_deploy: Optional[float]):
+    use_pi_deploy = pi_deploy if (pi_deploy is not None) else PI_DEPLOY
+    used_adjustment = (mv.pi_train is not None) and (use_pi_deploy is not None) and (0.0 < use_pi_deploy < 1.0)
+    return use_pi_deploy, used_adjustment
+
+def _build_result(mv: ModelVersion, parsed: Dict[str, Any], p_raw: float, p_adj: Optional[float],
+                  use_pi_deploy: Optional[float], used_adjustment: bool,
+                  contrib: Optional[np.ndarray] = None) -> Dict[str, Any]:
+    p_main = p_adj if used_adjustment else p_raw
+    result = {
+        "model": mv.model_name,
+        "model_version": mv.version,
+        "risk_percentage": _to_percent(p_main),
+        "raw_risk_percentage": _to_percent(p_raw),
+        "adjusted_risk_percentage": _to_percent(p_adj) if p_adj is not None else None,
+        "adjusted_for_prevalence": used_adjustment,
+        "pi_train": mv.pi_train,
+        "pi_deploy": use_pi_deploy,
+        "inputs_used": parsed,
+    }
+    if contrib is not None:
+        result["explanation"] = {
+            "method": "treeshap",
+            "units": "log-odds, mean over fold boosters (before isotonic calibration)",
+            "expected_value": mv.explainer.expected_value,
+            "contributions": dict(zip(mv.explainer.input_names, contrib.tolist())),
+        }
+    return result
+
+def _predict_model(mv: ModelVersion, x: np.ndarray) -> np.ndarray:
+    t0 = time.perf_counter()
+    p = mv.engine.predict_raw(x)
+    if METRICS:
+        STAGE_SECONDS.observe(time.perf_counter() - t0, "model", mv.version)
+        MODEL_ROWS.observe(len(x), mv.version)
+    return p
+
+def _predict_encoded(mv: ModelVersion, x: np.ndarray) -> np.ndarray:
+    """p_raw for encoded rows; only cache misses reach the model."""
+    if cache is None:
+        return _predict_model(mv, x)
+    keys = [(mv.version, mv.predictor_digest, row.tobytes()) for row in x]
+    hits = cache.get_many(keys)
+    miss = [i for i, v in enumerate(hits) if v is None]
+    p_raw = np.array([v if v is not None else 0.0 for v in hits], dtype=float)
+    if miss:
+        p_miss = _predict_model(mv, x[miss])
+        p_raw[miss] = p_miss
+        cache.put_many([(keys[i], float(p)) for i, p in zip(miss, p_miss)])
+    return p_raw
+
+def _explain_encoded(mv: ModelVersion, x: np.ndarray) -> np.ndarray:
+    """(n, n_inputs) TreeSHAP contributions for encoded rows; cached like p_raw."""
+    if explain_cache is None:
+        return mv.explainer.contributions(x)
+    keys = [(mv.version, mv.predictor_digest, row.tobytes()) for row in x]
+    hits = explain_cache.get_many(keys)
+    miss = [i for i, v in enumerate(hits) if v is None]
+    out = np.empty((len(x), len(mv.explainer.input_names)), dtype=float)
+    for i, v in enumerate(hits):
+        if v is not None:
+            out[i] = v
+    if miss:
+        c_miss = mv.explainer.contributions(x[miss])
+        out[miss] = c_miss
+        explain_cache.put_many([(keys[i], c) for i, c in zip(miss, c_miss)])
+    return out
+
+def _score_rows(mv: ModelVersion, parsed: List[Dict[str, Any]], pi_deploys: List[Optional[float]],
+                shadowed: bool = True, explain: bool = False) -> List[Dict[str, Any]]:
+    """Encode, scale, predict and prevalence-adjust parsed rows as array ops (pi_deploy per row)."""
+    if not parsed:
+        return []
+    # encode straight into the engine's float32 buffer, predict raw prob (calibrated to training prior)
+    t0 = time.perf_counter()
+    x = mv.engine.encode_batch(parsed)
+    t1 = time.perf_counter()
+    p_raw = _predict_encoded(mv, x)
+    t2 = time.perf_counter()
+    contrib = _explain_encoded(mv, x) if explain else None
+    if METRICS:
+        STAGE_SECONDS.observe(t1 - t0, "encode", mv.version)
+        STAGE_SECONDS.observe(t2 - t1, "predict", mv.version)
+        if explain:
+            STAGE_SECONDS.observe(time.perf_counter() - t2, "explain", mv.version)
+        BATCH_ROWS.observe(len(parsed), mv.version)
+        ROWS_SCORED.inc(len(parsed), mv.version, "true" if explain else "false")
+    if shadowed:
+        shadow.submit(mv, x, p_raw)  # copies x; the buffer is reused by the next call
+    if monitor is not None:
+        monitor.submit(mv.version, mv.drift_reference, x, p_raw)  # copy + deque append, folded in later
+
+    # optional prevalence adjustment, one array op per distinct pi_deploy
+    results: List[Optional[Dict[str, Any]]] = [None] * len(parsed)
+    groups: Dict[Optional[float], List[int]] = {}
+    for i, pi in enumerate(pi_deploys):
+        groups.setdefault(pi, []).append(i)
+    t_adjust = t_build = 0.0
+    for pi, idx in groups.items():
+        t0 = time.perf_counter()
+        use_pi_deploy, used_adjustment = _resolve_pi_deploy(mv, pi)
+        p_adj = prior_adjust_array(p_raw[idx], mv.pi_train, use_pi_deploy) if used_adjustment else None
+        t1 = time.perf_counter()
+        for j, i in enumerate(idx):
+            results[i] = _build_result(mv, parsed[i], float(p_raw[i]), float(p_adj[j]) if p_adj is not None else None,
+                                       use_pi_deploy, used_adjustment, contrib[i] if contrib is not None else None)
+        t_adjust += t1 - t0
+        t_build += time.perf_counter() - t1
+    _observe("adjust", mv, t_adjust)
+    _observe("build", mv, t_build)
+    return results
+
+def _score_batch(mv: ModelVersion, parsed: List[Dict[str, Any]], pi_deploy: Optional[float],
+                 shadowed: bool = True, explain: bool = False) -> List[Dict[str, Any]]:
+    return _score_rows(mv, parsed, [pi_deploy] * len(parsed), shadowed, explain)
+
+def _score_items(items: List[Tuple[Dict[str, Any], Optional[float], ModelVersion, bool, bool]]) -> List[Dict[str, Any]]:
+    """MicroBatcher callback: (parsed row, pi_deploy, version, shadowed, explain) per queued /predict request."""
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    groups: Dict[Tuple[int, bool, bool], List[int]] = {}
+    for i, (_, _, mv, shadowed, explain) in enumerate(items):
+        groups.setdefault((id(mv), shadowed, explain), []).append(i)
+    for idx in groups.values():
+        _, _, mv, shadowed, explain = items[idx[0]]
+        scored = _score_rows(mv, [items[i][0] for i in idx], [items[i][1] for i in idx], shadowed, explain)
+        for i, res in zip(idx, scored):
+            results[i] = res
+    return results
+
 @app.post("/predict")
-def predict_risk(
+async def predict_risk(
     p: PatientInput,
     pi_deploy: Optional[float] = Query(
         default=None, description="Override deployment prevalence (0..1), e.g., 0.002 for 0.2%"
     ),
+    model_version: Optional[str] = Query(default=None, description="Score with this loaded version instead of the active one"),
+    x_model_version: Optional[str] = Header(default=None),
+    explain: bool = Query(default=False, description="Add per-input TreeSHAP contributions (log-odds)"),
 ):
-    # 1) parse & normalize incoming values
-    age = parse_float(p.age, 0.0)
-    pack_years = parse_float(p.pack_years, 0.0)
-
-    gender  = parse_gender(p.gender)
-    asbestos = parse_yesno(p.asbestos_exposure)
-    second  = parse_yesno(p.secondhand_smoke_exposure)
-    copd    = parse_yesno(p.copd_diagnosis)
-    family  = parse_yesno(p.family_history)
-
-    radon_level   = norm_radon(p.radon_exposure)         # low/medium/high
-    alcohol_level = norm_alcohol(p.alcohol_consumption)  # none/moderate/heavy
-
-    # 2) build one-hot vectors for radon & alcohol with the exact trained columns
-    radon_cols   = [f"radon_{lvl}" for lvl in RADON_LEVELS]
-    alcohol_cols = [f"alcohol_{lvl}" for lvl in ALCOHOL_LEVELS]
-
-    radon_oh = {c: 0 for c in radon_cols}
-    alc_oh   = {c: 0 for c in alcohol_cols}
-    radon_key = f"radon_{radon_level}" if f"radon_{radon_level}" in radon_oh else "radon_low"
-    alco_key  = f"alcohol_{alcohol_level}" if f"alcohol_{alcohol_level}" in alc_oh else "alcohol_none"
-    radon_oh[radon_key] = 1
-    alc_oh[alco_key] = 1
-
-    # 3) standardize numeric features using saved scaler
-    numeric_df = pd.DataFrame([[age, pack_years]], columns=NUMERIC_COLS)
-    numeric_scaled = scaler.transform(numeric_df)
-    age_s, pack_s = float(numeric_scaled[0, NUMERIC_COLS.index("age")]), float(numeric_scaled[0, NUMERIC_COLS.index("pack_years")])
-
-    # 4) assemble the full feature vector in training order
-    features = {
-        "age": age_s,
-        "pack_years": pack_s,
-        "gender": int(gender),
-        "asbestos_exposure": int(asbestos),
-        "secondhand_smoke_exposure": int(second),
-        "copd_diagnosis": int(copd),
-        "family_history": int(family),
-        **radon_oh,
-        **alc_oh,
-    }
+    mv = _resolve_version(model_version, x_model_version)
+    shadowed = not (model_version or x_model_version)  # only active-version traffic is shadowed
+    t0 = time.perf_counter()
+    parsed = _parse_patient(p)
+    _observe("parse", mv, time.perf_counter() - t0)
+    if batcher is None:
+        return (await _run_inference(_score_batch, mv, [parsed], pi_deploy, shadowed, explain))[0]
+    try:
+        return await batcher.submit((parsed, pi_deploy, mv, shadowed, explain))
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
 
-    # ensure all expected columns exist (and only those)
-    for k in FEATURE_ORDER:
-        if k not in features:
-            features[k] = 0
-    x_df = pd.DataFrame([features])[FEATURE_ORDER]
+NDJSON_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonlines"}
 
-    # 5) predict raw prob (calibrated to training prior)
-    p_raw = _clip01(float(model.predict_proba(x_df)[0, 1]))
+class _RowError(str):
+    """Marker for rows that failed before validation (e.g. bad NDJSON line)."""
 
-    # 6) optional prevalence adjustment
-    use_pi_deploy = pi_deploy if (pi_deploy is not None) else PI_DEPLOY
-    used_adjustment = (PI_TRAIN is not None) and (use_pi_deploy is not None) and (0.0 < use_pi_deploy < 1.0)
-    p_adj = prior_adjust(p_raw, PI_TRAIN, use_pi_deploy) if used_adjustment else None
-    p_main = p_adj if used_adjustment else p_raw
+def _read_batch_rows(body: bytes, content_type: str) -> List[Any]:
+    """JSON array (or {"patients": [...]}) or NDJSON -> raw rows; undecodable NDJSON lines become errors."""
+    if content_type.split(";")[0].strip().lower() in NDJSON_TYPES:
+        rows: List[Any] = []
+        for line in body.decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            try: rows.append(json.loads(line))
+            except ValueError as e: rows.append(_RowError(f"invalid JSON: {e}"))
+        return rows
+    try:
+        data = json.loads(body or b"[]")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON body: {e}")
+    if isinstance(data, dict) and isinstance(data.get("patients"), list):
+        data = data["patients"]
+    if not isinstance(data, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of PatientInput objects (or NDJSON)")
+    return data
+
+# Row cap for /predict/batch and /predict/packed (both buffer the whole body): 413 above it.
+# JSON bodies are refused early once they exceed BATCH_MAX_ROWS x BATCH_ROW_BYTES bytes,
+# packed bodies once they exceed BATCH_MAX_ROWS records; /predict/cohort streams instead
+BATCH_MAX_ROWS = int(os.getenv("BATCH_MAX_ROWS", "10000"))
+BATCH_ROW_BYTES = int(os.getenv("BATCH_ROW_BYTES", "2048"))
+
+def _too_large(detail: str) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"{detail} (use /predict/cohort for whole populations)")
+
+async def _read_body(request: Request, max_bytes: int, limit: str) -> bytes:
+    """The request body, refused with 413 as soon as Content-Length or the bytes received exceed max_bytes."""
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > max_bytes:
+        raise _too_large(f"Body of {int(length)} bytes exceeds {limit}")
+    parts: List[bytes] = []
+    size = 0
+    async for data in request.stream():
+        size += len(data)
+        if size > max_bytes:
+            raise _too_large(f"Body exceeds {limit}")
+        parts.append(data)
+    return b"".join(parts)
+
+@app.post("/predict/batch")
+async def predict_batch(
+    request: Request,
+    pi_deploy: Optional[float] = Query(
+        default=None, description="Override deployment prevalence (0..1), e.g., 0.002 for 0.2%"
+    ),
+    model_version: Optional[str] = Query(default=None, description="Score with this loaded version instead of the active one"),
+    x_model_version: Optional[str] = Header(default=None),
+    explain: bool = Query(default=False, description="Add per-input TreeSHAP contributions (log-odds)"),
+):
+    """Score many patients in one call: JSON array or NDJSON (Content-Type: application/x-ndjson)."""
+    mv = _resolve_version(model_version, x_model_version)
+    shadowed = not (model_version or x_model_version)
+    body = await _read_body(request, BATCH_MAX_ROWS * BATCH_ROW_BYTES,
+                            f"{BATCH_MAX_ROWS * BATCH_ROW_BYTES} bytes (BATCH_MAX_ROWS x BATCH_ROW_BYTES)")
+    rows = _read_batch_rows(body, request.headers.get("content-type", ""))
+    del body
+    if len(rows) > BATCH_MAX_ROWS:
+        raise _too_large(f"{len(rows)} rows exceed BATCH_MAX_ROWS={BATCH_MAX_ROWS}")
 
-    model_name = getattr(getattr(model, "estimator", model), "__class__", type(model)).__name__
+    valid: List[Dict[str, Any]] = []
+    ok_idx: List[int] = []
+    errors: List[Dict[str, Any]] = []
+    t0 = time.perf_counter()
+    for i, row in enumerate(rows):
+        if isinstance(row, _RowError):
+            errors.append({"index": i, "error": str(row)})
+            continue
+        if not isinstance(row, dict):
+            errors.append({"index": i, "error": "row is not a JSON object"})
+            continue
+        try:
+            valid.append(PatientInput(**row).__dict__)
+            ok_idx.append(i)
+        except ValidationError as e:
+            errors.append({"index": i, "error": "; ".join(
+                f"{'.'.join(str(l) for l in err['loc'])}: {err['msg']}" for err in e.errors()
+            )})
+    parsed = parse_records(valid)  # column by column, each distinct value parsed once
+    _observe("parse", mv, time.perf_counter() - t0)
+
+    scored = await _run_inference(_score_batch, mv, parsed, pi_deploy, shadowed, explain)
+    results: List[Optional[Dict[str, Any]]] = [None] * len(rows)
+    for i, res in zip(ok_idx, scored):
+        results[i] = res
     return {
-        "model": model_name,
-        "risk_percentage": _to_percent(p_main),
-        "raw_risk_percentage": _to_percent(p_raw),
-        "adjusted_risk_percentage": _to_percent(p_adj) if p_adj is not None else None,
-        "adjusted_for_prevalence": used_adjustment,
-        "pi_train": PI_TRAIN,
-        "pi_deploy": use_pi_deploy,
-        "inputs_used": {
-            "age": age, "pack_years": pack_years, "gender": gender,
-            "asbestos_exposure": asbestos, "secondhand_smoke_exposure": second,
-            "copd_diagnosis": copd, "family_history": family,
-            "radon_level": radon_level, "alcohol_level": alcohol_level
-        },
+        "count": len(rows),
+        "ok": len(ok_idx),
+        "failed": len(errors),
+        "results": results,
+        "errors": errors,
+    }
+
+# --------------- packed binary protocol -----------------
+def _score_packed(mv: ModelVersion, rec: np.ndarray, pi_deploy: Optional[float], shadowed: bool):
+    """Decoded records -> (float32 risks, response headers). No p_raw cache: its per-row keys
+    would cost more than the model at the batch sizes this endpoint is for."""
+    t0 = time.perf_counter()
+    x = mv.engine.encode_coded(engine_columns(rec))
+    t1 = time.perf_counter()
+    p_raw = _predict_model(mv, x) if len(x) else np.empty(0)
+    if METRICS:
+        STAGE_SECONDS.observe(t1 - t0, "encode", mv.version)
+        STAGE_SECONDS.observe(time.perf_counter() - t1, "predict", mv.version)
+        BATCH_ROWS.observe(len(x), mv.version)
+        ROWS_SCORED.inc(len(x), mv.version, "false")
+    if len(x) and shadowed:
+        shadow.submit(mv, x, p_raw)
+    if len(x) and monitor is not None:
+        monitor.submit(mv.version, mv.drift_reference, x, p_raw)
+    use_pi_deploy, used_adjustment = _resolve_pi_deploy(mv, pi_deploy)
+    risk = prior_adjust_array(p_raw, mv.pi_train, use_pi_deploy) if used_adjustment else p_raw
+    headers = {
+        "X-Model-Version": mv.version,
+        "X-Rows": str(len(x)),
+        "X-Risk": "adjusted" if used_adjustment else "raw",
+        "X-Pi-Train": "" if mv.pi_train is None else repr(mv.pi_train),
+        "X-Pi-Deploy": "" if use_pi_deploy is None else repr(use_pi_deploy),
     }
+    return np.asarray(risk, dtype="<f4").tobytes(), headers
+
+@app.post("/predict/packed")
+async def predict_packed(
+    request: Request,
+    pi_deploy: Optional[float] = Query(
+        default=None, description="Override deployment prevalence (0..1), e.g., 0.002 for 0.2%"
+    ),
+    model_version: Optional[str] = Query(default=None, description="Score with this loaded version instead of the active one"),
+    x_model_version: Optional[str] = Header(default=None),
+):
+    """Packed records in, packed float32 risks out (wire format: packed.py)."""
+    mv = _resolve_version(model_version, x_model_version)
+    shadowed = not (model_version or x_model_version)
+    body = await _read_body(request, BATCH_MAX_ROWS * RECORD_DTYPE.itemsize,
+                            f"BATCH_MAX_ROWS={BATCH_MAX_ROWS} records of {RECORD_DTYPE.itemsize} bytes")
+    t0 = time.perf_counter()
+    try:
+        check_content_type(request.headers.get("content-type", ""))
+        rec = decode_records(body)  # a view of the body, not a copy
+    except PackedFormatError as e:
+        raise HTTPException(status_code=e.status, detail=str(e))
+    _observe("parse", mv, time.perf_counter() - t0)
+    content, headers = await _run_inference(_score_packed, mv, rec, pi_deploy, shadowed)
+    return Response(content=content, media_type=RESPONSE_CONTENT_TYPE, headers=headers)
+
+# --------------- cohort aggregation -----------------
+COHORT_CHUNK_ROWS = int(os.getenv("COHORT_CHUNK_ROWS", "4096"))
+COHORT_MAX_GROUPS = int(os.getenv("COHORT_MAX_GROUPS", str(MAX_GROUPS)))
+
+def _feed_cohort(mv: ModelVersion, agg: CohortAggregator, reader: CohortReader, data: Optional[bytes]) -> None:
+    """One piece of the body (None: end of body) -> parsed chunks -> model -> histograms.
+    Cohort rows are not live traffic: no shadow scoring, no drift monitor."""
+    t0 = time.perf_counter()
+    chunks = reader.close() if data is None else reader.feed(data)
+    _observe("parse", mv, time.perf_counter() - t0)
+    for cols in chunks:
+        t0 = time.perf_counter()
+        x = mv.engine.encode_coded(cohort_engine_columns(cols))
+        t1 = time.perf_counter()
+        p_raw = _predict_model(mv, x)
+        t2 = time.perf_counter()
+        agg.update(cols, p_raw)
+        if METRICS:
+            STAGE_SECONDS.observe(t1 - t0, "encode", mv.version)
+            STAGE_SECONDS.observe(t2 - t1, "predict", mv.version)
+            STAGE_SECONDS.observe(time.perf_counter() - t2, "cohort", mv.version)
+            BATCH_ROWS.observe(len(x), mv.version)
+            ROWS_SCORED.inc(len(x), mv.version, "false")
+
+@app.post("/predict/cohort")
+async def predict_cohort(
+    request: Request,
+    group_by: str = Query(default="", description="Comma-separated: gender, radon_exposure, alcohol_consumption, "
+                                                  "asbestos_exposure, secondhand_smoke_exposure, copd_diagnosis, "
+                                                  "family_history, age_band"),
+    threshold: Optional[List[float]] = Query(default=None, description="risk_percentage cut-offs, repeatable (default 1, 5, 10)"),
+    pi_deploy: Optional[List[float]] = Query(
+        default=None, description="Deployment prevalences to summarize the adjusted risk at, repeatable (default PI_DEPLOY)"
+    ),
+    quantile: Optional[List[float]] = Query(default=None, description="Quantiles in 0..1, repeatable (default 0.5, 0.9, 0.99)"),
+    model_version: Optional[str] = Query(default=None, description="Score with this loaded version instead of the active one"),
+    x_model_version: Optional[str] = Header(default=None),
+):
+    """Grouped risk summaries of a whole cohort, read and scored chunk by chunk as the body streams in."""
+    mv = _resolve_version(model_version, x_model_version)
+    if pi_deploy is None:
+        pi_deploy = [PI_DEPLOY] if PI_DEPLOY is not None and 0.0 < PI_DEPLOY < 1.0 else []
+    try:
+        agg = CohortAggregator([g.strip() for g in group_by.split(",") if g.strip()],
+                               DEFAULT_THRESHOLDS if threshold is None else threshold, pi_deploy, mv.pi_train,
+                               DEFAULT_QUANTILES if quantile is None else quantile, COHORT_MAX_GROUPS)
+        reader = CohortReader(format_for(request.headers.get("content-type", "")), COHORT_CHUNK_ROWS)
+        async for data in request.stream():
+            if data:
+                await _run_inference(_feed_cohort, mv, agg, reader, data)
+        await _run_inference(_feed_cohort, mv, agg, reader, None)
+    except (CohortError, PackedFormatError) as e:
+        raise HTTPException(status_code=e.status, detail=str(e))
+    except UnicodeDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Body is not UTF-8: {e}")
+    return JSONResponse({
+        "model": mv.model_name,
+        "model_version": mv.version,
+        "rows": reader.rows,
+        "ok": reader.rows - reader.failed,
+        "failed": reader.failed,
+        "errors": reader.errors,
+        **agg.report(),
+    })
+
+# --------------- what-if sweep -----------------
+SWEEP_MAX_POINTS = int(os.getenv("SWEEP_MAX_POINTS", "40000"))
+SWEEP_MAX_NUM = 1000  # points per start/stop/num axis
+
+# PatientInput field -> (parsed-row key, encoder); "pi_deploy" is handled after the model call
+SWEEP_FIELDS = FIELDS
+RANGE_FIELDS = ("age", "pack_years", "pi_deploy")
+
+class SweepAxis(BaseModel):
+    field: str                       # a PatientInput field or "pi_deploy"
+    values: Optional[List[Any]] = None
+    start: Optional[float] = None    # numeric fields: values = linspace(start, stop, num)
+    stop: Optional[float] = None
+    num: Optional[int] = None
+
+class SweepRequest(BaseModel):
+    patient: PatientInput
+    axes: List[SweepAxis]
+
+def _axis_values(mv: ModelVersion, axis: SweepAxis) -> List[Any]:
+    if axis.field not in SWEEP_FIELDS and axis.field != "pi_deploy":
+        raise HTTPException(status_code=422, detail=f"Unknown sweep field: {axis.field}")
+    if axis.values is not None:
+        values = list(axis.values)
+    elif axis.start is not None and axis.stop is not None and axis.num is not None:
+        if axis.field not in RANGE_FIELDS:
+            raise HTTPException(status_code=422, detail=f"start/stop/num only applies to {', '.join(RANGE_FIELDS)}")
+        if not (1 <= axis.num <= SWEEP_MAX_NUM):
+            raise HTTPException(status_code=422, detail=f"num must be in 1..{SWEEP_MAX_NUM}")
+        values = np.linspace(axis.start, axis.stop, axis.num).tolist()
+    elif axis.field == "radon_exposure":
+        values = list(mv.radon_levels)
+    elif axis.field == "alcohol_consumption":
+        values = list(mv.alcohol_levels)
+    elif axis.field in RANGE_FIELDS:
+        raise HTTPException(status_code=422, detail=f"{axis.field} axis needs values or start/stop/num")
+    else:
+        values = [0, 1]
+    if not values:
+        raise HTTPException(status_code=422, detail=f"{axis.field} axis is empty")
+    if axis.field == "pi_deploy":
+        try: values = [float(v) for v in values]
+        except (TypeError, ValueError): raise HTTPException(status_code=422, detail="pi_deploy values must be numbers")
+    return values
+
+def _score_sweep(mv: ModelVersion, base: Dict[str, Any], axes: List[Tuple[str, List[Any]]],
+                 pi_deploy: Optional[float]) -> Dict[str, Any]:
+    """Whole grid as one encoded batch + one model call; pi_deploy axes are one broadcast prior adjustment."""
+    t0 = time.perf_counter()
+    parsed = {f: vals if f == "pi_deploy" else SWEEP_FIELDS[f][1].encode(vals).tolist() for f, vals in axes}
+    model_axes = [(SWEEP_FIELDS[f][0], parsed[f]) for f, _ in axes if f != "pi_deploy"]
+    pi_pos = next((k for k, (f, _) in enumerate(axes) if f == "pi_deploy"), None)
+    shape = [len(v) for _, v in axes]
+
+    x = mv.engine.encode_grid(base, model_axes)
+    p_raw = mv.sweep_raw(x)
+    if pi_pos is None:
+        use_pi_deploy, used = _resolve_pi_deploy(mv, pi_deploy)
+        p_main = prior_adjust_array(p_raw, mv.pi_train, use_pi_deploy) if used else p_raw
+        pi_info = {"pi_deploy": use_pi_deploy, "adjusted_for_prevalence": used}
+    else:
+        pis = axes[pi_pos][1]
+        model_shape = [len(v) for _, v in model_axes]
+        grid = prior_adjust_grid(p_raw, mv.pi_train, pis).reshape(model_shape + [len(pis)])
+        p_main = np.moveaxis(grid, -1, pi_pos).ravel()
+        p_raw = np.moveaxis(np.broadcast_to(p_raw.reshape(model_shape + [1]), grid.shape), -1, pi_pos).ravel()
+        pi_info = {"pi_deploy": pis,
+                   "adjusted_for_prevalence": [mv.pi_train is not None and 0.0 < pi < 1.0 for pi in pis]}
+
+    def surface(p: np.ndarray):
+        # _to_percent on distinct values only (the model is piecewise constant, grids repeat a lot)
+        uniq, inv = np.unique(p, return_inverse=True)
+        pct = np.array([_to_percent(v) for v in uniq.tolist()], dtype=float)
+        return pct[inv].reshape(shape).tolist()
+
+    result = {
+        "model": mv.model_name,
+        "model_version": mv.version,
+        "pi_train": mv.pi_train,
+        **pi_info,
+        "axes": [{"field": f, "values": vals, "parsed": parsed[f]} for f, vals in axes],
+        "shape": shape,
+        "risk_percentage": surface(p_main),
+        "raw_risk_percentage": surface(p_raw),
+        "inputs_used": base,
+    }
+    _observe("sweep", mv, time.perf_counter() - t0)
+    if METRICS:
+        BATCH_ROWS.observe(len(x), mv.version)
+    return result
+
+@app.post("/predict/sweep")
+async def predict_sweep(
+    req: SweepRequest,
+    pi_deploy: Optional[float] = Query(
+        default=None, description="Deployment prevalence when pi_deploy is not one of the axes"
+    ),
+    model_version: Optional[str] = Query(default=None, description="Score with this loaded version instead of the active one"),
+    x_model_version: Optional[str] = Header(default=None),
+):
+    """Risk curve (1 axis) or surface (2 axes) for one patient with some inputs varied."""
+    mv = _resolve_version(model_version, x_model_version)
+    if not 1 <= len(req.axes) <= 2:
+        raise HTTPException(status_code=422, detail="Give one or two axes")
+    if len({a.field for a in req.axes}) != len(req.axes):
+        raise HTTPException(status_code=422, detail="Axes must vary different fields")
+    axes = [(a.field, _axis_values(mv, a)) for a in req.axes]
+    n_points = int(np.prod([len(v) for _, v in axes]))
+    if n_points > SWEEP_MAX_POINTS:
+        raise HTTPException(status_code=422, detail=f"Grid has {n_points} points (max {SWEEP_MAX_POINTS})")
+    # plain lists/floats only: skip jsonable_encoder, which dominates for 10k-point surfaces
+    return JSONResponse(await _run_inference(_score_sweep, mv, _parse_patient(req.patient), axes, pi_deploy))
+
+@app.get("/cache/stats")
+def cache_stats():
+    if cache is None:
+        return {"enabled": False}
+    mv = registry.active
+    return {"enabled": True, "model_version": mv.version, "predictor": mv.predictor_name, **cache.stats(),
+            "explain": explain_cache.stats()}
+
+@app.post("/cache/invalidate")
+def cache_invalidate(
+    version: Optional[str] = Query(default=None, description="Only drop entries of this model version"),
+    x_admin_token: Optional[str] = Header(default=None),
+):
+    _require_admin(x_admin_token)
+    if cache is None:
+        return {"enabled": False, "dropped": 0}
+    return {"enabled": True, "dropped": cache.invalidate(version) + explain_cache.invalidate(version)}
+
+# --------------- metrics -----------------
+def _model_gauge() -> Dict[Tuple, float]:
+    active = registry.active
+    return {(v["version"], v["predictor"]): 1.0 if v["version"] == active.version else 0.0
+            for v in registry.info()["versions"]}
+
+def _cache_stats(*keys: str) -> Dict[Tuple, float]:
+    out: Dict[Tuple, float] = {}
+    for name, c in (("predict", cache), ("explain", explain_cache)):
+        if c is not None:
+            st = c.stats()
+            for key in keys:
+                out[(name,) if len(keys) == 1 else (name, key)] = st[key]
+    return out
+
+def _batcher_gauge() -> Dict[Tuple, float]:
+    return {(): batcher.depth} if batcher is not None else {}
+
+metrics.register(Gauge("model_loaded", "Loaded model versions (1 = active).", ("model_version", "predictor"), _model_gauge))
+metrics.register(Gauge("prediction_cache_entries", "Prediction cache entries.", ("cache",), lambda: _cache_stats("size")))
+metrics.register(CallbackCounter("prediction_cache_events_total", "Prediction cache lookups and removals.", ("cache", "event"),
+                                 lambda: _cache_stats("hits", "misses", "evictions", "expirations", "invalidations")))
+metrics.register(Gauge("batcher_queue_depth", "Requests waiting for the micro-batcher.", (), _batcher_gauge))
+metrics.register(Gauge("drift_psi", "PSI of live traffic vs the training profile (drift window).",
+                       ("model_version", "feature"), lambda: monitor.psi_by_feature() if monitor is not None else {}))
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.post("/admin/profile")
+async def profile(
+    seconds: float = Query(default=10.0, gt=0),
+    interval_ms: float = Query(default=5.0, ge=1.0, le=1000.0),
+    x_admin_token: Optional[str] = Header(default=None),
+):
+    """Sample the worker's Python stacks for `seconds` while it keeps serving; returns folded stacks
+    (flamegraph.pl / speedscope / inferno input). Off unless PROFILER_ENABLED=1."""
+    _require_admin(x_admin_token)
+    if not PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiler disabled (set PROFILER_ENABLED=1)")
+    if seconds > PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=422, detail=f"seconds must be <= {PROFILE_MAX_SECONDS:g}")
+    try:
+        folded, info = await run_in_threadpool(sampler.sample, seconds, interval_ms / 1000.0)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(folded, headers={f"X-Profile-{k.replace('_', '-').title()}": f"{v:g}" for k, v in info.items()})
+
+@app.get("/monitor/drift")
+def drift_report(model_version: Optional[str] = Query(default=None, description="Default: the active version")):
+    if monitor is None:
+        return {"enabled": False}
+    mv = _resolve_version(model_version, None)
+    out: Dict[str, Any] = {"enabled": True, "model_version": mv.version, "monitor": monitor.stats()}
+    if mv.drift_reference is None:
+        out["detail"] = "No drift_reference.json for this version (retrain with lungcancer.py to create it)"
+        return out
+    report = monitor.report(mv.version)
+    out.update(report if report is not None else {"detail": "No traffic scored with this version yet"})
+    return out
+
+# --------------- model registry (admin) -----------------
+def _require_admin(token: Optional[str]) -> None:
+    if ADMIN_TOKEN and token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid or missing X-Admin-Token")
+
+def _registry_info() -> Dict[str, Any]:
+    return {**registry.info(), "shadow": shadow.stats(),
+            "watch": {"interval_seconds": MODEL_WATCH_SECONDS, **watcher.stats()}}
+
+@app.get("/models")
+def list_models():
+    return _registry_info()
+
+@app.post("/models/load")
+async def load_model(
+    name: str = Query(..., description="Directory under models/ to load, or 'live' to re-read the artifacts next to app.py"),
+    activate: bool = Query(default=False),
+    x_admin_token: Optional[str] = Header(default=None),
+):
+    """Load an artifact set (in a worker thread; serving continues) and optionally make it active."""
+    _require_admin(x_admin_token)
+    if name == "live":
+        path, version = BASE_DIR, None
+    else:
+        if os.path.basename(name) != name or name in ("", ".", ".."):
+            raise HTTPException(status_code=400, detail="name must be a directory name under models/")
+        path, version = os.path.join(MODELS_DIR, name), name
+    try:
+        mv = await run_in_threadpool(_load, path, version)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    registry.add(mv, activate=activate)
+    _invalidate_caches(mv.version)
+    if name == "live":
+        watcher.mark_loaded(mv.signature)
+        if activate:
+            _retire_superseded(mv)
+    return _registry_info()
+
+@app.post("/models/activate")
+def activate_model(version: str = Query(...), x_admin_token: Optional[str] = Header(default=None)):
+    _require_admin(x_admin_token)
+    try:
+        registry.activate(version)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown model version: {version}")
+    return _registry_info()
+
+@app.post("/models/shadow")
+def shadow_model(
+    version: Optional[str] = Query(default=None, description="Candidate to shadow-score active traffic with; omit to stop"),
+    x_admin_token: Optional[str] = Header(default=None),
+):
+    _require_admin(x_admin_token)
+    try:
+        shadow.set_version(registry.get(version) if version else None)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown model version: {version}")
+    return _registry_info()
+
+@app.post("/models/unload")
+def unload_model(version: str = Query(...), x_admin_token: Optional[str] = Header(default=None)):
+    _require_admin(x_admin_token)
+    try:
+        mv = registry.remove(version)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown model version: {version}")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    _forget_version(mv)
+    return _registry_info()
 
 @app.get("/")
 def root():
@@ -216,19 +979,27 @@ def root():
 
 @app.get("/model-info")
 def model_info():
-    model_name = getattr(getattr(model, "estimator", model), "__class__", type(model)).__name__
+    mv = registry.active
     return {
-        "feature_order": FEATURE_ORDER,
-        "numeric_cols": NUMERIC_COLS,
-        "binary_cols": BINARY_COLS,
-        "one_hot_cols": ONE_HOT_COLS,
-        "radon_levels": RADON_LEVELS,
-        "alcohol_levels": ALCOHOL_LEVELS,
-        "binary_meaning": meta.get("binary_meaning"),
-        "pi_train": PI_TRAIN,
+        "feature_order": mv.feature_order,
+        "numeric_cols": mv.numeric_cols,
+        "binary_cols": mv.binary_cols,
+        "one_hot_cols": mv.one_hot_cols,
+        "radon_levels": mv.radon_levels,
+        "alcohol_levels": mv.alcohol_levels,
+        "binary_meaning": mv.meta.get("binary_meaning"),
+        "pi_train": mv.pi_train,
         "pi_deploy": PI_DEPLOY,
         "notes": "Server parses strings; standardizes age & pack_years; builds one-hot for radon/alcohol to match training.",
-        "model_class": model_name,
-        "calibration_method": meta.get("calibration_method", "isotonic"),
-        "model_family": meta.get("model_family", "XGBoost"),
+        "model_class": mv.model_name,
+        "calibration_method": mv.meta.get("calibration_method", "isotonic"),
+        "model_family": mv.meta.get("model_family", "XGBoost"),
+        "predictor": mv.predictor_name,
+        "model_version": mv.version,
+        "active_version": mv.version,
+        "loaded_versions": registry.versions(),
+        "registry": _registry_info(),
+        "batching": batcher.stats() if batcher is not None else None,
+        "serving": SERVING.as_dict(),
+        "evaluation": mv.evaluation,  # test-split operating points, bootstrap CIs, reliability (evaluation.py)
     }
@@ -0,0 +1,107 @@
+"""
+Input encoding throughput (encoding.py): per-value parsing vs the factorize + lookup-table path.
+
+For each corpus ("clean": the handful of spellings real clients send, "fuzzed":
+encoding.fuzz_records, thousands of distinct junk values) and --rows:
+- per column: normalize + look up every value (the old per-cell way) vs `encode` on a Python
+  list, a NumPy array and a pandas `category` Series (how read_raw_csv loads text columns)
+- API: parse_record one row at a time (/predict) vs parse_records on the whole batch
+  (/predict/batch)
+and checks every variant gives the same values.
+
+  python benchmarks/bench_encoding.py [--rows 1000 100000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import encoding
+
+CLEAN = {
+    "age": [34, 61.5, "47", 70],
+    "pack_years": [0, 12.5, 30, "20.0"],
+    "gender": ["Male", "Female", "M", "f"],
+    "asbestos_exposure": ["Yes", "No", 1, 0, True],
+    "secondhand_smoke_exposure": ["Yes", "No", "yes", "no"],
+    "copd_diagnosis": ["Yes", "No", 1, 0],
+    "family_history": ["Yes", "No", "Y", "N"],
+    "radon_exposure": ["Low", "Medium", "High", "med"],
+    "alcohol_consumption": ["None", "Moderate", "Heavy", "light"],
+}
+
+def clean_records(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    picks = {f: rng.integers(0, len(v), n) for f, v in CLEAN.items()}
+    return [{f: CLEAN[f][int(picks[f][i])] for f in CLEAN} for i in range(n)]
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def bench_columns(records, repeat: int) -> dict:
+    import pandas as pd
+
+    n = len(records)
+    out = {}
+    for field, enc in encoding.ENCODERS.items():
+        values = [r[field] for r in records]
+        as_text = np.array([str(v) for v in values])
+        series = pd.Series(as_text, dtype="category")
+        ref = np.array([enc.parse(v) for v in values], dtype=enc.dtype)
+        ok = (np.array_equal(enc.encode(values), ref)
+              and np.array_equal(enc.encode(as_text), enc.encode(series))
+              and np.array_equal(enc.encode(as_text), np.array([enc.parse(v) for v in as_text], dtype=enc.dtype)))
+        t_cell = best_of(lambda: [enc._lookup(v) for v in values], repeat)
+        t_list = best_of(lambda: enc.encode(values), repeat)
+        t_array = best_of(lambda: enc.encode(as_text), repeat)
+        t_series = best_of(lambda: enc.encode(series), repeat)
+        out[field] = {
+            "distinct": len({(type(v), str(v)) for v in values}),
+            "per_value_rows_per_s": round(n / t_cell),
+            "list_rows_per_s": round(n / t_list),
+            "array_rows_per_s": round(n / t_array),
+            "category_series_rows_per_s": round(n / t_series),
+            "identical": bool(ok),
+        }
+    return out
+
+def bench_api(records, repeat: int) -> dict:
+    n = len(records)
+    k = min(n, 2000)
+    single = [encoding.parse_record(r) for r in records[:k]]
+    batch = encoding.parse_records(records)
+    t_single = best_of(lambda: [encoding.parse_record(r) for r in records[:k]], repeat)
+    t_batch = best_of(lambda: encoding.parse_records(records), repeat)
+    return {
+        "parse_record_us": round(t_single / k * 1e6, 2),
+        "parse_records_us_per_row": round(t_batch / n * 1e6, 3),
+        "parse_records_rows_per_s": round(n / t_batch),
+        "identical": single == batch[:k],
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the shared input encoders.")
+    ap.add_argument("--rows", type=int, nargs="+", default=[1000, 100_000])
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    for corpus, make in (("clean", clean_records), ("fuzzed", encoding.fuzz_records)):
+        for n in args.rows:
+            records = make(n)
+            print(json.dumps({"corpus": corpus, "rows": n, "api": bench_api(records, args.repeat)}), flush=True)
+            for field, res in bench_columns(records, args.repeat).items():
+                print(json.dumps({"corpus": corpus, "rows": n, "column": field, **res}), flush=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Latency of the fused predictor vs model.predict_proba (single row + batches).
+
+Uses the artifacts next to app.py (model.pkl, model_fused.npz):
+  python benchmarks/bench_fused.py [--batches 1,10,100,1000,10000] [--repeat 50]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from fused import FusedPredictor  # noqa: E402
+
+def random_features(n: int, n_features: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    X = np.zeros((n, n_features), dtype=np.float32)
+    X[:, :2] = rng.normal(0.0, 1.5, size=(n, 2))
+    X[:, 2:7] = rng.integers(0, 2, size=(n, 5))
+    X[np.arange(n), 7 + rng.integers(0, 3, n)] = 1.0
+    X[np.arange(n), 10 + rng.integers(0, 3, n)] = 1.0
+    return X
+
+def timeit(fn, repeat: int) -> dict:
+    fn()  # warm-up
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    s = np.array(samples) * 1e3
+    return {"p50_ms": round(float(np.percentile(s, 50)), 4), "p99_ms": round(float(np.percentile(s, 99)), 4)}
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--batches", default="1,10,100,1000,10000")
+    ap.add_argument("--repeat", type=int, default=50)
+    args = ap.parse_args()
+
+    model = joblib.load(os.path.join(BACKEND_DIR, "model.pkl"))
+    fused = FusedPredictor.load(os.path.join(BACKEND_DIR, "model_fused.npz"))
+
+    rows = []
+    for n in [int(b) for b in args.batches.split(",")]:
+        X = random_features(n, fused.n_features, seed=n)
+        repeat = max(3, args.repeat if n <= 1000 else args.repeat // 10)
+        ref = timeit(lambda: model.predict_proba(X), repeat)
+        got = timeit(lambda: fused.predict_proba(X), repeat)
+        diff = float(np.max(np.abs(model.predict_proba(X)[:, 1] - fused.predict_proba(X)[:, 1])))
+        rows.append({
+            "batch": n,
+            "model_p50_ms": ref["p50_ms"], "model_p99_ms": ref["p99_ms"],
+            "fused_p50_ms": got["p50_ms"], "fused_p99_ms": got["p99_ms"],
+            "speedup_p50": round(ref["p50_ms"] / max(got["p50_ms"], 1e-9), 2),
+            "fused_rows_per_s": round(n / (got["p50_ms"] / 1e3)),
+            "max_abs_diff": diff,
+        })
+        print(json.dumps(rows[-1]), flush=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Training-data ingestion: legacy per-cell parsing vs vectorized lungcancer.load_dataframe.
+
+Writes a synthetic CSV (5M rows by default) with messy spellings, then loads it once
+with each implementation in a fresh subprocess and reports rows/s and peak RSS, and
+checks that both produce the same encoded matrix and labels.
+
+  python benchmarks/bench_ingest.py [--rows 5000000] [--csv /tmp/lung_bench.csv]
+"""
+import argparse
+import hashlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+def write_synthetic_csv(path: str, rows: int, seed: int = 0, chunk: int = 500_000) -> None:
+    rng = np.random.default_rng(seed)
+    yes = np.array(["Yes", "No", "yes", "no", "1", "0", "TRUE", "false", " Y "])
+    sex = np.array(["Male", "Female", "M", "F", "male", "female"])
+    radon = np.array(["Low", "Medium", "High", "med", "H", "", "None"])
+    alcohol = np.array(["None", "Moderate", "Heavy", "light", "no", "heavy"])
+    target = np.array(["Yes", "No", "1", "0", "positive", "negative"])
+    for start in range(0, rows, chunk):
+        n = min(chunk, rows - start)
+        df = pd.DataFrame({
+            "patient_id": np.arange(start, start + n),
+            "age": rng.integers(18, 95, n),
+            "gender": sex[rng.integers(0, len(sex), n)],
+            "pack_years": np.round(rng.gamma(2.0, 10.0, n), 1),
+            "radon_exposure": radon[rng.integers(0, len(radon), n)],
+            "asbestos_exposure": yes[rng.integers(0, len(yes), n)],
+            "secondhand_smoke_exposure": yes[rng.integers(0, len(yes), n)],
+            "copd_diagnosis": yes[rng.integers(0, len(yes), n)],
+            "alcohol_consumption": alcohol[rng.integers(0, len(alcohol), n)],
+            "family_history": yes[rng.integers(0, len(yes), n)],
+            "lung_cancer": target[rng.integers(0, len(target), n)],
+        })
+        df.to_csv(path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+
+def legacy_load_dataframe(csv_path: str):
+    """The pre-vectorization load_dataframe (per-cell .apply / .map), minus the logging."""
+    import encoding
+    import lungcancer as lc
+
+    df = pd.read_csv(csv_path)
+    for col in ["patient_id", "id", "uuid"]:
+        if col in df.columns:
+            df = df.drop(columns=[col])
+    df[lc.TARGET] = df[lc.TARGET].apply(encoding.TARGET.parse).astype(int)
+    df["gender"] = df["gender"].apply(encoding.GENDER.parse).astype(int)
+    for c in [c for c in lc.BINARY_COLS if c != "gender"]:
+        df[c] = df[c].apply(encoding.YESNO.parse).astype(int)
+    for c in lc.NUMERIC_COLS:
+        df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0.0).astype(float)
+    df["radon_norm"] = df["radon_exposure"].map(encoding.RADON.parse)
+    df["alcohol_norm"] = df["alcohol_consumption"].map(encoding.ALCOHOL.parse)
+    radon_oh = pd.get_dummies(df["radon_norm"], prefix="radon", dtype=int).reindex(
+        columns=[f"radon_{lvl}" for lvl in lc.RADON_LEVELS], fill_value=0
+    )
+    alcohol_oh = pd.get_dummies(df["alcohol_norm"], prefix="alcohol", dtype=int).reindex(
+        columns=[f"alcohol_{lvl}" for lvl in lc.ALCOHOL_LEVELS], fill_value=0
+    )
+    X = pd.concat([df[lc.NUMERIC_COLS], df[lc.BINARY_COLS], radon_oh, alcohol_oh], axis=1)
+    return X, df[lc.TARGET].astype(int)
+
+def _digest(X: pd.DataFrame, y: pd.Series) -> str:
+    h = hashlib.sha1()
+    h.update(np.ascontiguousarray(X.to_numpy(dtype=np.float64)).tobytes())
+    h.update(np.ascontiguousarray(y.to_numpy(dtype=np.int64)).tobytes())
+    h.update(",".join(X.columns).encode())
+    return h.hexdigest()
+
+def run_one(impl: str, csv_path: str) -> dict:
+    """Runs in a child process so peak RSS is per implementation."""
+    import contextlib, io
+
+    os.environ["LUNG_CANCER_CSV"] = csv_path
+    import lungcancer as lc
+
+    lc.CSV_PATH = csv_path
+    t0 = time.perf_counter()
+    if impl == "legacy":
+        X, y = legacy_load_dataframe(csv_path)
+    else:
+        with contextlib.redirect_stdout(io.StringIO()):
+            X, y, _, _ = lc.load_dataframe()
+    dt = time.perf_counter() - t0
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # before the digest copies
+    return {
+        "impl": impl,
+        "rows": len(X),
+        "seconds": round(dt, 2),
+        "rows_per_s": round(len(X) / dt),
+        "peak_rss_mb": round(peak_mb, 1),
+        "digest": _digest(X, y),
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark training-data ingestion.")
+    ap.add_argument("--rows", type=int, default=5_000_000)
+    ap.add_argument("--csv", default=os.path.join("/tmp", "lung_ingest_bench.csv"))
+    ap.add_argument("--child", choices=["legacy", "vectorized"], help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        print(json.dumps(run_one(args.child, args.csv)))
+        return
+
+    if not os.path.exists(args.csv) or sum(1 for _ in open(args.csv)) - 1 != args.rows:
+        print(f"Writing {args.rows:,} synthetic rows to {args.csv}…", flush=True)
+        write_synthetic_csv(args.csv, args.rows)
+
+    results = []
+    for impl in ("legacy", "vectorized"):
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", impl, "--csv", args.csv, "--rows", str(args.rows)],
+            check=True, capture_output=True, text=True,
+        ).stdout.strip().splitlines()[-1]
+        results.append(json.loads(out))
+        print(json.dumps(results[-1]), flush=True)
+
+    legacy, new = results
+    print(json.dumps({
+        "speedup": round(legacy["seconds"] / max(new["seconds"], 1e-9), 2),
+        "peak_rss_ratio": round(new["peak_rss_mb"] / max(legacy["peak_rss_mb"], 1e-9), 2),
+        "identical": legacy["digest"] == new["digest"],
+    }), flush=True)
+
+if __name__ == "__main__":
+    main()
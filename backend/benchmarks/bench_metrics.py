@@ -0,0 +1,102 @@
+"""
+Cost of the /metrics instrumentation on /predict.
+
+Two measurements against the saved artifacts:
+- end to end: child processes serve the same /predict stream in-process (TestClient) with
+  METRICS=1 and METRICS=0, interleaved --rounds times; the median per-request times are compared
+- direct: the exact instrumentation work of one /predict request (middleware counter + histogram,
+  stage timers, batch/rows series) timed in a loop, as a share of the median request time
+
+  python benchmarks/bench_metrics.py [--requests 2000] [--rounds 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+
+PATIENT = {
+    "age": 60, "pack_years": 30, "gender": "male", "radon_exposure": "high",
+    "asbestos_exposure": "yes", "secondhand_smoke_exposure": "no", "copd_diagnosis": 1,
+    "alcohol_consumption": "heavy", "family_history": 1,
+}
+
+def serve(n: int) -> None:
+    """Child: time n /predict calls (distinct ages, so cache hits and misses both occur)."""
+    from fastapi.testclient import TestClient
+    import app
+
+    with TestClient(app.app) as client:
+        for i in range(200):  # warm-up
+            client.post("/predict", json=dict(PATIENT, age=20 + i % 70))
+        t0 = time.perf_counter()
+        for i in range(n):
+            client.post("/predict", json=dict(PATIENT, age=20 + (i * 7) % 70, pack_years=i % 100))
+        print(json.dumps({"per_request_us": (time.perf_counter() - t0) / n * 1e6}), flush=True)
+
+def run_child(n: int, metrics_on: bool) -> float:
+    env = dict(os.environ, METRICS="1" if metrics_on else "0", MODEL_WATCH_SECONDS="0")
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", str(n)],
+                         env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])["per_request_us"]
+
+def direct_cost_us(loops: int = 200000) -> float:
+    """Instrumentation work per single-row /predict (fresh registry, same series shapes as app.py)."""
+    from metrics import SIZE_BUCKETS, Counter, Histogram
+
+    requests = Counter("r", "", ("method", "route", "status"))
+    latency = Histogram("l", "", ("method", "route"))
+    stages = Histogram("s", "", ("stage", "model_version"))
+    rows = Histogram("b", "", ("model_version",), SIZE_BUCKETS)
+    scored = Counter("n", "", ("model_version", "explain"))
+    v, clock = "v1", time.perf_counter
+    t0 = clock()
+    for _ in range(loops):
+        a = clock(); b = clock(); c = clock(); d = clock(); e = clock(); f = clock()
+        stages.observe(b - a, "parse", v)
+        stages.observe(c - b, "encode", v)
+        stages.observe(d - c, "predict", v)
+        stages.observe(e - d, "model", v)  # cache miss
+        rows.observe(1, v)
+        rows.observe(1, v)
+        scored.inc(1, v, "false")
+        stages.observe(f - e, "adjust", v)
+        stages.observe(f - e, "build", v)
+        requests.inc(1, "POST", "/predict", "200")
+        latency.observe(f - a, "POST", "/predict")
+    return (clock() - t0) / loops * 1e6
+
+def main():
+    ap = argparse.ArgumentParser(description="Measure /predict overhead of METRICS=1.")
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--rounds", type=int, default=5)
+    ap.add_argument("--child", type=int, default=0, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        serve(args.child)
+        return
+
+    on, off = [], []
+    for _ in range(args.rounds):
+        on.append(run_child(args.requests, True))
+        off.append(run_child(args.requests, False))
+    med_on, med_off = statistics.median(on), statistics.median(off)
+    direct = direct_cost_us()
+    print(json.dumps({
+        "requests_per_round": args.requests,
+        "rounds": args.rounds,
+        "metrics_on_us": round(med_on, 1),
+        "metrics_off_us": round(med_off, 1),
+        "end_to_end_overhead_pct": round((med_on - med_off) / med_off * 100, 2),
+        "instrumentation_us_per_request": round(direct, 2),
+        "instrumentation_pct": round(direct / med_off * 100, 2),
+    }), flush=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Bytes on the wire and server CPU per scored row: packed /predict/packed vs JSON /predict and /predict/batch.
+
+Starts one `uvicorn app:app` worker (p_raw cache off, micro-batching off) and scores the
+same --rows patients through client.RiskClient, one request after another on one
+keep-alive connection, as:
+- json: POST /predict, one row per request
+- json-batch/B: POST /predict/batch, B rows per request
+- packed/B: POST /predict/packed, B rows per request (packed once up front, as a
+  high-volume client would keep its rows)
+
+Per mode: request + response bytes per row as the server read and wrote them (HTTP
+headers included; /proc/<pid>/io rchar / wchar, the server does no other I/O once
+warm), server CPU µs per row (/proc/<pid>/stat utime + stime), and client-side rows/s.
+Every mode runs once unmeasured first (that also loads model.pkl for the big batches).
+The packed float32 risks are checked against /predict's raw_risk_percentage (to its 2 decimals).
+
+  python benchmarks/bench_packed.py [--rows 5000] [--batch-sizes 1 100 1000] [--out packed.json]
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from client import RiskClient
+from packed import RECORD_DTYPE
+from suite import frontend_payload
+
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / CLK_TCK  # utime, stime
+
+def _io(pid: int) -> Dict[str, int]:
+    with open(f"/proc/{pid}/io") as f:
+        return {k: int(v) for k, v in (line.split(": ") for line in f)}
+
+def start_server(port: int, timeout: float) -> subprocess.Popen:
+    env = dict(os.environ, CACHE_MAX_SIZE="0", BATCHING="0", MODEL_WATCH_SECONDS="0", PI_DEPLOY="",
+               PYTHONUNBUFFERED="1")  # no PI_DEPLOY: the packed risks are the raw ones
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=tempfile.TemporaryFile(),
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with status {proc.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"server not ready after {timeout:.0f}s")
+
+def _chunks(seq, size: int):
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+def measure(pid: int, n_rows: int, run: Callable[[], Any]) -> Dict[str, Any]:
+    run()  # warm-up pass, unmeasured
+    io0, cpu0, t0 = _io(pid), _cpu_seconds(pid), time.perf_counter()
+    out = run()
+    wall = time.perf_counter() - t0
+    cpu, io1 = _cpu_seconds(pid) - cpu0, _io(pid)
+    read, written = io1["rchar"] - io0["rchar"], io1["wchar"] - io0["wchar"]
+    return {
+        "rows": n_rows,
+        "request_bytes_per_row": read / n_rows,
+        "response_bytes_per_row": written / n_rows,
+        "wire_bytes_per_row": (read + written) / n_rows,
+        "server_cpu_us_per_row": cpu / n_rows * 1e6,
+        "client_rows_per_s": n_rows / wall,
+        "_risks": out,
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare the packed binary endpoint with the JSON endpoints.")
+    ap.add_argument("--rows", type=int, default=5000)
+    ap.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 100, 1000])
+    ap.add_argument("--json-rows", type=int, default=None, help="rows for single-row JSON /predict (default --rows)")
+    ap.add_argument("--startup-timeout", type=float, default=120.0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default=None, help="also write the results as JSON")
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    records = [frontend_payload(rng) for _ in range(args.rows)]
+    n_single = min(args.json_rows or args.rows, args.rows)
+    port = _free_port()
+    proc = start_server(port, args.startup_timeout)
+    results: Dict[str, Dict[str, Any]] = {}
+    try:
+        with RiskClient(f"http://127.0.0.1:{port}") as api:
+            body = np.frombuffer(api.pack(records), dtype=RECORD_DTYPE)
+
+            def json_single() -> np.ndarray:
+                return np.array([api.predict(r)["raw_risk_percentage"] for r in records[:n_single]])
+
+            def json_batch(size: int) -> Callable[[], np.ndarray]:
+                return lambda: np.array([p["raw_risk_percentage"] for chunk in _chunks(records, size)
+                                         for p in api.predict_batch(chunk)["results"]])
+
+            def packed(size: int) -> Callable[[], np.ndarray]:
+                return lambda: np.concatenate([api.predict_packed(chunk).risks for chunk in _chunks(body, size)])
+
+            results["json"] = measure(proc.pid, n_single, json_single)
+            for size in args.batch_sizes:
+                if size > 1:
+                    results[f"json-batch/{size}"] = measure(proc.pid, args.rows, json_batch(size))
+            for size in args.batch_sizes:
+                results[f"packed/{size}"] = measure(proc.pid, args.rows, packed(size))
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+    reference = results["json"].pop("_risks")  # percentages rounded to 2 decimals, as /predict returns them
+    for name, res in results.items():
+        risks = res.pop("_risks", None)
+        if risks is not None and name.startswith("packed"):
+            pct = np.clip(risks[:n_single].astype(float), 0.0, 0.9999) * 100.0
+            res["matches_json"] = bool(np.abs(pct - reference).max() <= 0.005 + 1e-4)
+
+    print(f"{'mode':<16} {'req B/row':>10} {'resp B/row':>11} {'wire B/row':>11} {'server µs/row':>14} {'rows/s':>10}")
+    for name, r in results.items():
+        print(f"{name:<16} {r['request_bytes_per_row']:>10.1f} {r['response_bytes_per_row']:>11.1f} "
+              f"{r['wire_bytes_per_row']:>11.1f} {r['server_cpu_us_per_row']:>14.1f} {r['client_rows_per_s']:>10.0f}"
+              + ("" if r.get("matches_json", True) else "  (risks differ from /predict)"))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"rows": args.rows, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
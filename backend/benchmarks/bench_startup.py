@@ -0,0 +1,172 @@
+"""
+Cold start with the compact artifact (model_compact.bin, memory-mapped) vs unpickling model.pkl.
+
+Per mode (COMPACT_ARTIFACT=1 / 0):
+- import: `import app` in a fresh interpreter (loads the registry), and which heavy
+  libraries that pulled in
+- first prediction: import + the first /predict (in-process TestClient)
+- workers: `uvicorn app:app --workers N` for each N; time until every worker reported
+  startup complete and the first /predict answered, then, after some traffic, per-worker
+  RSS / PSS / shared memory from /proc/<pid>/smaps_rollup (PSS splits shared pages
+  between the processes mapping them, so it is the honest per-worker cost)
+
+A worker count whose projected RSS does not fit in MemAvailable is skipped.
+
+  python benchmarks/bench_startup.py [--workers 1 4 16] [--modes compact pickle]
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(BACKEND_DIR)
+
+PATIENT = {
+    "age": 60, "pack_years": 30, "gender": "male", "radon_exposure": "high",
+    "asbestos_exposure": "yes", "secondhand_smoke_exposure": "no", "copd_diagnosis": 1,
+    "alcohol_consumption": "heavy", "family_history": 1,
+}
+
+IMPORT_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+from fastapi.testclient import TestClient
+r = TestClient(app.app).post("/predict", json=%r)
+t2 = time.perf_counter()
+assert r.status_code == 200, r.text
+print(json.dumps({"import_s": t1 - t0, "first_prediction_s": t2 - t0,
+                  "heavy_modules": [m for m in ("pandas", "sklearn", "xgboost", "joblib") if m in sys.modules]}))
+""" % (PATIENT,)
+
+def _env(mode: str) -> dict:
+    return dict(os.environ, COMPACT_ARTIFACT="1" if mode == "compact" else "0", MODEL_WATCH_SECONDS="0")
+
+def probe_import(mode: str) -> dict:
+    out = subprocess.run([sys.executable, "-c", IMPORT_PROBE], env=_env(mode), capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _post(url: str, body, timeout: float = 10.0) -> int:
+    req = urllib.request.Request(url, data=json.dumps(body).encode(), headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=timeout) as r:
+        r.read()
+        return r.status
+
+def _children(pid: int) -> list:
+    kids = []
+    for d in os.listdir("/proc"):
+        if not d.isdigit():
+            continue
+        try:
+            with open(f"/proc/{d}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            with open(f"/proc/{d}/cmdline", "rb") as f:
+                cmd = f.read()
+        except OSError:
+            continue
+        if ppid == pid and b"spawn_main" in cmd:
+            kids.append(int(d))
+    return kids
+
+def _smaps(pid: int) -> dict:
+    """kB fields of /proc/<pid>/smaps_rollup -> MB."""
+    out = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                out[parts[0].rstrip(":")] = int(parts[1]) / 1024.0
+    return out
+
+def _mem_available_mb() -> float:
+    with open("/proc/meminfo") as f:
+        for line in f:
+            if line.startswith("MemAvailable:"):
+                return int(line.split()[1]) / 1024.0
+    return float("inf")
+
+def run_workers(mode: str, n: int, timeout: float = 600.0) -> dict:
+    port = _free_port()
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--workers", str(n), "--no-access-log"],
+        env=_env(mode), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        ready = 0
+        while ready < n:
+            line = proc.stderr.readline()
+            if not line:
+                raise RuntimeError(f"uvicorn exited during startup ({mode}, {n} workers)")
+            if "Application startup complete" in line:
+                ready += 1
+            if time.perf_counter() - t0 > timeout:
+                raise TimeoutError(f"{n} workers not up after {timeout:.0f}s")
+        t_all_ready = time.perf_counter() - t0
+        threading.Thread(target=proc.stderr.read, daemon=True).start()  # keep the pipe drained
+        while True:
+            try:
+                _post(f"{url}/predict", PATIENT)
+                break
+            except OSError:
+                time.sleep(0.01)
+        t_first = time.perf_counter() - t0
+
+        # traffic over all workers: single predictions, an explanation and a sweep each
+        for i in range(20 * n):
+            _post(f"{url}/predict", dict(PATIENT, age=20 + i % 70))
+            if i % 10 == 0:
+                _post(f"{url}/predict?explain=true", dict(PATIENT, pack_years=i % 100))
+                _post(f"{url}/predict/sweep", {"patient": PATIENT, "axes": [{"field": "age", "start": 20, "stop": 90, "num": 50}]})
+        mem = [_smaps(pid) for pid in (_children(proc.pid) or [proc.pid])]  # --workers 1 serves in-process
+        k = max(len(mem), 1)
+        return {
+            "mode": mode,
+            "workers": n,
+            "all_workers_ready_s": round(t_all_ready, 2),
+            "first_prediction_s": round(t_first, 2),
+            "per_worker_rss_mb": round(sum(m.get("Rss", 0.0) for m in mem) / k, 1),
+            "per_worker_pss_mb": round(sum(m.get("Pss", 0.0) for m in mem) / k, 1),
+            "per_worker_shared_mb": round(sum(m.get("Shared_Clean", 0.0) + m.get("Shared_Dirty", 0.0) for m in mem) / k, 1),
+            "total_pss_mb": round(sum(m.get("Pss", 0.0) for m in mem), 1),
+        }
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark API cold start: compact artifact vs model.pkl.")
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    ap.add_argument("--modes", nargs="+", default=["compact", "pickle"], choices=["compact", "pickle"])
+    args = ap.parse_args()
+
+    for mode in args.modes:
+        print(json.dumps({"mode": mode, **{k: round(v, 3) if isinstance(v, float) else v
+                                           for k, v in probe_import(mode).items()}}), flush=True)
+        rss_one = None
+        for n in sorted(args.workers):
+            if rss_one is not None and rss_one * n > 0.8 * _mem_available_mb():
+                print(json.dumps({"mode": mode, "workers": n, "skipped": f"needs ~{rss_one * n:.0f} MB"}), flush=True)
+                continue
+            res = run_workers(mode, n)
+            rss_one = rss_one or res["per_worker_rss_mb"]
+            print(json.dumps(res), flush=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+What-if sweep vs one /predict call per grid point.
+
+Runs the app in-process (TestClient, no network) against the saved artifacts and times a
+--size x --size age x pack_years surface through POST /predict/sweep against single
+/predict calls, checking a sample of the grid for identical risk percentages.
+
+  python benchmarks/bench_sweep.py [--size 100] [--singles 50]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+os.environ.setdefault("MODEL_WATCH_SECONDS", "0")
+os.environ.setdefault("CACHE_MAX_SIZE", "0")
+
+PATIENT = {
+    "age": 60, "pack_years": 30, "gender": "male", "radon_exposure": "high",
+    "asbestos_exposure": "yes", "secondhand_smoke_exposure": "no", "copd_diagnosis": 1,
+    "alcohol_consumption": "heavy", "family_history": 1,
+}
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark /predict/sweep against single predictions.")
+    ap.add_argument("--size", type=int, default=100, help="points per axis")
+    ap.add_argument("--singles", type=int, default=50, help="single /predict calls to time (and check)")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    from fastapi.testclient import TestClient
+    import app
+
+    client = TestClient(app.app)
+    body = {"patient": PATIENT, "axes": [
+        {"field": "age", "start": 20, "stop": 90, "num": args.size},
+        {"field": "pack_years", "start": 0, "stop": 100, "num": args.size},
+    ]}
+    surface = client.post("/predict/sweep", json=body).json()  # warm-up
+    t0 = time.perf_counter()
+    for _ in range(args.repeat):
+        client.post("/predict/sweep", json=body)
+    sweep_ms = (time.perf_counter() - t0) / args.repeat * 1e3
+
+    rng = np.random.default_rng(0)
+    ages, packs = surface["axes"][0]["values"], surface["axes"][1]["values"]
+    points = [(int(i), int(j)) for i, j in rng.integers(0, args.size, size=(args.singles, 2))]
+    mismatches = 0
+    t0 = time.perf_counter()
+    for i, j in points:
+        r = client.post("/predict", json=dict(PATIENT, age=ages[i], pack_years=packs[j])).json()
+        mismatches += r["risk_percentage"] != surface["risk_percentage"][i][j]
+    single_ms = (time.perf_counter() - t0) / len(points) * 1e3
+
+    print(json.dumps({
+        "grid_points": args.size * args.size,
+        "sweep_predictor": next(v["sweep_predictor"] for v in client.get("/models").json()["versions"] if v["active"]),
+        "sweep_ms": round(sweep_ms, 2),
+        "single_predict_ms": round(single_ms, 2),
+        "sweep_in_single_calls": round(sweep_ms / single_ms, 1),
+        "per_point_speedup": round(single_ms * args.size * args.size / sweep_ms, 1),
+        "checked_points": len(points),
+        "mismatches": int(mismatches),
+    }), flush=True)
+
+if __name__ == "__main__":
+    main()
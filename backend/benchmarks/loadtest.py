@@ -0,0 +1,118 @@
+"""
+Closed-loop load test of POST /predict with micro-batching off vs on.
+
+Starts `uvicorn app:app` from the backend directory once per mode (BATCHING=0 / 1),
+drives it with `--concurrency` async clients for `--duration` seconds and prints
+p50/p99 latency and requests/s. The p_raw cache is disabled so every request
+reaches the model.
+
+  python benchmarks/loadtest.py [--concurrency 32] [--duration 10] [--max-wait-ms 2]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def random_patient(rng: random.Random) -> dict:
+    return {
+        "age": rng.randint(18, 90),
+        "pack_years": round(rng.uniform(0, 80), 1),
+        "gender": rng.choice(["male", "female"]),
+        "radon_exposure": rng.choice(["low", "medium", "high"]),
+        "asbestos_exposure": rng.choice(["yes", "no"]),
+        "secondhand_smoke_exposure": rng.choice(["yes", "no"]),
+        "copd_diagnosis": rng.choice(["yes", "no"]),
+        "alcohol_consumption": rng.choice(["none", "moderate", "heavy"]),
+        "family_history": rng.choice(["yes", "no"]),
+    }
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(port: int, env: dict) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env={**os.environ, **env},
+    )
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+async def drive(url: str, concurrency: int, duration: float, seed: int = 0) -> dict:
+    latencies, errors, rejected = [], 0, 0
+    stop_at = time.perf_counter() + duration
+
+    async def worker(i: int):
+        nonlocal errors, rejected
+        rng = random.Random(seed + i)
+        async with httpx.AsyncClient(timeout=30) as client:
+            while time.perf_counter() < stop_at:
+                t0 = time.perf_counter()
+                r = await client.post(url, json=random_patient(rng))
+                dt = time.perf_counter() - t0
+                if r.status_code == 200:
+                    latencies.append(dt)
+                elif r.status_code == 503:
+                    rejected += 1
+                else:
+                    errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    wall = time.perf_counter() - t0
+    lat = np.array(latencies) * 1e3
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / wall, 1),
+        "p50_ms": round(float(np.percentile(lat, 50)), 2) if len(lat) else None,
+        "p99_ms": round(float(np.percentile(lat, 99)), 2) if len(lat) else None,
+        "errors": errors,
+        "rejected_503": rejected,
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description="Load-test /predict with micro-batching off and on.")
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--duration", type=float, default=10.0)
+    ap.add_argument("--max-batch", type=int, default=64)
+    ap.add_argument("--max-wait-ms", type=float, default=2.0)
+    ap.add_argument("--predictor", default="auto", help="PREDICTOR env for the server")
+    args = ap.parse_args()
+
+    for batching in ("0", "1"):
+        port = free_port()
+        proc = start_server(port, {
+            "BATCHING": batching, "BATCH_MAX_SIZE": str(args.max_batch),
+            "BATCH_MAX_WAIT_MS": str(args.max_wait_ms), "CACHE_MAX_SIZE": "0",
+            "PREDICTOR": args.predictor,
+        })
+        try:
+            res = asyncio.run(drive(f"http://127.0.0.1:{port}/predict", args.concurrency, args.duration))
+            info = httpx.get(f"http://127.0.0.1:{port}/model-info").json()
+        finally:
+            proc.terminate()
+            proc.wait()
+        print(json.dumps({"batching": batching == "1", "concurrency": args.concurrency,
+                          "predictor": info.get("predictor"), **res,
+                          "batcher": info.get("batching")}), flush=True)
+
+if __name__ == "__main__":
+    main()
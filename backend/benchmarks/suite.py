@@ -0,0 +1,361 @@
+"""
+Local benchmark suite for the API and the model, with a baseline regression report.
+
+Everything runs in this process against the artifacts next to app.py (no network, no
+server):
+- micro: each stage of predict_risk for one patient (validate, parse, encode, model,
+  adjust, build, the whole _score_batch and the handler coroutine), median µs per call
+- model: served predictor (mv.engine.predict_raw: fused / table / model.pkl, as the
+  API picks it) and model.pkl's predict_proba at batch sizes 1 .. 100k, rows/s
+- load: an in-process ASGI load generator (httpx.ASGITransport, app lifespan included)
+  replaying payloads against POST /predict at fixed concurrency levels: p50/p95/p99
+  latency, requests/s, CPU% and CPU ms per request, RSS (median of --rounds). Payloads come from --payloads
+  (JSONL, one request per line: a PatientInput object, or {"path", "query", "body"}), or
+  are generated like the frontend sends them. The p_raw cache is off unless --cache.
+
+Results are written to --out as JSON: {"meta", "metrics": {name: {value, unit, better}},
+"details"}. With --baseline, every metric present in both files is compared and a
+change worse than --threshold (relative) is a regression; the exit status is 1 if any.
+
+  python benchmarks/suite.py [--only micro model load] [--concurrency 1 8 32] [--requests 2000]
+  python benchmarks/suite.py --save-baseline             # store this run as the baseline
+  python benchmarks/suite.py --baseline benchmarks/results/baseline.json --threshold 0.1
+  python benchmarks/suite.py --compare new.json --baseline old.json   # report only, no run
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+sys.path.insert(0, BACKEND_DIR)
+
+BATCH_SIZES = (1, 10, 100, 1000, 10_000, 100_000)
+
+def frontend_payload(rng: random.Random) -> Dict[str, Any]:
+    """A /predict body as frontend/app/page.tsx builds it."""
+    return {
+        "age": rng.randint(18, 90),
+        "pack_years": round(rng.uniform(0, 80), 1),
+        "gender": rng.choice([0, 1]),
+        "radon_exposure": rng.choice(["low", "medium", "high"]),
+        "asbestos_exposure": rng.choice(["yes", "no"]),
+        "secondhand_smoke_exposure": rng.choice(["yes", "no"]),
+        "copd_diagnosis": rng.choice(["yes", "no"]),
+        "alcohol_consumption": rng.choice(["none", "moderate", "heavy"]),
+        "family_history": rng.choice(["yes", "no"]),
+    }
+
+def load_payloads(path: Optional[str], n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """-> [{"path", "query", "body"}]; lines that are not a /predict request are skipped."""
+    from encoding import FIELDS
+
+    reqs: List[Dict[str, Any]] = []
+    if path:
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    obj = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(obj, dict) and isinstance(obj.get("body"), dict):
+                    reqs.append({"path": obj.get("path", "/predict"), "query": obj.get("query") or {}, "body": obj["body"]})
+                elif isinstance(obj, dict) and set(FIELDS) <= set(obj):
+                    reqs.append({"path": "/predict", "query": {}, "body": obj})
+        if not reqs:
+            raise SystemExit(f"{path}: no /predict payloads (PatientInput objects or {{path, query, body}} lines)")
+    else:
+        rng = random.Random(seed)
+        reqs = [{"path": "/predict", "query": {}, "body": frontend_payload(rng)} for _ in range(n)]
+    return reqs
+
+def _rss_mb() -> float:
+    from metrics import _rss_bytes
+
+    return _rss_bytes() / 2**20
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+def time_calls(fn: Callable[[], Any], min_time: float = 0.5, max_calls: int = 20000, min_calls: int = 3) -> Dict[str, float]:
+    """Calls fn until min_time has passed (at least min_calls); per-call seconds."""
+    fn()  # warm-up
+    times: List[float] = []
+    t_end = time.perf_counter() + min_time
+    while len(times) < min_calls or (time.perf_counter() < t_end and len(times) < max_calls):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return {"calls": len(times), "median": statistics.median(times), "min": min(times),
+            "p95": float(np.percentile(times, 95))}
+
+# -------------------
+# Micro-benchmarks
+# -------------------
+def bench_micro(app, payload: Dict[str, Any], min_time: float) -> Dict[str, Dict[str, float]]:
+    from encoding import parse_record
+    from inference import prior_adjust_array
+
+    mv = app.registry.active
+    p = app.PatientInput(**payload)
+    parsed = parse_record(p.__dict__)
+    x = mv.engine.encode_row(parsed).copy()
+    p_raw = mv.engine.predict_raw(x)
+    pi = 0.01
+    loop = asyncio.new_event_loop()
+    stages = {
+        "validate": lambda: app.PatientInput(**payload),
+        "parse": lambda: parse_record(p.__dict__),
+        "encode": lambda: mv.engine.encode_row(parsed),
+        "model": lambda: mv.engine.predict_raw(x),
+        "adjust": lambda: prior_adjust_array(p_raw, mv.pi_train, pi),
+        "build": lambda: app._build_result(mv, parsed, float(p_raw[0]), float(p_raw[0]), pi, True),
+        "score": lambda: app._score_batch(mv, [parsed], pi, False, False),
+        "handler": lambda: loop.run_until_complete(app.predict_risk(
+            p, pi_deploy=pi, model_version=None, x_model_version=None, explain=False)),
+    }
+    try:
+        return {name: time_calls(fn, min_time) for name, fn in stages.items()}
+    finally:
+        loop.close()
+
+def bench_model(app, sizes, min_time: float, pickle: bool) -> Dict[str, Dict[str, float]]:
+    from encoding import parse_records
+
+    mv = app.registry.active
+    rng = random.Random(1)
+    n_max = max(sizes)
+    X = np.empty((n_max, mv.engine.n_features), dtype=np.float32)
+    for start in range(0, n_max, 10_000):
+        rows = parse_records([frontend_payload(rng) for _ in range(min(10_000, n_max - start))])
+        mv.engine.encode_batch(rows, out=X[start:start + len(rows)])
+    out: Dict[str, Dict[str, float]] = {}
+    predictors = {f"served_{mv.predictor_name}": mv.engine.predict_raw}
+    if pickle:
+        predictors["model_pkl"] = lambda x: mv.model.predict_proba(x)
+    for name, fn in predictors.items():
+        for n in sizes:
+            xb = X[:n]
+            res = time_calls(lambda: fn(xb), min_time, max_calls=2000, min_calls=1 if n >= 10_000 else 3)
+            res["rows_per_s"] = n / res["median"]
+            out[f"{name}.b{n}"] = res
+    return out
+
+# -------------------
+# In-process ASGI load generator
+# -------------------
+async def _drive(app, requests: List[Dict[str, Any]], concurrency: int, n_requests: int) -> Dict[str, Any]:
+    import httpx
+
+    latencies: List[float] = []
+    status: Dict[int, int] = {}
+    next_i = 0
+
+    async def worker(client):
+        nonlocal next_i
+        while next_i < n_requests:
+            req = requests[next_i % len(requests)]
+            next_i += 1
+            t0 = time.perf_counter()
+            r = await client.post(req["path"], params=req["query"], json=req["body"])
+            latencies.append(time.perf_counter() - t0)
+            status[r.status_code] = status.get(r.status_code, 0) + 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await asyncio.gather(*(worker(client) for _ in range(min(5, concurrency))))  # warm-up pass
+        latencies.clear()
+        status.clear()
+        next_i = 0
+        cpu0, t0 = time.process_time(), time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        wall, cpu = time.perf_counter() - t0, time.process_time() - cpu0
+    lat = np.array(latencies) * 1e3
+    ok = status.get(200, 0)
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "ok": ok,
+        "status": {str(k): v for k, v in sorted(status.items())},
+        "rps": len(latencies) / wall,
+        "p50_ms": float(np.percentile(lat, 50)),
+        "p95_ms": float(np.percentile(lat, 95)),
+        "p99_ms": float(np.percentile(lat, 99)),
+        "cpu_percent": 100.0 * cpu / wall,
+        "cpu_ms_per_request": 1e3 * cpu / max(len(latencies), 1),
+        "rss_mb": _rss_mb(),
+    }
+
+async def _load_all(app, requests, levels, n_requests, rounds) -> List[Dict[str, Any]]:
+    out = []
+    async with app.router.lifespan_context(app):
+        for c in levels:
+            runs = sorted([await _drive(app, requests, c, n_requests) for _ in range(rounds)], key=lambda r: r["rps"])
+            out.append(dict(runs[len(runs) // 2], rps_rounds=[r["rps"] for r in runs]))  # the median round
+    return out
+
+def bench_load(app, requests, levels, n_requests: int, rounds: int = 3) -> List[Dict[str, Any]]:
+    return asyncio.run(_load_all(app.app, requests, levels, n_requests, rounds))
+
+# -------------------
+# Results, baseline comparison
+# -------------------
+def _metric(value: float, unit: str, better: Optional[str]) -> Dict[str, Any]:
+    return {"value": round(float(value), 6), "unit": unit, "better": better}
+
+def collect(details: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Flat, comparable metrics out of the raw results."""
+    m: Dict[str, Dict[str, Any]] = {}
+    for stage, r in details.get("micro", {}).items():
+        m[f"micro.{stage}.median_us"] = _metric(r["median"] * 1e6, "us", "lower")
+    for key, r in details.get("model", {}).items():
+        m[f"model.{key}.rows_per_s"] = _metric(r["rows_per_s"], "rows/s", "higher")
+        m[f"model.{key}.median_ms"] = _metric(r["median"] * 1e3, "ms", "lower")
+    for r in details.get("load", []):
+        k = f"load.c{r['concurrency']}"
+        m[f"{k}.rps"] = _metric(r["rps"], "req/s", "higher")
+        for q in ("p50_ms", "p95_ms", "p99_ms"):
+            m[f"{k}.{q}"] = _metric(r[q], "ms", "lower")
+        m[f"{k}.cpu_ms_per_request"] = _metric(r["cpu_ms_per_request"], "ms", "lower")
+        m[f"{k}.cpu_percent"] = _metric(r["cpu_percent"], "%", None)  # informational
+        m[f"{k}.rss_mb"] = _metric(r["rss_mb"], "MB", "lower")
+        m[f"{k}.error_rate"] = _metric(1.0 - r["ok"] / max(r["requests"], 1), "ratio", "lower")
+    if "peak_rss_mb" in details:
+        m["process.peak_rss_mb"] = _metric(details["peak_rss_mb"], "MB", "lower")
+    return m
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """One row per metric in both runs; status regression / improvement / ok / info."""
+    rows = []
+    for name, cur in current["metrics"].items():
+        base = baseline["metrics"].get(name)
+        if base is None:
+            continue
+        b, c, better = base["value"], cur["value"], cur.get("better")
+        if b == 0:
+            change = 0.0 if c == 0 else float("inf")
+        else:
+            change = (c - b) / abs(b)
+        worse = change if better == "lower" else -change
+        if better is None:
+            status = "info"
+        elif name.endswith("error_rate"):  # absolute: any new errors count
+            status = "regression" if c > b + 1e-9 else "ok"
+        elif worse > threshold:
+            status = "regression"
+        elif worse < -threshold:
+            status = "improvement"
+        else:
+            status = "ok"
+        rows.append({"metric": name, "baseline": b, "current": c, "unit": cur["unit"],
+                     "change_pct": round(100.0 * change, 1), "status": status})
+    return rows
+
+def print_report(rows: List[Dict[str, Any]], threshold: float) -> int:
+    regressions = [r for r in rows if r["status"] == "regression"]
+    width = max([len(r["metric"]) for r in rows] + [6])
+    print(f"\n{'metric':<{width}}  {'baseline':>12}  {'current':>12}  {'change':>8}  status")
+    for r in rows:
+        flag = {"regression": "REGRESSION", "improvement": "improved"}.get(r["status"], r["status"])
+        print(f"{r['metric']:<{width}}  {r['baseline']:>12.4g}  {r['current']:>12.4g}  {r['change_pct']:>+7.1f}%  {flag}")
+    print(f"\n{len(rows)} metrics compared, threshold ±{100 * threshold:.0f}%: "
+          f"{len(regressions)} regression(s), {sum(r['status'] == 'improvement' for r in rows)} improvement(s)")
+    return 1 if regressions else 0
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    ap = argparse.ArgumentParser(description="Micro-benchmarks + in-process load test with a baseline regression report.")
+    ap.add_argument("--only", nargs="+", choices=["micro", "model", "load"], default=["micro", "model", "load"])
+    ap.add_argument("--batch-sizes", type=int, nargs="+", default=list(BATCH_SIZES))
+    ap.add_argument("--no-pickle", action="store_true", help="skip model.pkl predict_proba (loads sklearn/xgboost)")
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    ap.add_argument("--requests", type=int, default=2000, help="requests per concurrency level and round")
+    ap.add_argument("--rounds", type=int, default=3, help="rounds per concurrency level; the median round is reported")
+    ap.add_argument("--payloads", help="JSONL of /predict payloads to replay (default: generated)")
+    ap.add_argument("--cache", action="store_true", help="keep the p_raw cache on (default: every request hits the model)")
+    ap.add_argument("--min-time", type=float, default=0.5, help="seconds per micro-benchmark")
+    ap.add_argument("--out", default=os.path.join(RESULTS_DIR, "latest.json"))
+    ap.add_argument("--baseline", help="results JSON to compare against")
+    ap.add_argument("--save-baseline", nargs="?", const=os.path.join(RESULTS_DIR, "baseline.json"),
+                    help="also write this run as the baseline (default path: benchmarks/results/baseline.json)")
+    ap.add_argument("--threshold", type=float, default=0.10, help="relative change that counts as a regression")
+    ap.add_argument("--compare", help="compare this results JSON with --baseline and exit (no run)")
+    args = ap.parse_args()
+
+    if args.compare:
+        if not args.baseline:
+            ap.error("--compare needs --baseline")
+        with open(args.compare) as f, open(args.baseline) as g:
+            sys.exit(print_report(compare(json.load(f), json.load(g), args.threshold), args.threshold))
+
+    os.chdir(BACKEND_DIR)
+    os.environ.setdefault("MODEL_WATCH_SECONDS", "0")
+    if not args.cache:
+        os.environ["CACHE_MAX_SIZE"] = "0"
+    import app
+
+    mv = app.registry.active
+    details: Dict[str, Any] = {}
+    requests = load_payloads(args.payloads, max(args.requests, 1))
+    if "micro" in args.only:
+        details["micro"] = bench_micro(app, requests[0]["body"], args.min_time)
+        print(json.dumps({"micro_us": {k: round(v["median"] * 1e6, 1) for k, v in details["micro"].items()}}), flush=True)
+    if "load" in args.only:  # before "model", which loads model.pkl (sklearn/xgboost) into the process
+        details["load"] = bench_load(app, requests, args.concurrency, args.requests, max(args.rounds, 1))
+        for r in details["load"]:
+            print(json.dumps({k: round(v, 2) if isinstance(v, float) else v for k, v in r.items() if k != "rps_rounds"}), flush=True)
+    if "model" in args.only:
+        details["model"] = bench_model(app, sorted(args.batch_sizes), args.min_time, not args.no_pickle)
+        print(json.dumps({"model_rows_per_s": {k: round(v["rows_per_s"]) for k, v in details["model"].items()}}), flush=True)
+    details["peak_rss_mb"] = _peak_rss_mb()
+
+    result = {
+        "meta": {
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "model_version": mv.version,
+            "predictor": mv.predictor_name,
+            "cache": args.cache,
+            "payloads": args.payloads or "generated",
+            "args": {k: v for k, v in vars(args).items() if k not in ("out", "baseline", "save_baseline", "compare")},
+        },
+        "metrics": collect(details),
+        "details": details,
+    }
+    for path in filter(None, (args.out, args.save_baseline)):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Saved: {path}", flush=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            sys.exit(print_report(compare(result, json.load(f), args.threshold), args.threshold))
+
+if __name__ == "__main__":
+    main()
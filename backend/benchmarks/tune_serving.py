@@ -0,0 +1,232 @@
+"""
+Tune the serving configuration (serving.py) on this machine and write serving_config.json.
+
+For every candidate (workers, inference_threads, booster_threads) within the detected CPU
+budget (one worker unless --max-workers, see serving.py) -- plus the untuned baseline: one
+worker, the anyio threadpool's 40 threads and xgboost's all-cores default -- a real `uvicorn app:app` is started on a free port with
+that configuration, warmed up (model.pkl is loaded by the first big batch), then driven
+over TCP for --duration seconds at --concurrency: single-row POST /predict, plus a
+--batch-share of POST /predict/batch requests of --batch-rows rows (those go to
+model.pkl, i.e. through the booster threads). Requests/s and p50/p99 latency are
+recorded per candidate (the median-throughput of --rounds runs, each on a fresh server).
+
+The winner is the highest throughput among the candidates whose p99 is within
+--p99-slack of the best p99 (or under --p99-ms when given); it is written to
+serving_config.json next to app.py together with the whole table, and picked up by
+app.py / `python serving.py --serve` when the CPU budget is the same. The load
+generator runs on the same machine and takes its share of the CPUs.
+
+  python benchmarks/tune_serving.py [--duration 10] [--rounds 3] [--concurrency 32] [--batch-share 0.05]
+  python benchmarks/tune_serving.py --dry-run   # print the candidates only
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import serving
+from suite import frontend_payload
+
+UNTUNED = {"workers": 1, "inference_threads": 40, "booster_threads": 0}  # 0 = xgboost default (all cores)
+
+def candidates(cpus: int, max_workers: int = 1) -> List[Dict[str, int]]:
+    worker_counts = sorted({w for w in (1, 2, 4, 8, 16, 32, cpus) if w <= min(cpus, max_workers)})
+    out = [dict(UNTUNED)]
+    for w in worker_counts:
+        for t in (1, 2, 4):
+            for b in sorted({1, max(1, cpus // w)}):
+                out.append({"workers": w, "inference_threads": t, "booster_threads": b})
+    return out
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(cand: Dict[str, int], port: int) -> subprocess.Popen:
+    env = dict(os.environ, SERVING_WORKERS=str(cand["workers"]), INFERENCE_THREADS=str(cand["inference_threads"]),
+               MODEL_WATCH_SECONDS="0", CACHE_MAX_SIZE="0", PYTHONUNBUFFERED="1")
+    for var in ("BOOSTER_THREADS",) + serving.THREAD_ENV_VARS:
+        env.pop(var, None)
+    if cand["booster_threads"]:
+        env.update({var: str(cand["booster_threads"]) for var in ("BOOSTER_THREADS",) + serving.THREAD_ENV_VARS})
+    else:
+        env["BOOSTER_THREADS"] = "0"  # keep xgboost's default; OMP variables unset
+    cmd = [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+           "--workers", str(cand["workers"]), "--log-level", "warning"]
+    # stderr to a file: an unread pipe would block a chatty server once it fills
+    return subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=tempfile.TemporaryFile())
+
+async def _wait_ready(base: str, proc: subprocess.Popen, timeout: float) -> None:
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base) as client:
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                raise RuntimeError(f"server exited with status {proc.returncode}")
+            try:
+                if (await client.get("/")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"server not ready after {timeout:.0f}s")
+
+async def _drive(base: str, singles: List[Dict[str, Any]], batch: List[Dict[str, Any]], concurrency: int,
+                 duration: float, batch_share: float, warmup: float, seed: int) -> Dict[str, Any]:
+    import httpx
+
+    rng = random.Random(seed)
+    lat: Dict[str, List[float]] = {"single": [], "batch": []}
+    errors = 0
+    recording = False
+    stop_at = 0.0
+
+    async def worker(client):
+        nonlocal errors
+        i = rng.randrange(len(singles))
+        while time.perf_counter() < stop_at:
+            kind = "batch" if rng.random() < batch_share else "single"
+            t0 = time.perf_counter()
+            try:
+                if kind == "batch":
+                    r = await client.post("/predict/batch", json=batch)
+                else:
+                    r = await client.post("/predict", json=singles[i % len(singles)])
+                ok = r.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            if recording:
+                if ok:
+                    lat[kind].append(time.perf_counter() - t0)
+                else:
+                    errors += 1
+            i += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=60.0) as client:
+        for _ in range(4):  # every worker process loads model.pkl on its first big batch
+            await client.post("/predict/batch", json=batch)
+        stop_at = time.perf_counter() + warmup
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        recording = True
+        t0 = time.perf_counter()
+        stop_at = t0 + duration
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        wall = time.perf_counter() - t0
+
+    all_ms = np.array(lat["single"] + lat["batch"]) * 1e3
+    out = {"requests": int(len(all_ms)), "errors": errors, "rps": len(all_ms) / wall,
+           "p50_ms": float(np.percentile(all_ms, 50)) if len(all_ms) else None,
+           "p99_ms": float(np.percentile(all_ms, 99)) if len(all_ms) else None}
+    for kind, values in lat.items():
+        ms = np.array(values) * 1e3
+        out[kind] = {"requests": int(len(ms)),
+                     "p50_ms": float(np.percentile(ms, 50)) if len(ms) else None,
+                     "p99_ms": float(np.percentile(ms, 99)) if len(ms) else None}
+    return out
+
+def run_once(cand: Dict[str, int], args, singles, batch) -> Dict[str, Any]:
+    port = _free_port()
+    proc = start_server(cand, port)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        asyncio.run(_wait_ready(base, proc, args.startup_timeout))
+        res = asyncio.run(_drive(base, singles, batch, args.concurrency, args.duration,
+                                 args.batch_share, args.warmup, args.seed))
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return {**cand, **res}
+
+def run_candidate(cand: Dict[str, int], args, singles, batch) -> Dict[str, Any]:
+    runs = sorted((run_once(cand, args, singles, batch) for _ in range(args.rounds)), key=lambda r: r["rps"])
+    return dict(runs[len(runs) // 2], rps_rounds=[r["rps"] for r in runs])
+
+def pick(results: List[Dict[str, Any]], p99_slack: float, p99_ms: Optional[float]) -> Dict[str, Any]:
+    tuned = [r for r in results if r["booster_threads"] and r["p99_ms"] is not None and not r["errors"]]
+    if not tuned:
+        raise SystemExit("no candidate completed without errors")
+    limit = p99_ms if p99_ms is not None else min(r["p99_ms"] for r in tuned) * p99_slack
+    within = [r for r in tuned if r["p99_ms"] <= limit] or [min(tuned, key=lambda r: r["p99_ms"])]
+    return max(within, key=lambda r: r["rps"])
+
+def main():
+    ap = argparse.ArgumentParser(description="Sweep workers x inference threads x booster threads; write the best.")
+    ap.add_argument("--duration", type=float, default=10.0, help="measured seconds per candidate")
+    ap.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds of load first")
+    ap.add_argument("--concurrency", type=int, default=32, help="in-flight requests")
+    ap.add_argument("--rounds", type=int, default=3, help="runs per candidate (the median is kept)")
+    ap.add_argument("--batch-share", type=float, default=0.05, help="fraction of requests that are /predict/batch")
+    ap.add_argument("--batch-rows", type=int, default=256)
+    ap.add_argument("--p99-slack", type=float, default=1.25, help="keep candidates within this factor of the best p99")
+    ap.add_argument("--p99-ms", type=float, default=None, help="absolute p99 budget instead of --p99-slack")
+    ap.add_argument("--startup-timeout", type=float, default=120.0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default=serving.CONFIG_PATH)
+    ap.add_argument("--max-workers", type=int, default=1,
+                    help="also try this many uvicorn workers (admin calls and /metrics are per worker, see serving.py)")
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args()
+
+    cpus, detected = serving.cpu_budget()
+    cands = candidates(cpus, max(1, args.max_workers))
+    print(json.dumps({"detected": detected, "candidates": len(cands)}), flush=True)
+    if args.dry_run:
+        for c in cands:
+            print(json.dumps(c))
+        return
+
+    rng = random.Random(args.seed)
+    singles = [frontend_payload(rng) for _ in range(1000)]
+    batch = [frontend_payload(rng) for _ in range(args.batch_rows)]
+    results = []
+    for cand in cands:
+        res = run_candidate(cand, args, singles, batch)
+        results.append(res)
+        print(json.dumps(res), flush=True)
+
+    best = pick(results, args.p99_slack, args.p99_ms)
+    untuned = results[0]
+    print(f"\n{'workers':>7} {'threads':>7} {'booster':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}  batch p99 ms", flush=True)
+    for r in results:
+        mark = "  <- best" if r is best else ("  (untuned)" if r is untuned else "")
+        print(f"{r['workers']:>7} {r['inference_threads']:>7} {r['booster_threads'] or 'all':>7} {r['rps']:>9.1f} "
+              f"{r['p50_ms'] or float('nan'):>8.2f} {r['p99_ms'] or float('nan'):>8.2f}  "
+              f"{r['batch']['p99_ms'] or float('nan'):.2f}{mark}", flush=True)
+
+    config = {
+        "workers": best["workers"], "inference_threads": best["inference_threads"],
+        "booster_threads": best["booster_threads"], "cpus": cpus, "detected": detected,
+        "tuned_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "load": {k: getattr(args, k) for k in ("duration", "rounds", "concurrency", "batch_share", "batch_rows",
+                                               "p99_slack", "p99_ms")},
+        "best": best, "untuned": untuned, "results": results,
+    }
+    tmp = args.out + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(config, f, indent=2)
+    os.replace(tmp, args.out)
+    print(f"Wrote {args.out}: workers={best['workers']} inference_threads={best['inference_threads']} "
+          f"booster_threads={best['booster_threads']}", flush=True)
+
+if __name__ == "__main__":
+    main()
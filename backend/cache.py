@@ -0,0 +1,96 @@
+"""
+In-process LRU + TTL cache for raw model probabilities.
+
+Keys are (model version, predictor artifact digest, encoded float32 feature row): two
+payloads that parse to the same features share an entry no matter how they were
+spelled, and re-loading a version with different predictor artifacts never reads the
+old entries (app.py also drops a version's entries whenever it is re-loaded). Only
+p_raw is cached; the prevalence adjustment is cheap and applied afterwards, so every
+pi_deploy value reuses the same entry.
+"""
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+import threading
+import time
+
+class PredictionCache:
+    def __init__(self, max_size: int = 10000, ttl_seconds: float = 3600.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_size = int(max_size)
+        self.ttl_seconds = float(ttl_seconds)
+        self._clock = clock
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get_many(self, keys: Sequence[Hashable]) -> List[Optional[Any]]:
+        """Values for keys (None on miss or expired); hits are moved to the MRU end."""
+        now = self._clock()
+        out: List[Optional[Any]] = []
+        with self._lock:
+            for k in keys:
+                item = self._data.get(k)
+                if item is not None and self.ttl_seconds > 0 and now - item[0] > self.ttl_seconds:
+                    del self._data[k]
+                    self.expirations += 1
+                    item = None
+                if item is None:
+                    self.misses += 1
+                    out.append(None)
+                else:
+                    self._data.move_to_end(k)
+                    self.hits += 1
+                    out.append(item[1])
+        return out
+
+    def put_many(self, items: Sequence[Tuple[Hashable, Any]]) -> None:
+        now = self._clock()
+        with self._lock:
+            for k, v in items:
+                self._data[k] = (now, v)
+                self._data.move_to_end(k)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        return self.get_many([key])[0]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self.put_many([(key, value)])
+
+    def invalidate(self, version: Optional[str] = None) -> int:
+        """Drop every entry (or only those of one model version); returns how many were dropped."""
+        with self._lock:
+            if version is None:
+                n = len(self._data)
+                self._data.clear()
+            else:
+                stale = [k for k in self._data if isinstance(k, tuple) and k and k[0] == version]
+                for k in stale:
+                    del self._data[k]
+                n = len(stale)
+            self.invalidations += n
+        return n
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,109 @@
+"""
+Small Python client for the risk API: packed binary scoring plus the JSON endpoints.
+
+Standard library HTTP (one keep-alive connection) + NumPy; the wire format is packed.py.
+
+  from client import RiskClient
+  with RiskClient("http://127.0.0.1:8000") as api:
+      body = api.pack(patients)                  # dicts as /predict takes them; convert once
+      res = api.predict_packed(body, pi_deploy=0.002)
+      res.risks                                  # float32 array, one risk per patient
+      res.model_version, res.adjusted            # from the response headers
+      api.predict(patients[0])                   # JSON /predict, for comparison
+"""
+from typing import Any, Dict, List, Mapping, Optional, Union
+from urllib.parse import urlencode, urlsplit
+import http.client
+import json
+
+import numpy as np
+
+from packed import CONTENT_TYPE, FORMAT_VERSION, RECORD_DTYPE, decode_risks, pack_records
+
+class ApiError(RuntimeError):
+    def __init__(self, status: int, detail: Any):
+        super().__init__(f"HTTP {status}: {detail}")
+        self.status = status
+        self.detail = detail
+
+class PackedResult:
+    def __init__(self, risks: np.ndarray, headers: Dict[str, str]):
+        self.risks = risks
+        self.headers = headers
+        self.model_version = headers.get("x-model-version")
+        self.adjusted = headers.get("x-risk") == "adjusted"
+        self.pi_train = float(headers["x-pi-train"]) if headers.get("x-pi-train") else None
+        self.pi_deploy = float(headers["x-pi-deploy"]) if headers.get("x-pi-deploy") else None
+
+class RiskClient:
+    def __init__(self, base_url: str = "http://127.0.0.1:8000", timeout: float = 30.0):
+        url = urlsplit(base_url)
+        conn_cls = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        self._conn = conn_cls(url.hostname, url.port, timeout=timeout)
+        self._prefix = url.path.rstrip("/")
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "RiskClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _request(self, method: str, path: str, body: Optional[bytes], headers: Dict[str, str],
+                 query: Dict[str, Any]):
+        query = {k: v for k, v in query.items() if v is not None}
+        url = self._prefix + path + ("?" + urlencode(query) if query else "")
+        try:
+            self._conn.request(method, url, body=body, headers=headers)
+            resp = self._conn.getresponse()
+        except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+            self._conn.close()  # server closed the idle keep-alive connection: retry once on a new one
+            self._conn.request(method, url, body=body, headers=headers)
+            resp = self._conn.getresponse()
+        data = resp.read()
+        if resp.status != 200:
+            try:
+                detail = json.loads(data).get("detail", data.decode(errors="replace"))
+            except ValueError:
+                detail = data.decode(errors="replace")
+            raise ApiError(resp.status, detail)
+        return data, {k.lower(): v for k, v in resp.getheaders()}
+
+    # ----- packed -----
+    @staticmethod
+    def pack(records: List[Mapping[str, Any]]) -> bytes:
+        """PatientInput-style dicts -> packed request body (see packed.pack_records)."""
+        return pack_records(records)
+
+    def predict_packed(self, records: Union[bytes, np.ndarray, List[Mapping[str, Any]]],
+                       pi_deploy: Optional[float] = None, model_version: Optional[str] = None) -> PackedResult:
+        """POST /predict/packed: a packed body, a RECORD_DTYPE array or dicts -> float32 risks."""
+        if isinstance(records, np.ndarray):
+            body = np.ascontiguousarray(records, dtype=RECORD_DTYPE).tobytes()
+        elif isinstance(records, (bytes, bytearray, memoryview)):
+            body = bytes(records)
+        else:
+            body = pack_records(records)
+        data, headers = self._request(
+            "POST", "/predict/packed", body,
+            {"Content-Type": f"{CONTENT_TYPE}; v={FORMAT_VERSION}"},
+            {"pi_deploy": pi_deploy, "model_version": model_version},
+        )
+        return PackedResult(decode_risks(data), headers)
+
+    # ----- JSON -----
+    def predict(self, record: Mapping[str, Any], pi_deploy: Optional[float] = None,
+                model_version: Optional[str] = None) -> Dict[str, Any]:
+        data, _ = self._request("POST", "/predict", json.dumps(record).encode(),
+                                {"Content-Type": "application/json"},
+                                {"pi_deploy": pi_deploy, "model_version": model_version})
+        return json.loads(data)
+
+    def predict_batch(self, records: List[Mapping[str, Any]], pi_deploy: Optional[float] = None,
+                      model_version: Optional[str] = None) -> Dict[str, Any]:
+        data, _ = self._request("POST", "/predict/batch", json.dumps(list(records)).encode(),
+                                {"Content-Type": "application/json"},
+                                {"pi_deploy": pi_deploy, "model_version": model_version})
+        return json.loads(data)
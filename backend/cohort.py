@@ -0,0 +1,400 @@
+"""
+Cohort aggregation: grouped risk summaries over an uploaded population, no per-patient rows.
+
+A cohort (CSV with PatientInput column names, NDJSON of PatientInput objects, or packed
+records, see packed.py) is read incrementally -- `CohortReader.feed` takes the body as
+it arrives and hands back chunks of parsed columns -- and every chunk goes through the
+vectorized encoder (InferenceEngine.encode_coded) and one model call. The risks of the
+chunk are folded into `CohortAggregator` and dropped.
+
+The aggregator keeps, per group (a combination of the --group-by values) and per series
+(raw risk, then the risk after prior adjustment at each pi_deploy), a histogram of
+risk_percentage at the 0.01-point resolution /predict reports it (10000 bins). Counts at
+or above each threshold, the mean and the quantiles (nearest rank) are read off the
+histograms, so they are those of the risk_percentage values /predict would have returned,
+and memory is groups x series x 40 kB whatever the number of rows.
+
+Group fields: gender, radon_exposure, alcohol_consumption, asbestos_exposure,
+secondhand_smoke_exposure, copd_diagnosis, family_history, age_band (10-year bands).
+
+Same engine from the command line (artifacts next to this file unless --model-dir):
+  python cohort.py cohort.csv --group-by radon_exposure,gender --threshold 5 10 --pi-deploy 0.002 0.01
+"""
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import csv
+import json
+import math
+
+import numpy as np
+
+from encoding import ALCOHOL_LEVELS, FIELDS, RADON_LEVELS
+from inference import prior_adjust_grid
+from packed import CONTENT_TYPE as PACKED_CONTENT_TYPE, RECORD_DTYPE, check_content_type, decode_records
+
+PCT_BINS = 10000  # risk_percentage 0.00 .. 99.99 in 0.01 steps (_to_percent clips at 0.9999)
+DEFAULT_THRESHOLDS = (1.0, 5.0, 10.0)
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+MAX_GROUPS = 256
+MAX_ERRORS = 20  # row errors echoed back (all of them are counted)
+
+NDJSON_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonlines"}
+CSV_TYPES = {"text/csv", "application/csv"}
+
+AGE_BAND_LABELS = [f"{10 * i}-{10 * i + 9}" for i in range(10)] + ["100+"]
+_YES_NO = ["no", "yes"]
+
+# group field -> (parsed column, labels indexed by code)
+GROUP_FIELDS: Dict[str, Tuple[str, List[str]]] = {
+    "gender": ("gender", ["female", "male"]),
+    "radon_exposure": ("radon_level", RADON_LEVELS),
+    "alcohol_consumption": ("alcohol_level", ALCOHOL_LEVELS),
+    "asbestos_exposure": ("asbestos_exposure", _YES_NO),
+    "secondhand_smoke_exposure": ("secondhand_smoke_exposure", _YES_NO),
+    "copd_diagnosis": ("copd_diagnosis", _YES_NO),
+    "family_history": ("family_history", _YES_NO),
+    "age_band": ("age", AGE_BAND_LABELS),
+}
+
+class CohortError(ValueError):
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+# -------------------
+# Parsed columns: numerics float64, binaries 0/1, radon_level / alcohol_level codes into
+# RADON_LEVELS / ALCOHOL_LEVELS (what packed records carry already)
+# -------------------
+def _level_codes(values: np.ndarray, levels: Sequence[str]) -> np.ndarray:
+    uniq, inv = np.unique(values.astype(str), return_inverse=True)
+    lut = np.array([list(levels).index(v) if v in levels else 0 for v in uniq.tolist()], dtype=np.intp)
+    return lut[inv]
+
+def parse_columns(raw: Dict[str, Sequence[Any]]) -> Dict[str, np.ndarray]:
+    """Raw input columns by PatientInput field -> parsed columns (same encoders as /predict)."""
+    cols: Dict[str, np.ndarray] = {}
+    for field, (key, enc) in FIELDS.items():
+        values = enc.encode(raw[field])
+        if key == "radon_level":
+            values = _level_codes(values, RADON_LEVELS)
+        elif key == "alcohol_level":
+            values = _level_codes(values, ALCOHOL_LEVELS)
+        cols[key] = values
+    return cols
+
+def packed_columns(rec: np.ndarray) -> Dict[str, np.ndarray]:
+    cols = {f: rec[f] for f in RECORD_DTYPE.names if f not in ("radon", "alcohol")}
+    cols.update(radon_level=rec["radon"].astype(np.intp), alcohol_level=rec["alcohol"].astype(np.intp))
+    return cols
+
+def engine_columns(cols: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """Parsed columns as InferenceEngine.encode_coded takes them."""
+    out: Dict[str, Any] = dict(cols)
+    out.update(radon_level=(cols["radon_level"], RADON_LEVELS), alcohol_level=(cols["alcohol_level"], ALCOHOL_LEVELS))
+    return out
+
+def score_columns(engine, cols: Dict[str, np.ndarray]) -> np.ndarray:
+    return engine.predict_raw(engine.encode_coded(engine_columns(cols)))
+
+# -------------------
+# Incremental body reader
+# -------------------
+def format_for(content_type: str) -> str:
+    media = (content_type or "").split(";")[0].strip().lower()
+    if media in CSV_TYPES:
+        return "csv"
+    if media in NDJSON_TYPES:
+        return "ndjson"
+    if media == PACKED_CONTENT_TYPE:
+        check_content_type(content_type)  # format version
+        return "packed"
+    raise CohortError("Cohort body must be text/csv, NDJSON (application/x-ndjson) or "
+                      f"packed records ({PACKED_CONTENT_TYPE})", status=415)
+
+class CohortReader:
+    """Body bytes in (any split), chunks of <= chunk_rows parsed columns out.
+
+    Rows that cannot be scored (bad JSON, not an object, missing fields, short CSV lines)
+    are counted in `failed` and the first MAX_ERRORS are kept in `errors`; a malformed
+    packed body or a CSV header without the PatientInput columns fails the whole upload.
+    """
+
+    def __init__(self, fmt: str, chunk_rows: int = 4096):
+        if fmt not in ("csv", "ndjson", "packed"):
+            raise CohortError(f"Unknown cohort format: {fmt}")
+        self.fmt = fmt
+        self.chunk_rows = max(1, int(chunk_rows))
+        self.rows = 0     # data rows seen (scored or failed)
+        self.failed = 0
+        self.errors: List[Dict[str, Any]] = []
+        self._buf = b""
+        self._header: Optional[Dict[str, int]] = None  # CSV: field -> column position
+        self._width = 0
+        self._pending: List[Any] = []
+
+    def _error(self, index: int, message: str) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({"index": index, "error": message})
+
+    def feed(self, data: bytes) -> List[Dict[str, np.ndarray]]:
+        self._buf += data
+        if self.fmt == "packed":
+            size = RECORD_DTYPE.itemsize * self.chunk_rows
+            n = len(self._buf) // size * size
+            body, self._buf = self._buf[:n], self._buf[n:]
+            return self._packed(body)
+        end = self._buf.rfind(b"\n")
+        if end < 0:
+            return []
+        lines, self._buf = self._buf[:end + 1], self._buf[end + 1:]
+        self._lines(lines.decode("utf-8").splitlines())
+        return self._drain(final=False)
+
+    def close(self) -> List[Dict[str, np.ndarray]]:
+        rest, self._buf = self._buf, b""
+        if self.fmt == "packed":
+            return self._packed(rest)
+        self._lines(rest.decode("utf-8").splitlines())
+        if self.fmt == "csv" and self._header is None:
+            raise CohortError("CSV body has no header line")
+        return self._drain(final=True)
+
+    def _packed(self, body: bytes) -> List[Dict[str, np.ndarray]]:
+        rec = decode_records(body)  # PackedFormatError (a ValueError with .status) on a bad body
+        chunks = [packed_columns(rec[i:i + self.chunk_rows]) for i in range(0, len(rec), self.chunk_rows)]
+        self.rows += len(rec)
+        return chunks
+
+    def _lines(self, lines: Iterable[str]) -> None:
+        if self.fmt == "ndjson":
+            for line in lines:
+                if not line.strip():
+                    continue
+                index = self.rows
+                self.rows += 1
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    self._error(index, f"invalid JSON: {e}")
+                    continue
+                if not isinstance(row, dict):
+                    self._error(index, "row is not a JSON object")
+                    continue
+                missing = [f for f in FIELDS if f not in row]
+                if missing:
+                    self._error(index, f"missing field(s): {', '.join(missing)}")
+                    continue
+                self._pending.append(row)
+            return
+        reader = csv.reader(lines)
+        if self._header is None:
+            for names in reader:
+                if not any(n.strip() for n in names):
+                    continue
+                names = [n.strip().lstrip("\ufeff") for n in names]
+                missing = [f for f in FIELDS if f not in names]
+                if missing:
+                    raise CohortError(f"CSV header is missing column(s): {', '.join(missing)}")
+                self._header = {f: names.index(f) for f in FIELDS}
+                self._width = len(names)
+                break
+        for values in reader:
+            if not values:
+                continue
+            index = self.rows
+            self.rows += 1
+            if len(values) < self._width:
+                self._error(index, f"{len(values)} values for {self._width} columns")
+                continue
+            self._pending.append(values)
+
+    def _drain(self, final: bool) -> List[Dict[str, np.ndarray]]:
+        chunks = []
+        while len(self._pending) >= self.chunk_rows or (final and self._pending):
+            rows, self._pending = self._pending[:self.chunk_rows], self._pending[self.chunk_rows:]
+            if self.fmt == "ndjson":
+                raw = {f: [r[f] for r in rows] for f in FIELDS}
+            else:
+                raw = {f: [r[i] for r in rows] for f, i in self._header.items()}
+            chunks.append(parse_columns(raw))
+        return chunks
+
+# -------------------
+# Aggregation
+# -------------------
+def _to_codes(p: np.ndarray) -> np.ndarray:
+    """Probabilities -> risk_percentage in 0.01 steps as integer bins (app._to_percent, vectorized)."""
+    return np.rint(np.clip(p, 0.0, 0.9999) * 100.0 * 100.0).astype(np.intp)
+
+def _summary(h: np.ndarray, thresholds: Sequence[float], quantiles: Sequence[float]) -> Dict[str, Any]:
+    n = int(h.sum())
+    if not n:
+        return {"mean": None, "min": None, "max": None, "quantiles": {}, "at_or_above": {}}
+    pct = np.arange(PCT_BINS) / 100.0
+    cum = np.cumsum(h, dtype=np.int64)
+    nz = np.flatnonzero(h)
+    above = {}
+    for t in thresholds:
+        k = min(max(math.ceil(round(t * 100.0, 6)), 0), PCT_BINS)
+        count = n - (int(cum[k - 1]) if k > 0 else 0)
+        above[f"{t:g}"] = {"count": count, "share": count / n}
+    return {
+        "mean": round(float((h * pct).sum()) / n, 4),
+        "min": float(pct[nz[0]]),
+        "max": float(pct[nz[-1]]),
+        "quantiles": {f"{q:g}": float(pct[np.searchsorted(cum, max(1, math.ceil(q * n)))]) for q in quantiles},
+        "at_or_above": above,
+    }
+
+class CohortAggregator:
+    """Grouped risk_percentage histograms: raw risk + the risk adjusted to each pi_deploy."""
+
+    def __init__(self, group_by: Sequence[str] = (), thresholds: Sequence[float] = DEFAULT_THRESHOLDS,
+                 pi_deploys: Sequence[float] = (), pi_train: Optional[float] = None,
+                 quantiles: Sequence[float] = DEFAULT_QUANTILES, max_groups: int = MAX_GROUPS):
+        unknown = [g for g in group_by if g not in GROUP_FIELDS]
+        if unknown:
+            raise CohortError(f"Unknown group field(s): {', '.join(unknown)} (one of {', '.join(GROUP_FIELDS)})",
+                              status=422)
+        if len(set(group_by)) != len(group_by):
+            raise CohortError("Group fields must be different", status=422)
+        if any(not 0.0 <= q <= 1.0 for q in quantiles):
+            raise CohortError("Quantiles must be in 0..1", status=422)
+        if any(not 0.0 < pi < 1.0 for pi in pi_deploys):
+            raise CohortError("pi_deploy values must be in (0, 1)", status=422)
+        self.group_by = list(group_by)
+        self.thresholds = sorted(set(float(t) for t in thresholds))
+        self.pi_deploys = [float(pi) for pi in pi_deploys]
+        self.pi_train = pi_train
+        self.adjustable = pi_train is not None and 0.0 < pi_train < 1.0
+        self.quantiles = sorted(set(float(q) for q in quantiles))
+        self.max_groups = max_groups
+        self.n_series = 1 + len(self.pi_deploys)
+        self._radix = [len(GROUP_FIELDS[g][1]) for g in self.group_by]
+        self._slots: Dict[int, int] = {}  # combined group code -> row of _hist
+        self._hist = np.zeros((0, self.n_series, PCT_BINS), dtype=np.uint32)
+
+    def _group_codes(self, cols: Dict[str, np.ndarray]) -> np.ndarray:
+        n = len(cols["age"])
+        code = np.zeros(n, dtype=np.int64)
+        for g, radix in zip(self.group_by, self._radix):
+            key = GROUP_FIELDS[g][0]
+            if g == "age_band":
+                c = np.clip(np.floor(cols[key] / 10.0), 0, radix - 1).astype(np.int64)
+            else:
+                c = np.asarray(cols[key], dtype=np.int64)
+            code = code * radix + c
+        return code
+
+    def _slot_rows(self, codes: Sequence[int]) -> np.ndarray:
+        for c in codes:
+            if c not in self._slots:
+                if len(self._slots) >= self.max_groups:
+                    raise CohortError(f"More than {self.max_groups} groups; group by fewer fields", status=422)
+                self._slots[c] = len(self._slots)
+        if len(self._slots) > len(self._hist):
+            grown = np.zeros((max(len(self._slots), 2 * len(self._hist)), self.n_series, PCT_BINS), dtype=np.uint32)
+            grown[:len(self._hist)] = self._hist
+            self._hist = grown
+        return np.array([self._slots[c] for c in codes], dtype=np.intp)
+
+    def update(self, cols: Dict[str, np.ndarray], p_raw: np.ndarray) -> None:
+        """Fold one scored chunk in (parsed columns + its p_raw); nothing per row is kept."""
+        if not len(p_raw):
+            return
+        series = [p_raw]
+        if self.pi_deploys:
+            adj = prior_adjust_grid(p_raw, self.pi_train, self.pi_deploys)  # no pi_train: raw risk again
+            series.extend(adj.T)
+        codes = np.column_stack([_to_codes(p) for p in series])  # (n, n_series)
+        uniq, inv = np.unique(self._group_codes(cols), return_inverse=True)
+        rows = self._slot_rows(uniq.tolist())[inv]
+        flat = (rows[:, None] * self.n_series + np.arange(self.n_series)) * PCT_BINS + codes
+        idx, counts = np.unique(flat, return_counts=True)
+        self._hist.reshape(-1)[idx] += counts.astype(np.uint32)
+
+    @property
+    def groups(self) -> int:
+        return len(self._slots)
+
+    @property
+    def memory_bytes(self) -> int:
+        return int(self._hist.nbytes)
+
+    def _labels(self, code: int) -> Dict[str, str]:
+        labels = {}
+        for g, radix in reversed(list(zip(self.group_by, self._radix))):
+            code, c = divmod(code, radix)
+            labels[g] = GROUP_FIELDS[g][1][c]
+        return {g: labels[g] for g in self.group_by}
+
+    def _entry(self, h: np.ndarray) -> Dict[str, Any]:
+        return {
+            "count": int(h[0].sum()),
+            "raw_risk_percentage": _summary(h[0], self.thresholds, self.quantiles),
+            "adjusted": [
+                {"pi_deploy": pi, "adjusted_for_prevalence": self.adjustable,
+                 "risk_percentage": _summary(h[1 + k], self.thresholds, self.quantiles)}
+                for k, pi in enumerate(self.pi_deploys)
+            ],
+        }
+
+    def report(self) -> Dict[str, Any]:
+        hist = self._hist[:len(self._slots)]
+        groups = [dict(group=self._labels(code), **self._entry(hist[slot]))
+                  for code, slot in sorted(self._slots.items())]
+        total = hist.sum(axis=0, dtype=np.int64) if len(hist) else np.zeros((self.n_series, PCT_BINS), np.int64)
+        return {
+            "group_by": self.group_by,
+            "thresholds": self.thresholds,
+            "quantiles": self.quantiles,
+            "pi_train": self.pi_train,
+            "pi_deploy": self.pi_deploys,
+            "total": self._entry(total),
+            "groups": groups,
+        }
+
+def aggregate_stream(engine, reader: CohortReader, agg: CohortAggregator, blocks: Iterable[bytes]) -> None:
+    """Whole cohort, synchronously: blocks of body bytes -> chunks -> model -> agg."""
+    for block in blocks:
+        for cols in reader.feed(block):
+            agg.update(cols, score_columns(engine, cols))
+    for cols in reader.close():
+        agg.update(cols, score_columns(engine, cols))
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import time
+
+    from registry import load_version
+
+    ap = argparse.ArgumentParser(description="Grouped risk summaries of a cohort file (CSV, NDJSON or packed records).")
+    ap.add_argument("path")
+    ap.add_argument("--format", choices=("auto", "csv", "ndjson", "packed"), default="auto",
+                    help="auto: by extension (.csv, .ndjson/.jsonl, anything else packed)")
+    ap.add_argument("--group-by", default="", help="comma-separated, e.g. radon_exposure,gender")
+    ap.add_argument("--threshold", type=float, nargs="+", default=list(DEFAULT_THRESHOLDS), help="risk %% cut-offs")
+    ap.add_argument("--pi-deploy", type=float, nargs="*", default=[])
+    ap.add_argument("--quantile", type=float, nargs="+", default=list(DEFAULT_QUANTILES))
+    ap.add_argument("--chunk-rows", type=int, default=4096)
+    ap.add_argument("--max-groups", type=int, default=MAX_GROUPS)
+    ap.add_argument("--model-dir", default=os.path.dirname(os.path.abspath(__file__)))
+    args = ap.parse_args()
+
+    fmt = args.format
+    if fmt == "auto":
+        ext = os.path.splitext(args.path)[1].lower()
+        fmt = "csv" if ext == ".csv" else "ndjson" if ext in (".ndjson", ".jsonl") else "packed"
+    mv = load_version(args.model_dir)
+    group_by = [g.strip() for g in args.group_by.split(",") if g.strip()]
+    agg = CohortAggregator(group_by, args.threshold, args.pi_deploy, mv.pi_train, args.quantile, args.max_groups)
+    reader = CohortReader(fmt, args.chunk_rows)
+    t0 = time.perf_counter()
+    with open(args.path, "rb") as f:
+        aggregate_stream(mv.engine, reader, agg, iter(lambda: f.read(1 << 20), b""))
+    seconds = time.perf_counter() - t0
+    out = {"model_version": mv.version, "rows": reader.rows, "ok": reader.rows - reader.failed,
+           "failed": reader.failed, "errors": reader.errors, "seconds": round(seconds, 3),
+           "memory_bytes": agg.memory_bytes, **agg.report()}
+    print(json.dumps(out, indent=2))
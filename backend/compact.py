@@ -0,0 +1,205 @@
+"""
+Compact, pickle-free serving artifact (model_compact.bin) that workers memory-map.
+
+One file holds everything the API needs to serve without unpickling:
+- scaler statistics, meta.json, the model.pkl digest (= default version) and class name
+- sections of raw arrays: "fused" (model_fused.npz: all fold trees + isotonic steps),
+  and when they were built from the same model.pkl "table" (risk_table.npz) and
+  "explain" (model_explain.npz)
+
+Every compiled artifact records the digest of the model.pkl it was built from (an extra
+"model_digest" array in the npz files, a "model_digest" field in the JSON reports, the
+header here); loaders compare it with file_digest(model.pkl), never file times, so a copy,
+a restore from backup or a coarse-mtime filesystem cannot pair artifacts of two models.
+
+Layout: magic, format version, header length, JSON header, then every array 64-byte
+aligned. `CompactArtifact.open` maps the file read-only and returns zero-copy NumPy
+views, so startup does no parsing beyond the header and every worker on the host shares
+the same page-cache pages (forked or spawned alike). sklearn/xgboost are only imported
+if model.pkl is actually needed (big batches, compiling missing tables).
+
+Written by lungcancer.py after the other artifacts; for an existing artifact directory:
+  python compact.py [--dir .]
+"""
+from typing import Any, Dict, Optional, Sequence
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+
+COMPACT_NAME = "model_compact.bin"
+COMPACT_FORMAT_VERSION = 1
+MAGIC = b"LCRMODEL"
+_PREFIX = struct.Struct("<8sIIQ")  # magic, format version, reserved, header length
+ALIGN = 64
+SECTION_FILES = {"fused": "model_fused.npz", "table": "risk_table.npz", "explain": "model_explain.npz"}
+MODEL_DIGEST_KEY = "model_digest"
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()[:12]
+
+def stamp_digest(arrays: Dict[str, np.ndarray], model_digest: str) -> Dict[str, np.ndarray]:
+    """arrays + the digest of the model.pkl they were compiled from (save before writing the npz)."""
+    return dict(arrays, **{MODEL_DIGEST_KEY: np.array(model_digest)})
+
+def artifact_digest(path: str) -> Optional[str]:
+    """model.pkl digest recorded in an .npz / .json artifact (None: missing, unreadable or unstamped)."""
+    try:
+        if path.endswith(".npz"):
+            with np.load(path, allow_pickle=False) as z:
+                return str(z[MODEL_DIGEST_KEY]) if MODEL_DIGEST_KEY in z.files else None
+        with open(path) as f:
+            digest = json.load(f).get(MODEL_DIGEST_KEY)
+        return str(digest) if digest is not None else None
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def built_from(path: str, model_digest: Optional[str]) -> bool:
+    """path exists and was compiled from the model.pkl with this digest."""
+    return model_digest is not None and artifact_digest(path) == model_digest
+
+def scaler_stats(scaler) -> Dict[str, Any]:
+    """The StandardScaler state InferenceEngine reads, as plain JSON (floats round-trip exactly)."""
+    return {
+        "feature_names_in_": [str(c) for c in getattr(scaler, "feature_names_in_", [])],
+        "mean_": np.asarray(scaler.mean_, dtype=np.float64).tolist() if getattr(scaler, "mean_", None) is not None else None,
+        "scale_": np.asarray(scaler.scale_, dtype=np.float64).tolist() if getattr(scaler, "scale_", None) is not None else None,
+        "with_mean": bool(getattr(scaler, "with_mean", True)),
+        "with_std": bool(getattr(scaler, "with_std", True)),
+    }
+
+class ScalerStats:
+    """Stand-in for the fitted StandardScaler (the attributes InferenceEngine uses + transform)."""
+
+    def __init__(self, stats: Dict[str, Any]):
+        if stats["feature_names_in_"]:
+            self.feature_names_in_ = np.asarray(stats["feature_names_in_"], dtype=object)
+        self.mean_ = np.asarray(stats["mean_"], dtype=np.float64) if stats["mean_"] is not None else None
+        self.scale_ = np.asarray(stats["scale_"], dtype=np.float64) if stats["scale_"] is not None else None
+        self.with_mean = stats["with_mean"]
+        self.with_std = stats["with_std"]
+
+    def transform(self, X) -> np.ndarray:
+        X = np.array(X, dtype=np.float64)
+        if self.with_mean and self.mean_ is not None:
+            X -= self.mean_
+        if self.with_std and self.scale_ is not None:
+            X /= self.scale_
+        return X
+
+def write_compact(path: str, header: Dict[str, Any], sections: Dict[str, Dict[str, np.ndarray]]) -> int:
+    """Write header + aligned arrays atomically (tmp file + rename); returns the file size."""
+    layout: Dict[str, Dict[str, Any]] = {}
+    blobs, offset = [], 0
+    for sec, arrays in sections.items():
+        layout[sec] = {}
+        for name, arr in arrays.items():
+            arr = np.ascontiguousarray(arr)
+            if arr.dtype.hasobject:
+                raise ValueError(f"{sec}/{name}: object arrays cannot be mapped")
+            offset = -(-offset // ALIGN) * ALIGN
+            layout[sec][name] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": offset}
+            blobs.append((offset, arr))
+            offset += arr.nbytes
+    head = json.dumps(dict(header, format_version=COMPACT_FORMAT_VERSION, sections=layout)).encode("utf-8")
+    data_start = -(-(_PREFIX.size + len(head)) // ALIGN) * ALIGN
+
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, COMPACT_FORMAT_VERSION, 0, len(head)))
+        f.write(head)
+        for off, arr in blobs:
+            f.seek(data_start + off)
+            f.write(arr.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp, path)
+    return data_start + offset
+
+class CompactArtifact:
+    """Read-only mapping of model_compact.bin; sections are dicts of zero-copy array views."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, head_len = _PREFIX.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a compact model artifact")
+        if version != COMPACT_FORMAT_VERSION:
+            raise ValueError(f"Unsupported compact artifact version {version} in {path}")
+        self.header: Dict[str, Any] = json.loads(self._mm[_PREFIX.size:_PREFIX.size + head_len])
+        self._data_start = -(-(_PREFIX.size + head_len) // ALIGN) * ALIGN
+
+    @classmethod
+    def open(cls, path: str) -> "CompactArtifact":
+        return cls(path)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._mm)
+
+    def sections(self) -> Sequence[str]:
+        return list(self.header["sections"])
+
+    def section(self, name: str) -> Optional[Dict[str, np.ndarray]]:
+        spec = self.header["sections"].get(name)
+        if spec is None:
+            return None
+        out = {}
+        for key, a in spec.items():
+            dtype = np.dtype(a["dtype"])
+            count = int(np.prod(a["shape"], dtype=np.int64))
+            out[key] = np.frombuffer(self._mm, dtype=dtype, count=count,
+                                     offset=self._data_start + a["offset"]).reshape(a["shape"])
+        return out
+
+def build_compact(base_dir: str, scaler, model, model_digest: str) -> str:
+    """Pack scaler + meta + the npz artifacts in base_dir that were built from model.pkl (model_digest)."""
+    scaler_path = os.path.join(base_dir, "scaler.pkl")
+    meta: Dict[str, Any] = {}
+    meta_path = os.path.join(base_dir, "meta.json")
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+    sections: Dict[str, Dict[str, np.ndarray]] = {}
+    for sec, fname in SECTION_FILES.items():
+        p = os.path.join(base_dir, fname)
+        if built_from(p, model_digest):
+            with np.load(p, allow_pickle=False) as z:
+                sections[sec] = {k: z[k] for k in z.files if k != MODEL_DIGEST_KEY}
+    if "fused" not in sections:
+        raise FileNotFoundError("model_fused.npz missing or built from another model.pkl "
+                                "(run: python lungcancer.py --compile-only)")
+    header = {
+        "created_at": time.time(),
+        MODEL_DIGEST_KEY: model_digest,
+        "scaler_digest": file_digest(scaler_path) if os.path.exists(scaler_path) else None,
+        "model_class": type(getattr(model, "estimator", model)).__name__,
+        "scaler": scaler_stats(scaler),
+        "meta": meta,
+    }
+    path = os.path.join(base_dir, COMPACT_NAME)
+    write_compact(path, header, sections)
+    return path
+
+if __name__ == "__main__":
+    import argparse
+
+    import joblib
+
+    ap = argparse.ArgumentParser(description="Pack the artifacts of a directory into model_compact.bin.")
+    ap.add_argument("--dir", default=os.path.dirname(os.path.abspath(__file__)))
+    args = ap.parse_args()
+    model_path = os.path.join(args.dir, "model.pkl")
+    out = build_compact(args.dir, joblib.load(os.path.join(args.dir, "scaler.pkl")), joblib.load(model_path),
+                        file_digest(model_path))
+    art = CompactArtifact.open(out)
+    print(f"✅ Saved: {out} ({art.nbytes / 1e6:.1f} MB; sections: {', '.join(art.sections())})", flush=True)
@@ -0,0 +1,288 @@
+"""
+Streaming drift monitor: live inputs and predicted risk vs the training profile.
+
+Reference (drift_reference.json, written by lungcancer.py at train time):
+- age / pack_years: decile bin edges of the training rows and their proportions
+- each binary input, radon and alcohol level: category proportions
+- p_raw: decile bins of the model's held-out test-split predictions, plus its mean and pi_train
+- the scaler statistics and column positions, so encoded rows can be read back
+
+Live side: `DriftMonitor.submit` (request path) only appends (version, rows, p_raw) to a
+bounded deque -- no lock, no arithmetic. A daemon thread folds batches into per-version
+`DriftSketch`es: fixed-bin counts in a ring of time slots, so memory is O(slots x bins)
+however much traffic flows. Scores are recomputed from the counts on read:
+- PSI = sum((live - ref) * ln(live / ref)) over bins (< 0.1 stable, 0.1-0.25 moderate, > 0.25 major)
+- KS  = max |CDF_live - CDF_ref| over the bin edges (ordered features and p_raw)
+"""
+from collections import deque
+from typing import Any, Dict, List, Optional, Sequence
+import json
+import threading
+import time
+
+import numpy as np
+
+DRIFT_FORMAT_VERSION = 1
+PSI_EPS = 1e-4
+PSI_MODERATE, PSI_MAJOR = 0.1, 0.25
+
+def _quantile_edges(v: np.ndarray, bins: int) -> List[float]:
+    """Interior edges at the reference quantiles (duplicates dropped for discrete-heavy columns)."""
+    qs = np.quantile(v, np.linspace(0.0, 1.0, bins + 1)[1:-1])
+    return np.unique(qs).astype(float).tolist()
+
+def _bin_counts(v: np.ndarray, edges: Sequence[float]) -> np.ndarray:
+    return np.bincount(np.searchsorted(np.asarray(edges), v, side="right"), minlength=len(edges) + 1)
+
+def decode_rows(ref: Dict[str, Any], X: np.ndarray) -> Dict[str, np.ndarray]:
+    """Encoded (standardized, one-hot) rows -> raw numerics and category codes per monitored input."""
+    out: Dict[str, np.ndarray] = {}
+    for name, f in ref["numeric"].items():
+        # rounded: inputs sit exactly on quantile edges (integer ages) and float32 encoding is ~1e-6 off
+        out[name] = np.round(X[:, f["col"]].astype(np.float64) * f["scale"] + f["mean"], 3)
+    for name, f in ref["categorical"].items():
+        cols = f["cols"]
+        if len(cols) == 1:  # binary 0/1
+            out[name] = (X[:, cols[0]] >= 0.5).astype(np.int64)
+        else:  # one-hot block, level order
+            out[name] = np.argmax(X[:, cols], axis=1)
+    return out
+
+def build_reference(X: np.ndarray, feature_order: Sequence[str], numeric_cols: Sequence[str],
+                    binary_cols: Sequence[str], one_hot: Dict[str, Sequence[str]], mean: Sequence[float],
+                    scale: Sequence[float], p_raw: np.ndarray, pi_train: float, bins: int = 10) -> Dict[str, Any]:
+    """Profile of encoded training rows X (as the model sees them) and held-out predictions p_raw.
+
+    one_hot: input name -> its one-hot columns in level order, e.g. {"radon_exposure": ["radon_low", ...]}.
+    """
+    col = {c: i for i, c in enumerate(feature_order)}
+    X = np.asarray(X, dtype=np.float64)
+    ref: Dict[str, Any] = {"format_version": DRIFT_FORMAT_VERSION, "rows": int(len(X)), "numeric": {}, "categorical": {}}
+    for j, c in enumerate(numeric_cols):
+        ref["numeric"][c] = {"col": col[c], "mean": float(mean[j]), "scale": float(scale[j])}
+    for c in binary_cols:
+        ref["categorical"][c] = {"cols": [col[c]], "levels": ["0", "1"]}
+    for name, cols in one_hot.items():
+        ref["categorical"][name] = {"cols": [col[c] for c in cols], "levels": [c.split("_", 1)[1] for c in cols]}
+
+    raw = decode_rows(ref, X)
+    for c, f in ref["numeric"].items():
+        f["edges"] = _quantile_edges(raw[c], bins)
+        f["proportions"] = (_bin_counts(raw[c], f["edges"]) / len(X)).tolist()
+    for c, f in ref["categorical"].items():
+        f["proportions"] = (np.bincount(raw[c], minlength=len(f["levels"])) / len(X)).tolist()
+    p_raw = np.asarray(p_raw, dtype=np.float64)
+    edges = _quantile_edges(p_raw, bins)
+    ref["p_raw"] = {"edges": edges, "proportions": (_bin_counts(p_raw, edges) / len(p_raw)).tolist(),
+                    "mean": float(p_raw.mean()), "rows": int(len(p_raw))}
+    ref["pi_train"] = float(pi_train)
+    return ref
+
+def save_reference(ref: Dict[str, Any], path: str) -> None:
+    with open(path, "w") as f:
+        json.dump(ref, f, indent=1)
+
+def load_reference(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        ref = json.load(f)
+    if ref.get("format_version") != DRIFT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported drift reference version in {path}")
+    return ref
+
+def psi(live: np.ndarray, ref: np.ndarray) -> float:
+    a = np.maximum(live, PSI_EPS)
+    b = np.maximum(ref, PSI_EPS)
+    return float(np.sum((a - b) * np.log(a / b)))
+
+def ks_binned(live: np.ndarray, ref: np.ndarray) -> float:
+    return float(np.max(np.abs(np.cumsum(live) - np.cumsum(ref)))) if len(ref) else 0.0
+
+def _level(score: float) -> str:
+    return "major" if score > PSI_MAJOR else "moderate" if score > PSI_MODERATE else "stable"
+
+class DriftSketch:
+    """Fixed-bin counts of one version's traffic in a ring of `slots` time slots."""
+
+    def __init__(self, ref: Dict[str, Any], window_seconds: float = 3600.0, slots: int = 12):
+        self.ref = ref
+        self.slots = max(1, int(slots))
+        self.slot_seconds = float(window_seconds) / self.slots
+        self.names = list(ref["numeric"]) + list(ref["categorical"]) + ["p_raw"]
+        self.sizes = [len(ref["numeric"][c]["edges"]) + 1 for c in ref["numeric"]] \
+            + [len(ref["categorical"][c]["levels"]) for c in ref["categorical"]] \
+            + [len(ref["p_raw"]["edges"]) + 1]
+        self.window = [[np.zeros(k, dtype=np.int64) for k in self.sizes] for _ in range(self.slots)]
+        self.slot_ids = [-1] * self.slots
+        self.total = [np.zeros(k, dtype=np.int64) for k in self.sizes]
+        self.sum_p = 0.0
+        self.window_sum_p = [0.0] * self.slots
+        self.rows = 0
+
+    def _slot(self, now: float) -> int:
+        sid = int(now // self.slot_seconds)
+        i = sid % self.slots
+        if self.slot_ids[i] != sid:  # slot reused: drop what it held from the previous lap
+            for c in self.window[i]:
+                c.fill(0)
+            self.window_sum_p[i] = 0.0
+            self.slot_ids[i] = sid
+        return i
+
+    def update(self, X: np.ndarray, p_raw: np.ndarray, now: Optional[float] = None) -> None:
+        raw = decode_rows(self.ref, X)
+        counts = [_bin_counts(raw[c], self.ref["numeric"][c]["edges"]) for c in self.ref["numeric"]]
+        counts += [np.bincount(raw[c], minlength=len(self.ref["categorical"][c]["levels"])) for c in self.ref["categorical"]]
+        counts.append(_bin_counts(np.asarray(p_raw, dtype=np.float64), self.ref["p_raw"]["edges"]))
+        i = self._slot(time.time() if now is None else now)
+        for tot, win, c in zip(self.total, self.window[i], counts):
+            tot += c
+            win += c
+        s = float(np.sum(p_raw))
+        self.sum_p += s
+        self.window_sum_p[i] += s
+        self.rows += len(X)
+
+    def _scores(self, counts: List[np.ndarray], sum_p: float) -> Dict[str, Any]:
+        n = int(counts[0].sum()) if counts else 0
+        out: Dict[str, Any] = {"rows": n, "features": {}}
+        if n == 0:
+            return out
+        worst = 0.0
+        for name, c in zip(self.names, counts):
+            if name == "p_raw":
+                ref, ordered = self.ref["p_raw"], True
+            elif name in self.ref["numeric"]:
+                ref, ordered = self.ref["numeric"][name], True
+            else:
+                ref, ordered = self.ref["categorical"][name], False
+            live = c / n
+            r = np.asarray(ref["proportions"])
+            entry = {"psi": psi(live, r), "live": live.round(4).tolist(), "reference": r.round(4).tolist()}
+            if ordered:
+                entry["ks"] = ks_binned(live, r)
+                entry["edges"] = ref["edges"]
+            else:
+                entry["levels"] = ref["levels"]
+            entry["status"] = _level(entry["psi"])
+            worst = max(worst, entry["psi"])
+            if name == "p_raw":
+                entry["mean_live"] = sum_p / n
+                entry["mean_reference"] = self.ref["p_raw"]["mean"]
+                out["prediction"] = entry
+            else:
+                out["features"][name] = entry
+        out["max_psi"] = worst
+        out["status"] = _level(worst)
+        return out
+
+    def report(self, now: Optional[float] = None) -> Dict[str, Any]:
+        now = time.time() if now is None else now
+        oldest = int(now // self.slot_seconds) - self.slots + 1
+        live = [i for i, sid in enumerate(self.slot_ids) if sid >= oldest]
+        window = [sum((self.window[i][k] for i in live), np.zeros(size, dtype=np.int64))
+                  for k, size in enumerate(self.sizes)]
+        return {
+            "window_seconds": self.slot_seconds * self.slots,
+            "window": self._scores(window, sum(self.window_sum_p[i] for i in live)),
+            "since_start": self._scores(self.total, self.sum_p),
+            "pi_train": self.ref.get("pi_train"),
+        }
+
+class DriftMonitor:
+    """Per-version sketches fed off the request path.
+
+    `submit` appends to a bounded deque (thread-safe without a lock in CPython); a daemon
+    thread drains it every `interval` seconds. When the deque is full the oldest batches
+    are discarded and counted as dropped rather than slowing requests down.
+    """
+
+    def __init__(self, window_seconds: float = 3600.0, slots: int = 12, max_pending: int = 10000,
+                 interval: float = 0.25):
+        self.window_seconds = window_seconds
+        self.slots = slots
+        self.interval = interval
+        self._queue: deque = deque(maxlen=max(1, int(max_pending)))
+        self._sketches: Dict[str, DriftSketch] = {}
+        self._lock = threading.Lock()  # drain vs report, never taken by submit
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.submitted = 0
+        self.processed = 0
+
+    def submit(self, version: str, ref: Optional[Dict[str, Any]], X: np.ndarray, p_raw: np.ndarray) -> None:
+        """Request path: copies X (callers reuse their buffer) and enqueues."""
+        if ref is None:
+            return
+        self._queue.append((version, ref, X.copy(), p_raw))
+        self.submitted += 1
+
+    def drain(self) -> int:
+        with self._lock:
+            batches: Dict[str, list] = {}
+            while True:
+                try:
+                    version, ref, X, p = self._queue.popleft()
+                except IndexError:
+                    break
+                batches.setdefault(version, [ref, [], []])
+                batches[version][1].append(X)
+                batches[version][2].append(p)
+            for version, (ref, xs, ps) in batches.items():
+                sketch = self._sketches.get(version)
+                if sketch is None or sketch.ref is not ref:  # new version (or reloaded under the same name)
+                    sketch = self._sketches[version] = DriftSketch(ref, self.window_seconds, self.slots)
+                sketch.update(np.concatenate(xs), np.concatenate(ps))
+                self.processed += len(xs)
+            return sum(len(b[1]) for b in batches.values())
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.drain()
+            except Exception as e:  # never let a bad batch stop monitoring
+                print(f"Drift monitor: dropped a batch ({e})", flush=True)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="drift-monitor", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def forget(self, version: str) -> None:
+        with self._lock:
+            self._sketches.pop(version, None)
+
+    def report(self, version: str) -> Optional[Dict[str, Any]]:
+        self.drain()  # include what is still queued
+        with self._lock:
+            sketch = self._sketches.get(version)
+            return sketch.report() if sketch is not None else None
+
+    def psi_by_feature(self) -> Dict[tuple, float]:
+        """(version, feature) -> windowed PSI, for the /metrics gauges."""
+        out = {}
+        with self._lock:
+            sketches = list(self._sketches.items())
+        for version, sketch in sketches:
+            w = sketch.report()["window"]
+            for name, entry in w.get("features", {}).items():
+                out[(version, name)] = entry["psi"]
+            if "prediction" in w:
+                out[(version, "p_raw")] = w["prediction"]["psi"]
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "versions": list(self._sketches),
+            "submitted": self.submitted,
+            "processed": self.processed,
+            "pending": len(self._queue),
+            "dropped": max(0, self.submitted - self.processed - len(self._queue)),
+            "window_seconds": self.window_seconds,
+        }
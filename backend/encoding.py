@@ -0,0 +1,382 @@
+"""
+Input normalizers shared by the trainer (lungcancer.py) and the API (app.py).
+
+Each column is a precompiled lookup table from normalized text (lowercase, NBSP and
+runs of whitespace collapsed) to its encoded value; text not in the table goes to the
+column's fallback (e.g. yes/no: a number >= 0.5 is yes, anything else no). Every
+entry point runs the same code:
+
+  ENCODERS["radon_exposure"].encode("High")                 -> "high"
+  ENCODERS["radon_exposure"].encode(["High", " h", None])   -> array(["high", "high", "low"])
+  ENCODERS["radon_exposure"].encode(df["radon_exposure"])   (NumPy arrays alike)
+
+The values are factorized to their distinct raw values, each distinct value is mapped
+once, and the result is broadcast back with one gather. A CSV column with a handful of
+spellings costs a handful of lookups however long it is; pandas is only touched when
+a pandas object is passed in, so the API does not import it.
+
+Conformance of the trainer and API encodings on a fuzzed corpus, against the trainer's
+pandas parsers from before this module (kept below as `reference_features`):
+  python encoding.py [--rows 20000]
+"""
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+import math
+import re
+
+import numpy as np
+
+RADON_LEVELS = ["low", "medium", "high"]
+ALCOHOL_LEVELS = ["none", "moderate", "heavy"]
+
+MEMO_SIZE = 4096  # raw values remembered per column (clients send a few spellings over and over)
+
+_NULLS = ("none", "no", "0", "nil", "null", "n/a", "na", "")
+_YES = ("1", "y", "yes", "true", "t")
+_NO = ("0", "n", "no", "false", "f")
+
+def norm_text(v: Any) -> str:
+    """Robust lowercase + whitespace normalize (handles NBSP)."""
+    s = "" if v is None else str(v)
+    s = s.replace("\u00a0", " ")  # NBSP -> space
+    return " ".join(s.split()).lower()
+
+# what pd.to_numeric (the trainer's original numeric cast) accepts: ASCII decimal text with
+# ASCII whitespace around it; float() also takes "1_0", full-width / Arabic-Indic digits
+# and NBSP, which training always turned into 0
+_DECIMAL = re.compile(r"[+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?")  # inf / nan: default anyway
+_ASCII_SPACE = " \t\n\r\x0b\x0c"
+
+def _to_float(s: str) -> Optional[float]:
+    s = s.strip(_ASCII_SPACE)
+    if not _DECIMAL.fullmatch(s):
+        return None
+    x = float(s)
+    return x if math.isfinite(x) else None
+
+def _threshold(s: str) -> int:
+    try:
+        return 1 if float(s) >= 0.5 else 0
+    except ValueError:
+        return 0
+
+class ColumnEncoder:
+    """One input column: normalized text -> value via `table`, else `fallback(text)`.
+
+    table maps each encoded value to its spellings; a spelling listed under two values
+    keeps the first one.
+    """
+
+    def __init__(self, name: str, table: Sequence[Tuple[Any, Sequence[str]]],
+                 fallback: Callable[[str], Any], dtype):
+        self.name = name
+        self.dtype = np.dtype(dtype)
+        self.fallback = fallback
+        self.table: Dict[str, Any] = {}
+        for value, spellings in table:
+            for s in spellings:
+                self.table.setdefault(s, value)
+        self._memo: Dict[Tuple[type, Any], Any] = {}
+
+    def parse(self, v: Any) -> Any:
+        """One raw value -> encoded value (the per-distinct-value step)."""
+        try:
+            key = (v.__class__, v)
+            return self._memo[key]
+        except KeyError:
+            pass
+        except TypeError:  # unhashable
+            return self._lookup(v)
+        out = self._lookup(v)
+        if len(self._memo) < MEMO_SIZE:
+            self._memo[key] = out
+        return out
+
+    def _lookup(self, v: Any) -> Any:
+        s = norm_text(v)
+        hit = self.table.get(s, _MISS)
+        return self.fallback(s) if hit is _MISS else hit
+
+    def encode(self, values: Any):
+        """Scalar -> Python scalar; list / NumPy array / pandas Series -> 1-d array of self.dtype."""
+        if _is_scalar(values):  # a single value is its own distinct value: just the lookup
+            return self.parse(values)
+        return self._map(values)
+
+    def _map(self, values) -> np.ndarray:
+        codes, uniques = _factorize(values)
+        return np.array([self.parse(u) for u in uniques], dtype=self.dtype)[codes]
+
+class NumericEncoder(ColumnEncoder):
+    """Numbers and numeric text -> float64; unparseable, NaN and ±inf -> `default`."""
+
+    def __init__(self, name: str, default: float = 0.0):
+        self.default = default
+        super().__init__(name, (), self._from_text, np.float64)
+
+    def _from_text(self, s: str) -> float:
+        x = _to_float(s)
+        return self.default if x is None else x
+
+    def _lookup(self, v: Any) -> float:
+        return self._from_text("" if v is None else str(v))  # raw text: no NBSP / case folding
+
+    def parse(self, v: Any) -> float:
+        if isinstance(v, (int, float, np.number, np.bool_)):
+            x = float(v)
+            return x if math.isfinite(x) else self.default
+        return super().parse(v)
+
+    def _map(self, values) -> np.ndarray:
+        arr = values.to_numpy() if hasattr(values, "to_numpy") else values
+        if not isinstance(arr, np.ndarray):
+            try:
+                arr = np.array(arr)
+            except ValueError:  # ragged nested JSON values
+                arr = None
+        if arr is not None and arr.ndim == 1 and arr.dtype.kind in "biuf":  # already numbers: no lookups
+            x = arr.astype(np.float64)
+            return np.where(np.isfinite(x), x, self.default)
+        return super()._map(values)
+
+_MISS = object()
+
+def _is_scalar(values: Any) -> bool:
+    return not isinstance(values, (list, tuple, np.ndarray)) and not hasattr(values, "to_numpy")
+
+def _factorize(values) -> Tuple[np.ndarray, List[Any]]:
+    """-> (codes, distinct raw values) with distinct[codes] == values."""
+    if hasattr(values, "to_numpy"):  # pandas Series / Index (e.g. a `category` CSV column)
+        if values.dtype != object:
+            import pandas as pd
+
+            codes, uniques = pd.factorize(values, use_na_sentinel=True)
+            # trailing slot for missing values (code -1), parsed exactly like a NaN cell
+            return codes, list(uniques) + [float("nan")]
+        values = values.to_numpy()  # pandas would merge 1, 1.0 and True
+    if isinstance(values, np.ndarray) and values.dtype.kind in "biufUS":
+        uniques, codes = np.unique(values.ravel(), return_inverse=True)
+        return codes, uniques.tolist()
+    seen: Dict[Any, int] = {}
+    try:
+        # (type, value): 1 and True hash alike but parse differently ("1" vs "true")
+        codes = [seen.setdefault((v.__class__, v), len(seen)) for v in values]
+        return np.asarray(codes, dtype=np.intp), [k[1] for k in seen]
+    except TypeError:  # unhashable JSON values (lists/dicts): key them by their text
+        seen.clear()
+        distinct: List[Any] = []
+        codes = []
+        for v in values:
+            k = (v.__class__, v) if getattr(v, "__hash__", None) else (str, str(v))
+            if k not in seen:
+                seen[k] = len(distinct)
+                distinct.append(v)
+            codes.append(seen[k])
+        return np.asarray(codes, dtype=np.intp), distinct
+
+# -------------------
+# Column tables
+# -------------------
+YESNO = ColumnEncoder("yesno", [(1, _YES), (0, _NO)], _threshold, np.int8)
+GENDER = ColumnEncoder("gender", [(1, ("male", "m") + _YES), (0, ("female",) + _NO)], _threshold, np.int8)
+RADON = ColumnEncoder(
+    "radon_exposure",
+    [("low", ("low", "l")), ("medium", ("medium", "med", "mid", "m")), ("high", ("high", "h")),
+     ("low", _NULLS)],  # "none"/missing folds into "low" (3-bucket scheme)
+    lambda s: "low", object,
+)
+ALCOHOL = ColumnEncoder(
+    "alcohol_consumption",
+    [("none", _NULLS), ("moderate", ("moderate", "mod", "medium", "light", "low")),
+     ("heavy", ("heavy", "high", "yes", "1"))],
+    lambda s: "none", object,
+)
+TARGET = ColumnEncoder(
+    "lung_cancer",
+    [(1, ("1", "y", "yes", "true", "t", "pos", "positive", "present",
+          "cancer", "lung cancer", "malignant", "has_cancer", "has cancer")),
+     (0, ("0", "n", "no", "false", "f", "neg", "negative", "absent",
+          "no cancer", "benign", "none", "healthy"))],
+    _threshold, np.int64,
+)
+NUMERIC = NumericEncoder("numeric")
+
+# raw input column -> (parsed-row key, encoder); the parsed row is what the API echoes as
+# `inputs_used` and inference.InferenceEngine encodes
+FIELDS: Dict[str, Tuple[str, ColumnEncoder]] = {
+    "age": ("age", NUMERIC),
+    "pack_years": ("pack_years", NUMERIC),
+    "gender": ("gender", GENDER),
+    "asbestos_exposure": ("asbestos_exposure", YESNO),
+    "secondhand_smoke_exposure": ("secondhand_smoke_exposure", YESNO),
+    "copd_diagnosis": ("copd_diagnosis", YESNO),
+    "family_history": ("family_history", YESNO),
+    "radon_exposure": ("radon_level", RADON),
+    "alcohol_consumption": ("alcohol_level", ALCOHOL),
+}
+ENCODERS: Dict[str, ColumnEncoder] = {field: enc for field, (_, enc) in FIELDS.items()}
+
+def parse_records(records: Sequence[Mapping[str, Any]]) -> List[Dict[str, Any]]:
+    """Raw patient dicts -> parsed rows (plain Python values), one vectorized pass per column."""
+    if not records:
+        return []
+    cols = {key: enc.encode([r.get(field) for r in records]).tolist() for field, (key, enc) in FIELDS.items()}
+    keys = list(cols)
+    return [dict(zip(keys, vals)) for vals in zip(*cols.values())]
+
+def parse_record(record: Mapping[str, Any]) -> Dict[str, Any]:
+    """One raw patient dict -> parsed row (/predict; same lookups as parse_records)."""
+    return {key: enc.parse(record.get(field)) for field, (key, enc) in FIELDS.items()}
+
+# -------------------
+# Conformance: the trainer's encoding before encoding.py (frozen below as the reference)
+# vs the trainer now (lungcancer.encode_features + scaler) vs the API (parse_records /
+# parse_record + InferenceEngine)
+# -------------------
+def _ref_norm_text(v) -> str:
+    s = "" if v is None else str(v)
+    s = s.replace("\u00a0", " ")
+    s = " ".join(s.split())
+    return s.lower()
+
+def _ref_parse_yesno(v) -> int:
+    s = _ref_norm_text(v)
+    if s in {"1", "y", "yes", "true", "t"}:
+        return 1
+    if s in {"0", "n", "no", "false", "f"}:
+        return 0
+    try:
+        return 1 if float(s) >= 0.5 else 0
+    except:
+        return 0
+
+def _ref_parse_gender(v) -> int:
+    s = _ref_norm_text(v)
+    if s in {"male", "m", "1"}:
+        return 1
+    if s in {"female", "f", "0"}:
+        return 0
+    return _ref_parse_yesno(v)
+
+def _ref_norm_radon(v) -> str:
+    s = _ref_norm_text(v)
+    if s in {"low", "l"}:
+        return "low"
+    if s in {"medium", "med", "mid", "m"}:
+        return "medium"
+    if s in {"high", "h"}:
+        return "high"
+    return "low"
+
+def _ref_norm_alcohol(v) -> str:
+    s = _ref_norm_text(v)
+    if s in {"none", "no", "0", "nil", "null", "n/a", "na", ""}:
+        return "none"
+    if s in {"moderate", "mod", "medium", "light", "low"}:
+        return "moderate"
+    if s in {"heavy", "high", "yes", "1"}:
+        return "heavy"
+    return "none"
+
+def reference_features(df):
+    """Unscaled model matrix as lungcancer.load_dataframe encoded it before encoding.py
+    (row-wise apply + pd.to_numeric + get_dummies). One deliberate difference: ±inf maps to
+    0 like NaN (it used to reach StandardScaler and fail the run)."""
+    import pandas as pd
+
+    out = pd.DataFrame(index=df.index)
+    for c in ("age", "pack_years"):
+        x = pd.to_numeric(df[c], errors="coerce").astype(float)
+        out[c] = x.where(np.isfinite(x), 0.0)
+    out["gender"] = df["gender"].apply(_ref_parse_gender).astype(int)
+    for c in ("asbestos_exposure", "secondhand_smoke_exposure", "copd_diagnosis", "family_history"):
+        out[c] = df[c].apply(_ref_parse_yesno).astype(int)
+    radon = pd.get_dummies(df["radon_exposure"].map(_ref_norm_radon), prefix="radon", dtype=int)
+    alcohol = pd.get_dummies(df["alcohol_consumption"].map(_ref_norm_alcohol), prefix="alcohol", dtype=int)
+    out = out.join(radon.reindex(columns=[f"radon_{lvl}" for lvl in RADON_LEVELS], fill_value=0))
+    return out.join(alcohol.reindex(columns=[f"alcohol_{lvl}" for lvl in ALCOHOL_LEVELS], fill_value=0))
+
+def fuzz_records(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Raw rows as clients and CSV exports send them: every spelling, case and whitespace
+    variant, numbers as text, bools, None/NaN, unknown strings and junk."""
+    rng = np.random.default_rng(seed)
+    words = sorted({s for enc in (YESNO, GENDER, RADON, ALCOHOL) for s in enc.table}
+                   | {"maybe", "unknown", "?", "-", "2", "0.49", "0.5", "-1", "1e3", "1_0", "inf", "nan"})
+
+    def text() -> Any:
+        r = rng.random()
+        if r < 0.08:
+            return [None, float("nan"), True, False, 0, 1, 0.5, 0.49, 2][int(rng.integers(0, 9))]
+        w = words[int(rng.integers(0, len(words)))]
+        style = int(rng.integers(0, 5))
+        w = [w, w.upper(), w.title(), f"  {w}\t", f" {w} "][style]
+        return w
+
+    def number() -> Any:
+        r = rng.random()
+        x = float(np.round(rng.uniform(0, 100), int(rng.integers(0, 4))))
+        if r < 0.6:
+            return x
+        if r < 0.7:
+            return int(x)
+        if r < 0.85:
+            return f" {x} "
+        junk = [None, float("nan"), "", "n/a", "abc", True, "1e2", "-5", "inf", "1_0", "\uff11\uff12",
+                "12\u00a0", " +.5\t", "0x10", "1,5"]
+        return junk[int(rng.integers(0, len(junk)))]
+
+    return [{f: number() if enc is NUMERIC else text() for f, (_, enc) in FIELDS.items()} for _ in range(n)]
+
+def check_conformance(engine, scaler, n_rows: int = 20000, seed: int = 0) -> Dict[str, Any]:
+    """Same fuzzed rows through the reference, the trainer and the API: model inputs must
+    match bit for bit."""
+    import pandas as pd
+
+    import lungcancer
+
+    records = fuzz_records(n_rows, seed)
+    # a DataFrame column per input, as read_raw_csv would hand it over
+    df = pd.DataFrame({f: pd.Series([r[f] for r in records], dtype=object) for f in FIELDS})
+
+    def scaled(x: "pd.DataFrame") -> np.ndarray:
+        x = x.copy()
+        x[lungcancer.NUMERIC_COLS] = scaler.transform(x[lungcancer.NUMERIC_COLS])
+        return x[engine.feature_order].to_numpy(dtype=np.float32)
+
+    x_ref = scaled(reference_features(df))
+    x_train = scaled(lungcancer.encode_features(df))
+    # API: batch path and one-at-a-time path
+    x_batch = engine.encode_batch(parse_records(records)).copy()
+    x_single = np.vstack([engine.encode_row(parse_record(r)).copy() for r in records[:2000]])
+
+    def rows_differing(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        return np.flatnonzero(np.any(a.view(np.uint32) != b.view(np.uint32), axis=1))
+
+    train_diff = rows_differing(x_ref, x_train)
+    batch_diff = rows_differing(x_ref, x_batch)
+    return {
+        "rows": n_rows,
+        "train_equal": not len(train_diff),
+        "batch_equal": not len(batch_diff),
+        "single_equal": not len(rows_differing(x_ref[:len(x_single)], x_single)),
+        "mismatches": [records[i] for i in np.union1d(train_diff, batch_diff)[:5].tolist()],
+    }
+
+if __name__ == "__main__":
+    import argparse, json, os, sys
+    import joblib
+
+    from inference import InferenceEngine
+
+    ap = argparse.ArgumentParser(description="Check the trainer and API encodings against the reference on fuzzed rows.")
+    ap.add_argument("--rows", type=int, default=20000)
+    args = ap.parse_args()
+
+    base = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(base, "meta.json")) as f:
+        meta = json.load(f)
+    scaler = joblib.load(os.path.join(base, "scaler.pkl"))
+    engine = InferenceEngine(None, scaler, meta["feature_order"], meta["numeric_cols"], meta["binary_cols"],
+                             meta["radon_levels"], meta["alcohol_levels"])
+    report = check_conformance(engine, scaler, args.rows)
+    print(json.dumps(report, indent=2, default=str))
+    sys.exit(0 if report["train_equal"] and report["batch_equal"] and report["single_equal"] else 1)
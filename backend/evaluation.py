@@ -0,0 +1,259 @@
+"""
+Held-out evaluation: operating points at deployment prevalences, bootstrap confidence
+intervals and reliability bins, saved as evaluation.json next to meta.json (lungcancer.py
+writes it with the other artifacts, the API serves it from /model-info).
+
+The calibrated model's scores take a limited set of distinct values (isotonic steps), so
+a split is summarized as counts of positives and negatives per distinct score, sorted
+once in descending order; every metric is then a cumulative sum over those levels:
+- ROC-AUC (ties count 1/2), PR-AUC (average precision, the step-wise sum sklearn
+  uses), Brier, log loss, ECE (equal-width bins, as lungcancer.calibration_metrics)
+- operating points, per pi_deploy: thresholds on the prevalence-adjusted risk (prior
+  adjustment is monotone in the score, so each threshold is a cut between two levels);
+  sensitivity and specificity from the cumulative counts, PPV and NPV at pi_deploy by
+  Bayes' rule (the test split has the training prevalence, not the deployment one), and
+  the share of patients flagged at pi_deploy
+- reliability: per equal-width bin of the raw score, mean predicted vs observed rate
+
+Bootstrap: a block of resamples is an index matrix (resamples x rows, drawn with
+replacement); one bincount over (resample, level, label) codes turns it into a
+(resamples, levels, 2) count tensor, and the metrics above are evaluated for the whole
+block at once. Blocks are spread over a process pool, each drawing from its own
+SeedSequence child, so the intervals do not depend on the worker count. Intervals are
+percentile intervals; resamples without positives or negatives are left out of the
+metrics they leave undefined.
+
+Check of the vectorized metrics against sklearn and a per-threshold loop:
+  python evaluation.py [--rows 4000]
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional, Sequence
+import json
+import os
+import time
+import warnings
+
+import numpy as np
+
+from inference import prior_adjust_array
+
+EVAL_FORMAT_VERSION = 1
+DEFAULT_RESAMPLES = 2000
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_PI_DEPLOYS = (0.002, 0.01, 0.05)
+RELIABILITY_BINS = 10
+BLOCK_RESAMPLES = 100  # resamples per pool task: a (100, rows) index matrix
+
+SCALAR_METRICS = ("roc_auc", "pr_auc", "brier", "log_loss", "ece")
+POINT_METRICS = ("sensitivity", "specificity", "ppv", "npv", "flagged")
+
+def threshold_grid() -> np.ndarray:
+    """Adjusted-risk thresholds: 0.1% steps to 2%, 0.5% steps to 20%, 2.5% steps to 97.5%."""
+    return np.round(np.concatenate([np.arange(1, 20) / 1000, np.arange(20, 200, 5) / 1000,
+                                    np.arange(200, 1000, 25) / 1000]), 6)
+
+def score_levels(y: np.ndarray, p: np.ndarray):
+    """-> (distinct scores, descending; per-row code 2 * level + label)."""
+    levels, inv = np.unique(np.asarray(p, dtype=np.float64), return_inverse=True)
+    levels = levels[::-1]
+    inv = len(levels) - 1 - inv
+    return levels, inv.astype(np.int64) * 2 + np.asarray(y).astype(np.int64)
+
+def level_counts(codes: np.ndarray, n_levels: int, idx: Optional[np.ndarray] = None) -> np.ndarray:
+    """(B, levels, 2) negatives / positives per level for each row of the index matrix idx
+    (B, rows); idx None: the split itself, B = 1."""
+    if idx is None:
+        return np.bincount(codes, minlength=2 * n_levels).reshape(1, n_levels, 2)
+    b = idx.shape[0]
+    flat = (np.arange(b)[:, None] * (2 * n_levels) + codes[idx]).ravel()
+    return np.bincount(flat, minlength=b * 2 * n_levels).reshape(b, n_levels, 2)
+
+class _Plan:
+    """Everything about the levels that does not depend on the resample."""
+
+    def __init__(self, levels: np.ndarray, pi_train: Optional[float], pi_deploys: Sequence[float],
+                 thresholds: np.ndarray, bins: int):
+        self.levels = levels
+        self.pi_deploys = [float(pi) for pi in pi_deploys]
+        self.thresholds = np.asarray(thresholds, dtype=np.float64)
+        self.bins = bins
+        self.level_bin = np.minimum((levels * bins).astype(np.int64), bins - 1)
+        self.bin_onehot = np.zeros((len(levels), bins))
+        self.bin_onehot[np.arange(len(levels)), self.level_bin] = 1.0
+        q = np.clip(levels, 1e-15, 1 - 1e-15)
+        self.log_p, self.log_1mp = np.log(q), np.log(1 - q)
+        # per pi_deploy: how many levels (from the top) are flagged at each threshold
+        self.cuts = []
+        for pi in self.pi_deploys:
+            adjusted = prior_adjust_array(levels, pi_train, pi) if pi_train is not None else levels
+            self.cuts.append(np.searchsorted(-adjusted, -self.thresholds, side="right"))
+
+def _metrics(counts: np.ndarray, plan: _Plan) -> Dict[str, np.ndarray]:
+    """Every metric for each resample of a (B, levels, 2) count tensor (leading axis B)."""
+    neg, pos = counts[..., 0].astype(np.float64), counts[..., 1].astype(np.float64)
+    n_pos, n_neg = pos.sum(1), neg.sum(1)
+    n = n_pos + n_neg
+    tp, fp = np.cumsum(pos, 1), np.cumsum(neg, 1)  # flagged when score >= level
+    s = plan.levels
+    out: Dict[str, np.ndarray] = {}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # each positive outranks the negatives below its level and ties with those on it
+        out["roc_auc"] = (pos * (n_neg[:, None] - fp + 0.5 * neg)).sum(1) / (n_pos * n_neg)
+        out["pr_auc"] = (pos * tp / (tp + fp)).sum(1, where=pos > 0) / n_pos
+        out["brier"] = (pos * (1 - s) ** 2 + neg * s ** 2).sum(1) / n
+        out["log_loss"] = -(pos * plan.log_p + neg * plan.log_1mp).sum(1) / n
+        bin_n = (pos + neg) @ plan.bin_onehot
+        bin_y = pos @ plan.bin_onehot
+        bin_p = ((pos + neg) * s) @ plan.bin_onehot
+        out["ece"] = np.abs(bin_y - bin_p).sum(1) / n
+        out["reliability_count"] = bin_n
+        out["reliability_mean_predicted"] = bin_p / bin_n
+        out["reliability_observed"] = bin_y / bin_n
+
+        tp0 = np.concatenate([np.zeros((len(n), 1)), tp], 1)
+        fp0 = np.concatenate([np.zeros((len(n), 1)), fp], 1)
+        for k, (pi, cut) in enumerate(zip(plan.pi_deploys, plan.cuts)):
+            sens = tp0[:, cut] / n_pos[:, None]
+            spec = 1.0 - fp0[:, cut] / n_neg[:, None]
+            flagged = sens * pi + (1.0 - spec) * (1.0 - pi)
+            out[f"{k}/sensitivity"] = sens
+            out[f"{k}/specificity"] = spec
+            out[f"{k}/ppv"] = sens * pi / flagged
+            out[f"{k}/npv"] = spec * (1.0 - pi) / (1.0 - flagged)
+            out[f"{k}/flagged"] = flagged
+    return out
+
+def _bootstrap_block(codes: np.ndarray, plan: _Plan, n_resamples: int, seed) -> Dict[str, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, len(codes), size=(n_resamples, len(codes)))
+    out = _metrics(level_counts(codes, len(plan.levels), idx), plan)
+    out.pop("reliability_count")
+    out.pop("reliability_mean_predicted")
+    return out
+
+def _round(v, digits: int = 6):
+    """Arrays -> JSON lists; NaN (undefined, e.g. PPV when nothing is flagged) -> None."""
+    a = np.round(np.asarray(v, dtype=np.float64), digits)
+    if a.ndim == 0:
+        return None if np.isnan(a) else float(a)
+    return [None if np.isnan(x) else float(x) for x in a]
+
+def evaluate_scores(y, p, pi_train: Optional[float], pi_deploys: Sequence[float] = DEFAULT_PI_DEPLOYS,
+                    thresholds: Optional[Sequence[float]] = None, resamples: int = DEFAULT_RESAMPLES,
+                    confidence: float = DEFAULT_CONFIDENCE, workers: int = 1, seed: int = 0,
+                    bins: int = RELIABILITY_BINS) -> Dict[str, Any]:
+    """Point estimates + bootstrap intervals of everything above, as the evaluation.json dict."""
+    y = np.asarray(y).astype(np.int64)
+    levels, codes = score_levels(y, p)
+    plan = _Plan(levels, pi_train, pi_deploys, threshold_grid() if thresholds is None else thresholds, bins)
+    point = {k: v[0] for k, v in _metrics(level_counts(codes, len(levels)), plan).items()}
+
+    t0 = time.perf_counter()
+    sizes = [min(BLOCK_RESAMPLES, resamples - i) for i in range(0, resamples, BLOCK_RESAMPLES)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if workers > 1 and len(sizes) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(sizes))) as pool:
+            blocks = list(pool.map(_bootstrap_block, [codes] * len(sizes), [plan] * len(sizes), sizes, seeds))
+    else:
+        blocks = [_bootstrap_block(codes, plan, b, s) for b, s in zip(sizes, seeds)]
+    seconds = time.perf_counter() - t0
+    tail = 100.0 * (1.0 - confidence) / 2.0
+    lo, hi = {}, {}
+    if blocks:
+        for key in blocks[0]:
+            boot = np.concatenate([blk[key] for blk in blocks])
+            with warnings.catch_warnings():  # all-NaN columns (e.g. PPV where nothing is flagged) stay NaN
+                warnings.simplefilter("ignore", RuntimeWarning)
+                lo[key], hi[key] = np.nanpercentile(boot, [tail, 100.0 - tail], axis=0)
+
+    def interval(key: str) -> Dict[str, Any]:
+        return {"value": _round(point[key]), "lo": _round(lo[key]) if key in lo else None,
+                "hi": _round(hi[key]) if key in hi else None}
+
+    thr = plan.thresholds
+    operating_points = []
+    for k, pi in enumerate(plan.pi_deploys):
+        if pi_train is not None and 0.0 < pi_train < 1.0:
+            # the raw score each adjusted-risk threshold corresponds to (inverse prior adjustment)
+            base = (pi / (1 - pi)) / (pi_train / (1 - pi_train))
+            raw = (thr / (1 - thr) / base) / (1 + thr / (1 - thr) / base)
+        else:
+            raw = thr
+        operating_points.append({"pi_deploy": pi, "threshold": _round(thr), "raw_threshold": _round(raw),
+                                 **{m: interval(f"{k}/{m}") for m in POINT_METRICS}})
+    return {
+        "format_version": EVAL_FORMAT_VERSION,
+        "rows": int(len(y)),
+        "positives": int(y.sum()),
+        "prevalence": float(y.mean()) if len(y) else None,
+        "pi_train": pi_train,
+        "distinct_scores": int(len(levels)),
+        "bootstrap": {"resamples": int(resamples), "confidence": confidence, "seed": seed,
+                      "workers": int(workers), "seconds": round(seconds, 3)},
+        "metrics": {m: interval(m) for m in SCALAR_METRICS},
+        "operating_points": operating_points,
+        "reliability": {
+            "bins": bins,
+            "edges": _round(np.linspace(0.0, 1.0, bins + 1)),
+            "count": [int(c) for c in point["reliability_count"]],
+            "mean_predicted": _round(point["reliability_mean_predicted"]),
+            "observed": interval("reliability_observed"),
+        },
+    }
+
+def save_evaluation(report: Dict[str, Any], path: str) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(report, f)
+    os.replace(tmp, path)
+
+def load_evaluation(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path) as f:
+            report = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return report if report.get("format_version") == EVAL_FORMAT_VERSION else None
+
+# -------------------
+# Check: vectorized metrics vs sklearn and a direct loop over thresholds
+# -------------------
+def check_metrics(n_rows: int = 4000, seed: int = 0) -> Dict[str, Any]:
+    from sklearn.metrics import average_precision_score, brier_score_loss, log_loss, roc_auc_score
+
+    rng = np.random.default_rng(seed)
+    y = (rng.random(n_rows) < 0.7).astype(np.int64)
+    # isotonic-like: few distinct scores, many ties
+    p = np.round(np.clip(0.5 * y + rng.normal(0.35, 0.25, n_rows), 0.0, 1.0), 2)
+    pi_train, pis = float(y.mean()), [0.002, 0.05]
+    rep = evaluate_scores(y, p, pi_train, pis, resamples=200, workers=1, seed=seed)
+    rep2 = evaluate_scores(y, p, pi_train, pis, resamples=200, workers=2, seed=seed)
+    ref = {"roc_auc": roc_auc_score(y, p), "pr_auc": average_precision_score(y, p),
+           "brier": brier_score_loss(y, p), "log_loss": log_loss(y, np.clip(p, 1e-15, 1 - 1e-15))}
+    diffs = {m: abs(rep["metrics"][m]["value"] - v) for m, v in ref.items()}
+
+    worst = 0.0
+    for op in rep["operating_points"]:
+        adj = prior_adjust_array(p, pi_train, op["pi_deploy"])
+        for j, t in enumerate(op["threshold"]):
+            flag = adj >= t
+            sens, spec = flag[y == 1].mean(), 1.0 - flag[y == 0].mean()
+            worst = max(worst, abs(sens - op["sensitivity"]["value"][j]), abs(spec - op["specificity"]["value"][j]))
+    return {
+        "rows": n_rows,
+        "metric_abs_diff": diffs,
+        "operating_point_max_abs_diff": worst,
+        "same_intervals_1_vs_2_workers": rep["metrics"] == rep2["metrics"]
+                                         and rep["operating_points"] == rep2["operating_points"],
+        "ok": max(diffs.values()) < 1e-6 and worst < 1e-6 and rep["metrics"] == rep2["metrics"],
+    }
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Check the vectorized evaluation metrics.")
+    ap.add_argument("--rows", type=int, default=4000)
+    args = ap.parse_args()
+    report = check_metrics(args.rows)
+    print(json.dumps(report, indent=2))
+    raise SystemExit(0 if report["ok"] else 1)
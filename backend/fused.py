@@ -0,0 +1,251 @@
+"""
+Fused predictor for the calibrated XGBoost ensemble.
+
+`CalibratedClassifierCV` (5 folds x 600 trees + an isotonic calibrator per fold) is
+exported into one set of flat NumPy arrays:
+- every tree of every fold as one padded node table
+  (split feature, threshold, default direction, leaf values)
+- per-fold base margin and isotonic step function (X_thresholds_, y_thresholds_)
+
+`FusedPredictor.predict_proba` walks all trees of all folds at once: one vectorized
+step per tree level over an (n_rows, n_trees) node-position matrix, then per-fold margin
+sums -> sigmoid -> isotonic interpolation -> fold average. It only needs NumPy and
+follows xgboost's float32 arithmetic, so margins match the boosters exactly.
+
+Compile (done by lungcancer.py after training, or from an existing model.pkl):
+  python lungcancer.py --compile-only
+"""
+from typing import Any, Dict, List, Tuple
+import json
+
+import numpy as np
+
+FUSED_FORMAT_VERSION = 1
+
+def fold_pairs(model) -> List[Tuple[Any, Any]]:
+    """(XGBClassifier, IsotonicRegression) for each fold of a CalibratedClassifierCV."""
+    pairs = []
+    for cc in getattr(model, "calibrated_classifiers_", []):
+        est = cc.estimator
+        calibrators = list(cc.calibrators)
+        if len(calibrators) != 1:
+            raise ValueError("Only binary calibrated classifiers can be fused")
+        pairs.append((est, calibrators[0]))
+    if not pairs:
+        raise ValueError("Expected a fitted CalibratedClassifierCV with calibrated_classifiers_")
+    return pairs
+
+def _n_trees_used(est) -> int:
+    """Trees predict_proba actually uses (honours early stopping's best_iteration)."""
+    booster = est.get_booster()
+    n = booster.num_boosted_rounds()
+    if getattr(est, "early_stopping_rounds", None) is not None:
+        best = getattr(est, "best_iteration", None)
+        if best is not None:
+            n = int(best) + 1
+    return n
+
+def booster_json(booster) -> Dict[str, Any]:
+    return json.loads(booster.save_raw("json"))
+
+def _base_margin(doc: Dict[str, Any]) -> np.float32:
+    """logit(base_score), computed in float32 the way xgboost's ProbToMargin does."""
+    learner = doc["learner"]
+    objective = learner["objective"]["name"]
+    if objective != "binary:logistic":
+        raise ValueError(f"Unsupported objective for fusing: {objective}")
+    base_score = np.float32(learner["learner_model_param"]["base_score"])
+    return np.float32(-np.log(np.float32(1.0) / base_score - np.float32(1.0)))
+
+def _trees(doc: Dict[str, Any], n_rounds: int) -> List[Dict[str, Any]]:
+    gb = doc["learner"]["gradient_booster"]
+    if gb["name"] != "gbtree":
+        raise ValueError(f"Unsupported booster for fusing: {gb['name']}")
+    indptr = gb["model"].get("iteration_indptr")
+    end = int(indptr[n_rounds]) if indptr else n_rounds
+    trees = gb["model"]["trees"][:end]
+    for t in trees:
+        if any(int(s) != 0 for s in t.get("split_type", [])):
+            raise ValueError("Categorical splits are not supported by the fused predictor")
+    return trees
+
+def export_fused(model) -> Dict[str, np.ndarray]:
+    """Flatten every fold booster + isotonic calibrator into plain arrays.
+
+    Each tree is laid out as a perfect binary tree of the ensemble's max depth in heap
+    order (children of i at 2i+1 / 2i+2), so traversal is pure index arithmetic.
+    Leaves shallower than max depth are padded with dummy splits whose descendants all
+    carry the same leaf value.
+    """
+    trees, tree_fold, base_margin = [], [], []
+    iso_x, iso_y, iso_offsets = [], [], [0]
+    n_features = None
+
+    for k, (est, iso) in enumerate(fold_pairs(model)):
+        doc = booster_json(est.get_booster())
+        n_features = int(doc["learner"]["learner_model_param"]["num_feature"])
+        base_margin.append(_base_margin(doc))
+        for t in _trees(doc, _n_trees_used(est)):
+            trees.append(t)
+            tree_fold.append(k)
+        iso_x.append(np.asarray(iso.X_thresholds_, dtype=np.float64))
+        iso_y.append(np.asarray(iso.y_thresholds_, dtype=np.float64))
+        iso_offsets.append(iso_offsets[-1] + len(iso_x[-1]))
+
+    depth = max(_depth(np.asarray(t["left_children"]), np.asarray(t["right_children"])) for t in trees)
+    n_internal, n_leaves = 2 ** depth - 1, 2 ** depth
+    split_feature = np.zeros((len(trees), n_internal), dtype=np.int32)
+    split_threshold = np.full((len(trees), n_internal), np.inf, dtype=np.float32)
+    split_default_left = np.ones((len(trees), n_internal), dtype=bool)
+    leaf_value = np.zeros((len(trees), n_leaves), dtype=np.float32)
+    for j, t in enumerate(trees):
+        _pad_tree(t, 0, 0, depth, split_feature[j], split_threshold[j], split_default_left[j], leaf_value[j])
+
+    return {
+        "format_version": np.array(FUSED_FORMAT_VERSION, dtype=np.int32),
+        "n_features": np.array(n_features, dtype=np.int32),
+        "depth": np.array(depth, dtype=np.int32),
+        "split_feature": split_feature,
+        "split_threshold": split_threshold,
+        "split_default_left": split_default_left,
+        "leaf_value": leaf_value,
+        "tree_fold": np.asarray(tree_fold, dtype=np.int32),
+        "base_margin": np.asarray(base_margin, dtype=np.float32),
+        "iso_x": np.concatenate(iso_x),
+        "iso_y": np.concatenate(iso_y),
+        "iso_offsets": np.asarray(iso_offsets, dtype=np.int64),
+    }
+
+def _pad_tree(t: Dict[str, Any], src: int, dst: int, depth: int,
+              feature: np.ndarray, threshold: np.ndarray, default_left: np.ndarray, leaf: np.ndarray) -> None:
+    """Copy xgboost node `src` into heap slot `dst` of a perfect tree of `depth` levels."""
+    n_internal = 2 ** depth - 1
+    left = int(t["left_children"][src])
+    if left < 0:
+        # leaf: every padded leaf below this slot gets the same value
+        lo, hi = dst, dst
+        while lo < n_internal:
+            lo, hi = 2 * lo + 1, 2 * hi + 2
+        leaf[lo - n_internal:hi - n_internal + 1] = np.float32(t["split_conditions"][src])
+        return
+    feature[dst] = int(t["split_indices"][src])
+    threshold[dst] = np.float32(t["split_conditions"][src])
+    default_left[dst] = bool(t["default_left"][src])
+    _pad_tree(t, left, 2 * dst + 1, depth, feature, threshold, default_left, leaf)
+    _pad_tree(t, int(t["right_children"][src]), 2 * dst + 2, depth, feature, threshold, default_left, leaf)
+
+def _depth(lc: np.ndarray, rc: np.ndarray) -> int:
+    depth, frontier = 0, [0]
+    while True:
+        nxt = [c for i in frontier if lc[i] >= 0 for c in (lc[i], rc[i])]
+        if not nxt:
+            return depth
+        depth += 1
+        frontier = nxt
+
+def save_fused(arrays: Dict[str, np.ndarray], path: str) -> None:
+    with open(path, "wb") as f:
+        np.savez(f, **arrays)
+
+class FusedPredictor:
+    """Drop-in `predict_proba` for the fused ensemble (NumPy only)."""
+
+    def __init__(self, arrays: Dict[str, np.ndarray], chunk_rows: int = 256):
+        self.n_features = int(arrays["n_features"])
+        self.depth = int(arrays["depth"])
+        self.n_trees, self.n_internal = arrays["split_feature"].shape
+        self.n_leaves = arrays["leaf_value"].shape[1]
+        # flat tables; tree j's nodes start at j * n_internal, its leaves at j * n_leaves
+        self.split_feature = np.ascontiguousarray(arrays["split_feature"]).ravel()
+        self.split_threshold = np.ascontiguousarray(arrays["split_threshold"]).ravel()
+        self.split_default_left = np.ascontiguousarray(arrays["split_default_left"]).ravel()
+        self.leaf_value = np.ascontiguousarray(arrays["leaf_value"]).ravel()
+        self.base_margin = arrays["base_margin"]
+        self.iso_x = arrays["iso_x"]
+        self.iso_y = arrays["iso_y"]
+        self.iso_offsets = arrays["iso_offsets"]
+        self.chunk_rows = int(chunk_rows)
+
+        tree_fold = arrays["tree_fold"]
+        self.n_folds = len(self.base_margin)
+        # trees are stored fold by fold -> contiguous column ranges per fold
+        self.fold_bounds = np.searchsorted(tree_fold, np.arange(self.n_folds + 1)).astype(np.intp)
+        self._node_base = (np.arange(self.n_trees, dtype=np.int64) * self.n_internal)[None, :]
+        self._leaf_base = (np.arange(self.n_trees, dtype=np.int64) * self.n_leaves)[None, :]
+
+    @classmethod
+    def load(cls, path: str, **kw) -> "FusedPredictor":
+        with np.load(path, allow_pickle=False) as z:
+            arrays = {k: z[k] for k in z.files}
+        if int(arrays.get("format_version", 0)) != FUSED_FORMAT_VERSION:
+            raise ValueError(f"Unsupported fused artifact version in {path}")
+        return cls(arrays, **kw)
+
+    def margins(self, X: np.ndarray) -> np.ndarray:
+        """(n, n_folds) raw margins, accumulated in float32 tree by tree like xgboost."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected (n, {self.n_features}) features, got {X.shape}")
+        has_nan = bool(np.isnan(X).any())
+        out = np.empty((X.shape[0], self.n_folds), dtype=np.float32)
+        for s in range(0, X.shape[0], self.chunk_rows):
+            out[s:s + self.chunk_rows] = self._margins_chunk(X[s:s + self.chunk_rows], has_nan)
+        return out
+
+    def leaf_values(self, X: np.ndarray, has_nan: bool = True) -> np.ndarray:
+        """(n, n_trees) leaf value reached in every tree: the fused traversal kernel."""
+        n = X.shape[0]
+        flat = X.ravel()
+        row_base = (np.arange(n, dtype=np.int64) * self.n_features)[:, None]
+        pos = np.zeros((n, self.n_trees), dtype=np.int64)
+        for _ in range(self.depth):
+            g = self._node_base + pos
+            xv = flat[row_base + self.split_feature[g]]
+            go_left = xv < self.split_threshold[g]
+            if has_nan:
+                go_left |= np.isnan(xv) & self.split_default_left[g]
+            pos = 2 * pos + 2 - go_left
+        return self.leaf_value[self._leaf_base + (pos - self.n_internal)]
+
+    def _margins_chunk(self, X: np.ndarray, has_nan: bool) -> np.ndarray:
+        leaf = self.leaf_values(X, has_nan)
+        out = np.empty((X.shape[0], self.n_folds), dtype=np.float32)
+        for k in range(self.n_folds):
+            a, b = self.fold_bounds[k], self.fold_bounds[k + 1]
+            # base margin first, then trees in order: sequential float32 sum (cumsum never reorders)
+            acc = np.empty((X.shape[0], b - a + 1), dtype=np.float32)
+            acc[:, 0] = np.float32(self.base_margin[k])
+            acc[:, 1:] = leaf[:, a:b]
+            out[:, k] = np.cumsum(acc, axis=1, dtype=np.float32)[:, -1]
+        return out
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        m = self.margins(X)
+        # xgboost: 1.0f / (expf(-x) + 1.0f); exp evaluated in double and rounded matches expf
+        # far more often than NumPy's float32 exp. The isotonic calibrators keep float32.
+        e = np.exp(-m.astype(np.float64)).astype(np.float32)
+        p = (np.float32(1.0) / (e + np.float32(1.0))).astype(np.float32)
+        cal = np.empty(p.shape, dtype=np.float64)
+        for k in range(self.n_folds):
+            a, b = self.iso_offsets[k], self.iso_offsets[k + 1]
+            cal[:, k] = np.interp(p[:, k], self.iso_x[a:b], self.iso_y[a:b]).astype(np.float32)
+        cal[(1.0 < cal) & (cal <= 1.0 + 1e-5)] = 1.0
+        p1 = cal.mean(axis=1)
+        return np.column_stack([1.0 - p1, p1])
+
+class RoutedPredictor:
+    """Fused kernel for small batches, the original model for large ones.
+
+    The NumPy kernel wins by a wide margin for the request-sized batches the API sees,
+    while xgboost's multithreaded C++ predictor is faster for big offline batches.
+    """
+
+    def __init__(self, fused: FusedPredictor, model, max_rows: int = 32):
+        self.fused = fused
+        self.model = model
+        self.max_rows = int(max_rows)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        if self.model is None or len(X) <= self.max_rows:
+            return self.fused.predict_proba(X)
+        return self.model.predict_proba(X)
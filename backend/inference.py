@@ -0,0 +1,295 @@
+"""
+Pandas-free inference engine.
+
+Everything that depends on the training schema is resolved once at startup:
+- column index of every feature in FEATURE_ORDER (incl. radon_*/alcohol_* one-hot slots)
+- scaler mean_/scale_ for the numeric columns
+
+Parsed rows (the dicts produced by app._parse_patient) are written straight into a
+reused float32 buffer (one per thread), 1 row for /predict or N rows for batches.
+The result is bit-for-bit what the legacy DataFrame path hands to the model:
+numerics are standardized in float64 exactly like StandardScaler.transform and only
+then rounded to float32 (xgboost casts its input to float32 anyway).
+
+Parity check against the DataFrame path (uses the saved artifacts next to this file):
+  python inference.py [--rows 5000]
+"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import threading
+
+import numpy as np
+
+def prior_adjust_array(p: np.ndarray, pi_train: float, pi_deploy: float) -> np.ndarray:
+    """Vectorized `prior_adjust` over an array of probabilities."""
+    p = np.clip(np.asarray(p, dtype=float), 1e-12, 1.0 - 1e-12)
+    if not (0.0 < pi_train < 1.0 and 0.0 < pi_deploy < 1.0): return p
+    odds = p / (1.0 - p)
+    base = (pi_deploy / (1.0 - pi_deploy)) / (pi_train / (1.0 - pi_train))
+    return np.clip((odds * base) / (1.0 + (odds * base)), 1e-12, 1.0 - 1e-12)
+
+def prior_adjust_grid(p: np.ndarray, pi_train: Optional[float], pi_deploys: Sequence[float]) -> np.ndarray:
+    """(len(p), len(pi_deploys)) adjusted probabilities in one broadcast; invalid pi values keep p."""
+    p = np.clip(np.asarray(p, dtype=float), 1e-12, 1.0 - 1e-12)[:, None]
+    pi = np.asarray(pi_deploys, dtype=float)[None, :]
+    if pi_train is None or not (0.0 < pi_train < 1.0):
+        return np.broadcast_to(p, (p.shape[0], pi.shape[1])).copy()
+    valid = (0.0 < pi) & (pi < 1.0)
+    safe = np.where(valid, pi, 0.5)
+    odds = p / (1.0 - p)
+    base = (safe / (1.0 - safe)) / (pi_train / (1.0 - pi_train))
+    adj = np.clip((odds * base) / (1.0 + (odds * base)), 1e-12, 1.0 - 1e-12)
+    return np.where(valid, adj, p)
+
+class InferenceEngine:
+    def __init__(
+        self,
+        model,
+        scaler,
+        feature_order: Sequence[str],
+        numeric_cols: Sequence[str],
+        binary_cols: Sequence[str],
+        radon_levels: Sequence[str],
+        alcohol_levels: Sequence[str],
+    ):
+        self.model = model
+        self.feature_order = list(feature_order)
+        self.numeric_cols = list(numeric_cols)
+        self.binary_cols = list(binary_cols)
+        self.n_features = len(self.feature_order)
+        col = {c: i for i, c in enumerate(self.feature_order)}
+
+        # scaler statistics, in NUMERIC_COLS order (same arithmetic as StandardScaler.transform)
+        names = list(getattr(scaler, "feature_names_in_", self.numeric_cols))
+        order = [names.index(c) for c in self.numeric_cols]
+        n_num = len(self.numeric_cols)
+        mean = getattr(scaler, "mean_", None)
+        scale = getattr(scaler, "scale_", None)
+        self.mean = np.asarray(mean, dtype=np.float64)[order] if getattr(scaler, "with_mean", True) and mean is not None else np.zeros(n_num)
+        self.scale = np.asarray(scale, dtype=np.float64)[order] if getattr(scaler, "with_std", True) and scale is not None else np.ones(n_num)
+
+        # precomputed column positions (-1 = column not in FEATURE_ORDER)
+        self.numeric_idx = np.array([col.get(c, -1) for c in self.numeric_cols], dtype=np.intp)
+        self.binary_idx = np.array([col.get(c, -1) for c in self.binary_cols], dtype=np.intp)
+        self.radon_slot = self._one_hot_slots(col, "radon", radon_levels, "radon_low")
+        self.alcohol_slot = self._one_hot_slots(col, "alcohol", alcohol_levels, "alcohol_none")
+
+        self._local = threading.local()
+
+    @staticmethod
+    def _one_hot_slots(col: Dict[str, int], prefix: str, levels: Sequence[str], fallback: str) -> Dict[str, int]:
+        """level -> column index; unknown levels resolve to the fallback column (like the legacy path)."""
+        slots = {lvl: col.get(f"{prefix}_{lvl}", -1) for lvl in levels}
+        slots[None] = col.get(fallback, -1)
+        return slots
+
+    # ----- buffers -----
+    def _buffer(self, n: int) -> np.ndarray:
+        """Per-thread reused float32 buffer with at least n rows (returned zeroed, n rows)."""
+        buf = getattr(self._local, "buf", None)
+        if buf is None or buf.shape[0] < n:
+            buf = np.zeros((max(n, 1), self.n_features), dtype=np.float32)
+            self._local.buf = buf
+        out = buf[:n]
+        out.fill(0.0)
+        return out
+
+    # ----- encoding -----
+    def standardize(self, numeric: np.ndarray) -> np.ndarray:
+        """(n, len(numeric_cols)) raw numerics -> standardized float64."""
+        x = np.array(numeric, dtype=np.float64)
+        x -= self.mean
+        x /= self.scale
+        return x
+
+    def encode_batch(self, rows: List[Dict[str, Any]], out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Parsed rows -> float32 (n, n_features) matrix in training order."""
+        n = len(rows)
+        x = self._buffer(n) if out is None else out
+        if out is not None:
+            x.fill(0.0)
+        ar = np.arange(n)
+
+        numeric = np.empty((n, len(self.numeric_cols)), dtype=np.float64)
+        for j, c in enumerate(self.numeric_cols):
+            numeric[:, j] = np.fromiter((r[c] for r in rows), dtype=np.float64, count=n)
+        scaled = self.standardize(numeric)
+        for j, i in enumerate(self.numeric_idx):
+            if i >= 0:
+                x[:, i] = scaled[:, j]
+
+        for c, i in zip(self.binary_cols, self.binary_idx):
+            if i >= 0:
+                x[:, i] = np.fromiter((r[c] for r in rows), dtype=np.float64, count=n)
+
+        for key, slots in (("radon_level", self.radon_slot), ("alcohol_level", self.alcohol_slot)):
+            fallback = slots[None]
+            idx = np.fromiter((slots.get(r[key], fallback) for r in rows), dtype=np.intp, count=n)
+            hit = idx >= 0
+            x[ar[hit], idx[hit]] = 1.0
+        return x
+
+    def encode_coded(self, cols: Dict[str, Any], out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Pre-encoded columns -> the matrix encode_batch builds, without a Python loop per row.
+
+        cols: raw numerics and 0/1 binaries as arrays by column name, "radon_level" /
+        "alcohol_level" as (codes, levels) with codes indexing levels (see packed.py).
+        """
+        n = len(cols[self.numeric_cols[0]]) if self.numeric_cols else len(cols["radon_level"][0])
+        x = self._buffer(n) if out is None else out
+        if out is not None:
+            x.fill(0.0)
+        scaled = self.standardize(np.column_stack([cols[c] for c in self.numeric_cols]))
+        for j, i in enumerate(self.numeric_idx):
+            if i >= 0:
+                x[:, i] = scaled[:, j]
+        for c, i in zip(self.binary_cols, self.binary_idx):
+            if i >= 0:
+                x[:, i] = cols[c]
+        ar = np.arange(n)
+        for key, slots in (("radon_level", self.radon_slot), ("alcohol_level", self.alcohol_slot)):
+            codes, levels = cols[key]
+            lut = np.array([slots.get(lvl, slots[None]) for lvl in levels], dtype=np.intp)
+            idx = lut[codes]
+            hit = idx >= 0
+            x[ar[hit], idx[hit]] = 1.0
+        return x
+
+    def encode_row(self, row: Dict[str, Any]) -> np.ndarray:
+        return self.encode_batch([row])
+
+    def encode_grid(self, base: Dict[str, Any], axes: Sequence[Tuple[str, Sequence[Any]]]) -> np.ndarray:
+        """One parsed row with parsed-row keys varied over the full grid of `axes` (first axis slowest).
+
+        Same bytes as encode_batch on the equivalent list of rows, without building the dicts:
+        each column is the base value or the axis values gathered by grid index.
+        """
+        shape = tuple(len(v) for _, v in axes)
+        n = int(np.prod(shape)) if shape else 1
+        grids = np.meshgrid(*[np.arange(s) for s in shape], indexing="ij") if shape else []
+        pick = {key: (list(values), g.ravel()) for (key, values), g in zip(axes, grids)}
+
+        def column(key, fn=float, dtype=np.float64):
+            """fn applied once per distinct value, then gathered over the grid."""
+            if key in pick:
+                values, idx = pick[key]
+                return np.array([fn(v) for v in values], dtype=dtype)[idx]
+            return np.full(n, fn(base[key]), dtype=dtype)
+
+        x = np.zeros((n, self.n_features), dtype=np.float32)
+        scaled = self.standardize(np.column_stack([column(c) for c in self.numeric_cols]))
+        for j, i in enumerate(self.numeric_idx):
+            if i >= 0:
+                x[:, i] = scaled[:, j]
+        for c, i in zip(self.binary_cols, self.binary_idx):
+            if i >= 0:
+                x[:, i] = column(c)
+        ar = np.arange(n)
+        for key, slots in (("radon_level", self.radon_slot), ("alcohol_level", self.alcohol_slot)):
+            idx = column(key, lambda v, slots=slots: slots.get(v, slots[None]), np.intp)
+            hit = idx >= 0
+            x[ar[hit], idx[hit]] = 1.0
+        return x
+
+    # ----- model -----
+    def predict_raw(self, x: np.ndarray) -> np.ndarray:
+        """Calibrated P(y=1) per row, clipped away from 0/1."""
+        return np.clip(self.model.predict_proba(x)[:, 1].astype(float), 1e-12, 1.0 - 1e-12)
+
+    def score(self, rows: List[Dict[str, Any]]) -> np.ndarray:
+        if not rows:
+            return np.empty(0, dtype=float)
+        return self.predict_raw(self.encode_batch(rows))
+
+# -------------------
+# Reference DataFrame path (the pre-engine app.py encoding) + parity check
+# -------------------
+def encode_dataframe(engine: InferenceEngine, scaler, rows: List[Dict[str, Any]], radon_levels, alcohol_levels):
+    """Legacy encoding: pandas DataFrame + scaler.transform, exactly as app.py used to do it."""
+    import pandas as pd
+
+    n = len(rows)
+    numeric_df = pd.DataFrame(
+        {c: np.fromiter((r[c] for r in rows), dtype=float, count=n) for c in engine.numeric_cols},
+        columns=engine.numeric_cols,
+    )
+    numeric_scaled = scaler.transform(numeric_df)
+    cols: Dict[str, np.ndarray] = {c: numeric_scaled[:, i] for i, c in enumerate(engine.numeric_cols)}
+    for c in engine.binary_cols:
+        cols[c] = np.fromiter((r[c] for r in rows), dtype=int, count=n)
+    for prefix, levels, key, fallback in (
+        ("radon", radon_levels, "radon_level", "radon_low"),
+        ("alcohol", alcohol_levels, "alcohol_level", "alcohol_none"),
+    ):
+        oh_cols = [f"{prefix}_{lvl}" for lvl in levels]
+        hot = np.array([f"{prefix}_{r[key]}" if f"{prefix}_{r[key]}" in oh_cols else fallback for r in rows])
+        for c in oh_cols:
+            cols[c] = (hot == c).astype(int)
+    return pd.DataFrame({k: cols.get(k, np.zeros(n, dtype=int)) for k in engine.feature_order})[engine.feature_order]
+
+def random_parsed_rows(n: int, radon_levels, alcohol_levels, seed: int = 0) -> List[Dict[str, Any]]:
+    """Synthetic parsed rows covering every category level (and an unknown one)."""
+    rng = np.random.default_rng(seed)
+    radon = list(radon_levels) + ["Low"]
+    alcohol = list(alcohol_levels) + ["None"]
+    return [
+        {
+            "age": float(rng.uniform(0, 100)) if i % 7 else float(rng.integers(18, 95)),
+            "pack_years": float(rng.exponential(20.0)),
+            "gender": int(rng.integers(0, 2)),
+            "asbestos_exposure": int(rng.integers(0, 2)),
+            "secondhand_smoke_exposure": int(rng.integers(0, 2)),
+            "copd_diagnosis": int(rng.integers(0, 2)),
+            "family_history": int(rng.integers(0, 2)),
+            "radon_level": radon[int(rng.integers(0, len(radon)))],
+            "alcohol_level": alcohol[int(rng.integers(0, len(alcohol)))],
+        }
+        for i in range(n)
+    ]
+
+def check_parity(engine: InferenceEngine, scaler, radon_levels, alcohol_levels, n_rows: int = 5000) -> Dict[str, Any]:
+    """Engine vs DataFrame path on random rows: features and predictions must match bit for bit
+    (features only when the engine has no model: predictions_equal / max_abs_diff are then None)."""
+    rows = random_parsed_rows(n_rows, radon_levels, alcohol_levels)
+    x_df = encode_dataframe(engine, scaler, rows, radon_levels, alcohol_levels)
+    x_np = engine.encode_batch(rows).copy()
+
+    ref_x = x_df.to_numpy(dtype=np.float32)
+    features_equal = bool(np.array_equal(ref_x.view(np.uint32), x_np.view(np.uint32)))
+    single_equal = all(
+        np.array_equal(engine.encode_row(r), ref_x[i:i + 1]) for i, r in enumerate(rows[:200])
+    )
+    report = {
+        "rows": n_rows,
+        "features_equal": features_equal,
+        "single_row_equal": bool(single_equal),
+        "predictions_equal": None,
+        "max_abs_diff": None,
+    }
+    if engine.model is not None:
+        p_ref = engine.model.predict_proba(x_df)[:, 1]
+        p_new = engine.model.predict_proba(x_np)[:, 1]
+        report["predictions_equal"] = bool(np.array_equal(p_ref, p_new))
+        report["max_abs_diff"] = float(np.max(np.abs(p_ref - p_new))) if n_rows else 0.0
+    return report
+
+if __name__ == "__main__":
+    import argparse, json, os, sys
+    import joblib
+
+    ap = argparse.ArgumentParser(description="Check the NumPy engine against the DataFrame path.")
+    ap.add_argument("--rows", type=int, default=5000)
+    args = ap.parse_args()
+
+    base = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(base, "meta.json")) as f:
+        meta = json.load(f)
+    scaler = joblib.load(os.path.join(base, "scaler.pkl"))
+    engine = InferenceEngine(
+        joblib.load(os.path.join(base, "model.pkl")), scaler,
+        meta["feature_order"], meta["numeric_cols"], meta["binary_cols"],
+        meta["radon_levels"], meta["alcohol_levels"],
+    )
+    report = check_parity(engine, scaler, meta["radon_levels"], meta["alcohol_levels"], args.rows)
+    print(json.dumps(report, indent=2))
+    ok = report["features_equal"] and report["single_row_equal"] and report["predictions_equal"]
+    sys.exit(0 if ok else 1)
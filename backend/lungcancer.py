@@ -16,9 +16,36 @@ Artifacts (saved next to this file)
 - scaler.pkl
 - model.pkl
 - meta.json
+- model_fused.npz  (all fold boosters + isotonic steps as flat arrays, see fused.py)
+- model_explain.npz (per-tree TreeSHAP cell tables for explain=true, see explain.py)
+- risk_table.npz   (optional, --build-table: exact lookup table, see risk_table.py)
+- drift_reference.json (training input profile + held-out p_raw distribution for the API's drift monitor, see drift.py)
+- evaluation.json  (test split: operating points at deployment prevalences, bootstrap confidence
+                    intervals, reliability bins; served by /model-info, see evaluation.py)
+- model_compact.bin (written last: scaler + meta + the arrays above in one memory-mappable,
+                     pickle-free file the API serves from, see compact.py)
 
 Run:
   python lungcancer.py  # defaults to backend/lung_cancer_dataset.csv
+  python lungcancer.py --compile-only  # re-export model_fused.npz + model_explain.npz + model_compact.bin from model.pkl
+  python lungcancer.py --build-table   # also build + verify risk_table.npz (serve with PREDICTOR=table)
+  python lungcancer.py --orchestrate --workers 5
+      # encoded X/y cached in .train_cache/ (keyed by CSV hash + schema), folds fitted in
+      # parallel processes and checkpointed (an interrupted run resumes), per-stage timings
+  python lungcancer.py --search --workers 4 [--search-brackets 3] [--search-save]
+      # successive halving (Hyperband with brackets > 1) over XGB_PARAMS: early-stopped trials
+      # on a validation fold, training data shared with the workers via shared memory; only
+      # the winner is refit with isotonic calibration, then compared with the defaults
+  python lungcancer.py --incremental [--incremental-rounds 100] [--incremental-compare] [--no-compile]
+      # only the rows appended to the CSV since the last run are parsed (.train_cache/store/,
+      # see train_store.py); each fold booster gets that many more rounds on old + new rows,
+      # the isotonic calibrators are refit, the scaler stays frozen (running stats reported);
+      # the first run is a full training that seeds the store. model.pkl is published first;
+      # --no-compile then stops before evaluation.json and the compiled artifacts (the API
+      # serves model.pkl until `--compile-only` / `--evaluate-only` catch up)
+  python lungcancer.py --evaluate-only --workers 4
+      # re-write evaluation.json for the existing model.pkl on the test split of the CSV
+      # (EVAL_RESAMPLES bootstrap resamples, default 2000; EVAL_PI_DEPLOY=0.002,0.01,0.05)
 
 (Optionally) override CSV via env:
   PowerShell:  $env:LUNG_CANCER_CSV="C:\path\lung_cancer_dataset.csv"
@@ -26,9 +53,16 @@ Run:
   mac/linux:   export LUNG_CANCER_CSV=/path/to/lung_cancer_dataset.csv
 """
 
+import io
 import os
+import copy
 import json
+import time
+import shutil
+import hashlib
+import argparse
 import warnings
+from typing import Optional
 warnings.filterwarnings("ignore", category=UserWarning)
 
 import joblib
@@ -54,6 +88,15 @@ except Exception as e:
 
 import sklearn
 
+from fused import FusedPredictor, export_fused, save_fused
+from risk_table import RiskTable, build_table, save_table
+from explain import TreeShapExplainer, build_explainer, check_explainer, save_explainer
+from compact import CompactArtifact, build_compact, file_digest, stamp_digest
+from drift import build_reference, save_reference
+from evaluation import DEFAULT_PI_DEPLOYS, DEFAULT_RESAMPLES, evaluate_scores, save_evaluation
+from train_store import EncodedStore, assign_split, complete_rows_end, row_hashes
+from encoding import ALCOHOL_LEVELS, ENCODERS, NUMERIC, RADON_LEVELS, TARGET as TARGET_ENCODER
+
 # ----- Paths -----
 BASE_DIR = os.path.dirname(__file__)
 CSV_PATH = os.getenv(
@@ -63,6 +106,15 @@ CSV_PATH = os.getenv(
 SCALER_PATH = os.path.join(BASE_DIR, "scaler.pkl")
 MODEL_PATH = os.path.join(BASE_DIR, "model.pkl")
 META_PATH = os.path.join(BASE_DIR, "meta.json")
+FUSED_PATH = os.path.join(BASE_DIR, "model_fused.npz")
+TABLE_PATH = os.path.join(BASE_DIR, "risk_table.npz")
+EXPLAIN_PATH = os.path.join(BASE_DIR, "model_explain.npz")
+DRIFT_PATH = os.path.join(BASE_DIR, "drift_reference.json")
+EVAL_PATH = os.path.join(BASE_DIR, "evaluation.json")
+EVAL_RESAMPLES = int(os.getenv("EVAL_RESAMPLES", str(DEFAULT_RESAMPLES)))
+EVAL_PI_DEPLOYS = [float(v) for v in os.getenv("EVAL_PI_DEPLOY", ",".join(map(str, DEFAULT_PI_DEPLOYS))).split(",") if v.strip()]
+
+FUSED_TOLERANCE = 1e-6
 
 # ----- Schema -----
 TARGET = "lung_cancer"
@@ -77,9 +129,7 @@ BINARY_COLS = [
     "family_history",
 ]
 
-# fixed category levels for stable one-hot
-RADON_LEVELS = ["low", "medium", "high"]
-ALCOHOL_LEVELS = ["none", "moderate", "heavy"]
+# fixed category levels for stable one-hot: RADON_LEVELS / ALCOHOL_LEVELS (encoding.py)
 
 BINARY_MEANING = {
     "gender": "0=female, 1=male",
@@ -90,94 +140,61 @@ BINARY_MEANING = {
 }
 
 # -------------------
-# Parsers / Normalizers
+# Vectorized encoding (encoding.py: the lookup tables the API uses too; each distinct
+# raw value is parsed once, then broadcast)
 # -------------------
-def _norm_text(v) -> str:
-    """Robust lowercase + whitespace normalize (handles NBSP)."""
-    s = "" if v is None else str(v)
-    s = s.replace("\u00a0", " ")  # NBSP -> space
-    s = " ".join(s.split())       # collapse whitespace
-    return s.lower()
-
-def _parse_yesno(v) -> int:
-    s = _norm_text(v)
-    if s in {"1", "y", "yes", "true", "t"}:
-        return 1
-    if s in {"0", "n", "no", "false", "f"}:
-        return 0
-    try:
-        return 1 if float(s) >= 0.5 else 0
-    except:
-        return 0
-
-def _parse_gender(v) -> int:
-    s = _norm_text(v)
-    if s in {"male", "m", "1"}:
-        return 1
-    if s in {"female", "f", "0"}:
-        return 0
-    return _parse_yesno(v)
-
-def _norm_radon(v) -> str:
-    s = _norm_text(v)
-    if s in {"low", "l"}:
-        return "low"
-    if s in {"medium", "med", "mid", "m"}:
-        return "medium"
-    if s in {"high", "h"}:
-        return "high"
-    # if dataset has "none"/missing, fold into "low" (3-bucket scheme)
-    if s in {"none", "no", "0", "nil", "null", "n/a", "na", ""}:
-        return "low"
-    return "low"
-
-def _norm_alcohol(v) -> str:
-    s = _norm_text(v)
-    if s in {"none", "no", "0", "nil", "null", "n/a", "na", ""}:
-        return "none"
-    if s in {"moderate", "mod", "medium", "light", "low"}:
-        return "moderate"
-    if s in {"heavy", "high", "yes", "1"}:
-        return "heavy"
-    return "none"
-
-def _parse_target(v) -> int:
-    s = _norm_text(v)
-    POS = {
-        "1", "y", "yes", "true", "t", "pos", "positive", "present",
-        "cancer", "lung cancer", "malignant", "has_cancer", "has cancer",
-    }
-    NEG = {
-        "0", "n", "no", "false", "f", "neg", "negative", "absent",
-        "no cancer", "benign", "none", "healthy",
-    }
-    if s in POS:
-        return 1
-    if s in NEG:
-        return 0
-    try:
-        return 1 if float(s) >= 0.5 else 0
-    except:
-        return 0
+def _one_hot(levels_arr: np.ndarray, prefix: str, levels) -> dict:
+    return {f"{prefix}_{lvl}": (levels_arr == lvl).astype(np.int8) for lvl in levels}
+
+def encode_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Raw patient columns -> unscaled model matrix in training order (same encoding as training)."""
+    missing = [c for c in NUMERIC_COLS + BINARY_COLS + ["radon_exposure", "alcohol_consumption"] if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing expected columns: {missing}")
+    cols = {c: NUMERIC.encode(df[c]) for c in NUMERIC_COLS}
+    for c in BINARY_COLS:
+        cols[c] = ENCODERS[c].encode(df[c])
+    cols.update(_one_hot(ENCODERS["radon_exposure"].encode(df["radon_exposure"]), "radon", RADON_LEVELS))
+    cols.update(_one_hot(ENCODERS["alcohol_consumption"].encode(df["alcohol_consumption"]), "alcohol", ALCOHOL_LEVELS))
+    return pd.DataFrame(cols, index=df.index)
 
 # -------------------
 # Data load & encode
 # -------------------
-def load_dataframe():
-    print(f"[1/6] Reading CSV from: {CSV_PATH}", flush=True)
-    if not os.path.exists(CSV_PATH):
-        raise FileNotFoundError(
-            f"CSV not found at: {CSV_PATH}\n"
-            "Hint: set LUNG_CANCER_CSV env to your file path."
-        )
+RAW_CATEGORICAL_COLS = BINARY_COLS + ["radon_exposure", "alcohol_consumption", TARGET]
 
-    df = pd.read_csv(CSV_PATH)
-    print(f"Loaded shape: {df.shape}", flush=True)
+def read_raw_csv(path: str, start: int = 0, end: Optional[int] = None, **kw) -> pd.DataFrame:
+    """Only the schema columns; text columns as `category` (each distinct string stored once).
+
+    start/end: byte span to read (incremental retraining); a start past the header must be
+    a row boundary, the column names then come from the file's header line.
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    wanted = [c for c in NUMERIC_COLS + RAW_CATEGORICAL_COLS if c in header]
+    src = path
+    if start or end is not None:
+        with open(path, "rb") as f:
+            f.seek(start)
+            src = io.BytesIO(f.read(-1 if end is None else end - start))
+        if start:
+            kw = {"header": None, "names": list(header), **kw}
+    return pd.read_csv(
+        src, usecols=wanted,
+        dtype={c: "category" for c in RAW_CATEGORICAL_COLS if c in header},
+        **kw,
+    )
 
-    # Drop common IDs (optional)
-    for col in ["patient_id", "id", "uuid"]:
-        if col in df.columns:
-            df = df.drop(columns=[col])
+def load_dataframe(df: Optional[pd.DataFrame] = None):
+    """Read (or take an already read read_raw_csv frame), validate and encode -> X, y."""
+    print(f"[1/6] Reading CSV from: {CSV_PATH}", flush=True)
+    if df is None:
+        if not os.path.exists(CSV_PATH):
+            raise FileNotFoundError(
+                f"CSV not found at: {CSV_PATH}\n"
+                "Hint: set LUNG_CANCER_CSV env to your file path."
+            )
+        df = read_raw_csv(CSV_PATH)
+    print(f"Loaded shape: {df.shape}", flush=True)
 
     if TARGET not in df.columns:
         raise ValueError(f"Missing target column: {TARGET}")
@@ -189,40 +206,28 @@ def load_dataframe():
     except Exception:
         pass
 
-    # Parse target -> 0/1
-    df[TARGET] = df[TARGET].apply(_parse_target).astype(int)
+    # Parse target -> 0/1 (once per distinct label)
+    y = pd.Series(TARGET_ENCODER.encode(df[TARGET]), index=df.index, name=TARGET)
 
     # Show parsed counts (should have both 0 and 1)
-    print("Parsed TARGET value counts:", df[TARGET].value_counts(dropna=False).to_dict(), flush=True)
+    print("Parsed TARGET value counts:", y.value_counts(dropna=False).to_dict(), flush=True)
 
-    pi_raw = float(df[TARGET].mean())
+    pi_raw = float(y.mean())
     print(f"Parsed target prevalence = {pi_raw:.4f}", flush=True)
     if pi_raw <= 0.0 or pi_raw >= 1.0:
-        uniq = df[TARGET].unique().tolist()
+        uniq = y.unique().tolist()
         raise ValueError(
             "Target ended up single-class after parsing. "
-            f"Prevalence={pi_raw:.4f}. Extend _parse_target() to cover your labels. "
+            f"Prevalence={pi_raw:.4f}. Extend encoding.TARGET to cover your labels. "
             f"Parsed uniques: {uniq}"
         )
 
-    # Binaries
-    print("[2/6] Parsing binary columns…", flush=True)
     for c in BINARY_COLS:
         if c not in df.columns:
             raise ValueError(f"Missing expected binary column: {c}")
-    df["gender"] = df["gender"].apply(_parse_gender).astype(int)
-    for c in [c for c in BINARY_COLS if c != "gender"]:
-        df[c] = df[c].apply(_parse_yesno).astype(int)
-
-    # Numerics
-    print("[3/6] Casting numerics…", flush=True)
     for c in NUMERIC_COLS:
         if c not in df.columns:
             raise ValueError(f"Missing expected numeric column: {c}")
-        df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0.0).astype(float)
-
-    # Multi-level → normalized → one-hot
-    print("[4/6] One-hot for radon & alcohol…", flush=True)
     if "radon_exposure" not in df.columns:
         raise ValueError("Missing expected column: radon_exposure")
     if "alcohol_consumption" not in df.columns:
@@ -231,30 +236,25 @@ def load_dataframe():
     # show raw distincts to confirm mapping
     print(
         "Distinct radon_exposure (raw):",
-        list(pd.Series(df["radon_exposure"]).astype(str).str.lower().unique())[:10],
+        list(pd.Series(df["radon_exposure"].unique()).astype(str).str.lower().unique())[:10],
         flush=True,
     )
     print(
         "Distinct alcohol_consumption (raw):",
-        list(pd.Series(df["alcohol_consumption"]).astype(str).str.lower().unique())[:10],
+        list(pd.Series(df["alcohol_consumption"].unique()).astype(str).str.lower().unique())[:10],
         flush=True,
     )
 
-    df["radon_norm"] = df["radon_exposure"].map(_norm_radon)
-    df["alcohol_norm"] = df["alcohol_consumption"].map(_norm_alcohol)
-
-    radon_oh = pd.get_dummies(df["radon_norm"], prefix="radon", dtype=int).reindex(
-        columns=[f"radon_{lvl}" for lvl in RADON_LEVELS], fill_value=0
-    )
-    alcohol_oh = pd.get_dummies(df["alcohol_norm"], prefix="alcohol", dtype=int).reindex(
-        columns=[f"alcohol_{lvl}" for lvl in ALCOHOL_LEVELS], fill_value=0
-    )
+    # Binaries, numerics, multi-level → normalized → one-hot (vectorized, see encode_features)
+    print("[2/6] Parsing binary columns…", flush=True)
+    print("[3/6] Casting numerics…", flush=True)
+    print("[4/6] One-hot for radon & alcohol…", flush=True)
+    X = encode_features(df)
+    del df
 
-    one_hot_cols = list(radon_oh.columns) + list(alcohol_oh.columns)
+    one_hot_cols = [f"radon_{lvl}" for lvl in RADON_LEVELS] + [f"alcohol_{lvl}" for lvl in ALCOHOL_LEVELS]
     feature_order = NUMERIC_COLS + BINARY_COLS + one_hot_cols
-
-    X = pd.concat([df[NUMERIC_COLS], df[BINARY_COLS], radon_oh, alcohol_oh], axis=1)
-    y = df[TARGET].astype(int)
+    X = X[feature_order]
 
     print(f"Final X shape: {X.shape} | y mean: {y.mean():.4f}", flush=True)
     print("Feature order:", feature_order, flush=True)
@@ -264,10 +264,12 @@ def load_dataframe():
 # -------------------
 # Split & scale
 # -------------------
+TEST_SIZE = 0.2
+
 def split_and_scale(X, y):
     print("[5/6] Train/test split + scale…", flush=True)
     Xtr, Xte, ytr, yte = train_test_split(
-        X, y, test_size=0.2, random_state=42, stratify=y
+        X, y, test_size=TEST_SIZE, random_state=42, stratify=y
     )
     scaler = StandardScaler()
     Xtr.loc[:, NUMERIC_COLS] = scaler.fit_transform(Xtr[NUMERIC_COLS].astype(float))
@@ -277,30 +279,652 @@ def split_and_scale(X, y):
 # -------------------
 # Train
 # -------------------
-def train_calibrated_xgb(Xtr, ytr):
-    print("[6/6] Train XGBoost + isotonic calibration…", flush=True)
+N_FOLDS = 5
+SEED = 42
+
+# tunable XGBClassifier parameters (defaults; --search looks for better ones)
+XGB_PARAMS = {
+    "n_estimators": 600,
+    "learning_rate": 0.05,
+    "max_depth": 4,
+    "subsample": 0.9,
+    "colsample_bytree": 0.9,
+    "reg_lambda": 1.0,
+}
+
+def make_xgb(ytr, n_jobs: int = -1, params: Optional[dict] = None) -> XGBClassifier:
     pos = int(ytr.sum())
     neg = int(len(ytr) - pos)
     spw = (neg / max(pos, 1)) if pos else 1.0
 
-    xgb = XGBClassifier(
-        n_estimators=600,
-        learning_rate=0.05,
-        max_depth=4,
-        subsample=0.9,
-        colsample_bytree=0.9,
-        reg_lambda=1.0,
+    return XGBClassifier(
+        **{**XGB_PARAMS, **(params or {})},
         objective="binary:logistic",
         eval_metric="logloss",
-        n_jobs=-1,
-        random_state=42,
+        n_jobs=n_jobs,
+        random_state=SEED,
         scale_pos_weight=spw,
     )
-    skf = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
+
+def train_calibrated_xgb(Xtr, ytr, params: Optional[dict] = None):
+    print("[6/6] Train XGBoost + isotonic calibration…", flush=True)
+    xgb = make_xgb(ytr, params=params)
+    skf = StratifiedKFold(n_splits=N_FOLDS, shuffle=True, random_state=SEED)
     clf = CalibratedClassifierCV(estimator=xgb, method="isotonic", cv=skf)
     clf.fit(Xtr, ytr)
     return clf
 
+# -------------------
+# Orchestrated training: encoded-data cache, parallel folds, fold checkpoints
+# -------------------
+CACHE_DIR = os.path.join(BASE_DIR, ".train_cache")
+ENCODING_VERSION = 3  # bump when load_dataframe/encode_features change what they produce
+
+def _sha1_file(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _schema_json() -> str:
+    return json.dumps({
+        "numeric": NUMERIC_COLS, "binary": BINARY_COLS, "radon": RADON_LEVELS,
+        "alcohol": ALCOHOL_LEVELS, "target": TARGET, "encoding_version": ENCODING_VERSION,
+    }, sort_keys=True)
+
+def schema_key() -> str:
+    """Hash of the schema/encoding alone (what the incremental store's rows were encoded with)."""
+    return hashlib.sha1(_schema_json().encode()).hexdigest()[:16]
+
+def dataset_key(csv_path: str) -> str:
+    """Hash of the CSV bytes + the schema/encoding it is parsed with."""
+    return hashlib.sha1((_sha1_file(csv_path) + _schema_json()).encode()).hexdigest()[:16]
+
+def load_encoded_cached(csv_path: str):
+    """load_dataframe() through a Feather cache of the encoded X/y keyed by dataset_key."""
+    key = dataset_key(csv_path)
+    path = os.path.join(CACHE_DIR, f"encoded-{key}.feather")
+    one_hot_cols = [f"radon_{lvl}" for lvl in RADON_LEVELS] + [f"alcohol_{lvl}" for lvl in ALCOHOL_LEVELS]
+    feature_order = NUMERIC_COLS + BINARY_COLS + one_hot_cols
+    try:
+        import pyarrow  # noqa: F401  (Feather backend)
+    except ImportError:
+        print("pyarrow not installed: encoded-data cache disabled", flush=True)
+        X, y, feature_order, one_hot_cols = load_dataframe()
+        return X, y, feature_order, one_hot_cols, key
+
+    if os.path.exists(path):
+        print(f"[1-4/6] Encoded data cache hit: {path}", flush=True)
+        df = pd.read_feather(path)
+        return df[feature_order], df[TARGET], feature_order, one_hot_cols, key
+
+    X, y, feature_order, one_hot_cols = load_dataframe()
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = path + ".tmp"
+    X.assign(**{TARGET: y.to_numpy()}).reset_index(drop=True).to_feather(tmp)
+    os.replace(tmp, path)
+    print(f"Cached encoded data: {path}", flush=True)
+    return X, y, feature_order, one_hot_cols, key
+
+def calibrate_fitted(est, X_cal, y_cal):
+    """Isotonic calibrator for an already fitted booster on held-out rows -> the per-fold
+    (estimator, calibrator) entry of CalibratedClassifierCV.calibrated_classifiers_.
+
+    Public API only: FrozenEstimator (sklearn >= 1.6) or cv="prefit" before it; both fit
+    one calibrator on est's scores of exactly these rows, as CalibratedClassifierCV does
+    for each of its own folds.
+    """
+    try:
+        from sklearn.frozen import FrozenEstimator
+    except ImportError:
+        cal = CalibratedClassifierCV(estimator=est, method="isotonic", cv="prefit")
+    else:
+        cal = CalibratedClassifierCV(estimator=FrozenEstimator(est), method="isotonic", ensemble=False)
+    pair = cal.fit(X_cal, y_cal).calibrated_classifiers_[0]
+    pair.estimator = est  # the booster itself (thread settings, warm starts), not the frozen wrapper
+    return pair
+
+def _fit_fold(xgb, X, y, train_idx, test_idx, classes, ckpt_path: str):
+    """Worker: one CalibratedClassifierCV fold (booster + isotonic calibrator), checkpointed."""
+    t0 = time.perf_counter()
+    X_train, X_test = (X.iloc[train_idx], X.iloc[test_idx]) if hasattr(X, "iloc") else (X[train_idx], X[test_idx])
+    y = np.asarray(y)
+    est = xgb.fit(X_train, y[train_idx])
+    pair = calibrate_fitted(est, X_test, y[test_idx])
+    if not np.array_equal(pair.classes, classes):
+        raise ValueError(f"fold {os.path.basename(ckpt_path)}: classes {pair.classes} != {classes}")
+    tmp = ckpt_path + ".tmp"
+    joblib.dump(pair, tmp)
+    os.replace(tmp, ckpt_path)  # a fold only counts once it is fully written
+    return time.perf_counter() - t0
+
+def _run_dir(data_key: str, xgb) -> str:
+    """Fold checkpoint directory of one (data, parameters, library versions) training run."""
+    run_key = hashlib.sha1(json.dumps({
+        "data": data_key, "params": {k: repr(v) for k, v in xgb.get_params().items()},
+        "folds": N_FOLDS, "seed": SEED, "sklearn": sklearn.__version__, "xgboost": xgboost.__version__,
+    }, sort_keys=True).encode()).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, f"run-{run_key}")
+
+def train_calibrated_xgb_parallel(Xtr, ytr, data_key: str, workers: int, timings: dict,
+                                  params: Optional[dict] = None):
+    """Same model as train_calibrated_xgb, folds fitted in worker processes and resumable."""
+    from concurrent.futures import ProcessPoolExecutor
+    from sklearn.base import clone
+    from sklearn.preprocessing import LabelEncoder
+
+    print("[6/6] Train XGBoost + isotonic calibration (parallel folds)…", flush=True)
+    xgb = make_xgb(ytr, params=params)
+    skf = StratifiedKFold(n_splits=N_FOLDS, shuffle=True, random_state=SEED)
+    clf = CalibratedClassifierCV(estimator=xgb, method="isotonic", cv=skf)
+    classes = LabelEncoder().fit(ytr).classes_
+
+    run_dir = _run_dir(data_key, xgb)
+    run_key = os.path.basename(run_dir)[len("run-"):]
+    os.makedirs(run_dir, exist_ok=True)
+    ckpts = [os.path.join(run_dir, f"fold_{k}.pkl") for k in range(N_FOLDS)]
+
+    workers = max(1, min(workers, N_FOLDS))
+    threads = max(1, (os.cpu_count() or 1) // workers)  # no OpenMP oversubscription
+    todo = [k for k in range(N_FOLDS) if not os.path.exists(ckpts[k])]
+    print(
+        f"Run {run_key}: {N_FOLDS - len(todo)}/{N_FOLDS} folds checkpointed, "
+        f"fitting {len(todo)} with {workers} workers x {threads} threads",
+        flush=True,
+    )
+    splits = list(skf.split(Xtr, ytr))
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                k: pool.submit(_fit_fold, clone(xgb).set_params(n_jobs=threads), Xtr, ytr,
+                               splits[k][0], splits[k][1], classes, ckpts[k])
+                for k in todo
+            }
+            for k, fut in futures.items():
+                timings[f"fold_{k}"] = fut.result()
+                print(f"  fold {k} done in {timings[f'fold_{k}']:.1f}s", flush=True)
+
+    clf.classes_ = classes
+    clf.calibrated_classifiers_ = [joblib.load(p) for p in ckpts]
+    first = clf.calibrated_classifiers_[0].estimator
+    for attr in ("n_features_in_", "feature_names_in_"):
+        if hasattr(first, attr):
+            setattr(clf, attr, getattr(first, attr))
+    for cc in clf.calibrated_classifiers_:
+        cc.estimator.set_params(n_jobs=-1)  # serve with all cores again
+    return clf
+
+def run_orchestrated(workers: int, build_table: bool = False):
+    """Cached encode -> split/scale -> parallel resumable folds -> evaluate -> save, with timings."""
+    timings = {}
+    t_all = time.perf_counter()
+
+    def stage(name, fn, *a, **kw):
+        t0 = time.perf_counter()
+        out = fn(*a, **kw)
+        timings[name] = time.perf_counter() - t0
+        return out
+
+    if not os.path.exists(CSV_PATH):
+        raise FileNotFoundError(f"CSV not found at: {CSV_PATH}")
+    X, y, feature_order, one_hot_cols, data_key = stage("load_encode", load_encoded_cached, CSV_PATH)
+    pi_train = float(y.mean())
+    print(f"Training prevalence (pi_train): {pi_train:.4f}", flush=True)
+    Xtr, Xte, ytr, yte, scaler = stage("split_scale", split_and_scale, X, y)
+    model = stage("train_folds", train_calibrated_xgb_parallel, Xtr, ytr, data_key, workers, timings)
+    stage("evaluate", evaluate, model, Xte, yte)
+    stage("save", save_artifacts, scaler, model, feature_order, one_hot_cols, pi_train)
+    stage("drift_reference", save_drift_reference, model, scaler, Xtr, Xte, feature_order, pi_train)
+    stage("evaluation", save_evaluation_report, model, Xte, yte, feature_order, pi_train, workers)
+    X_check = pd.concat([Xte[feature_order], synthetic_check_matrix()[feature_order]])
+    stage("compile_fused", compile_fused, model, X_check)
+    stage("compile_explain", compile_explainer, model, X_check)
+    if build_table:
+        stage("risk_table", build_risk_table, model, X_check)
+    stage("compact", compile_compact, scaler, model)
+    timings["total"] = time.perf_counter() - t_all
+
+    print("Wall time by stage:", flush=True)
+    for name, sec in timings.items():
+        print(f"  {name:<14} {sec:8.2f}s", flush=True)
+    return model, timings
+
+# -------------------
+# Hyperparameter search: successive halving / Hyperband over boosting rounds
+# -------------------
+SEARCH_EARLY_STOPPING = 50
+
+# parameter -> sampler(rng); the defaults (XGB_PARAMS) always run as candidate 0
+SEARCH_SPACE = {
+    "learning_rate": lambda r: float(np.exp(r.uniform(np.log(0.01), np.log(0.3)))),
+    "max_depth": lambda r: int(r.integers(2, 9)),
+    "min_child_weight": lambda r: float(np.exp(r.uniform(np.log(0.5), np.log(20.0)))),
+    "subsample": lambda r: float(r.uniform(0.6, 1.0)),
+    "colsample_bytree": lambda r: float(r.uniform(0.5, 1.0)),
+    "reg_lambda": lambda r: float(np.exp(r.uniform(np.log(0.1), np.log(20.0)))),
+    "gamma": lambda r: float(r.choice([0.0, r.uniform(0.0, 2.0)])),
+}
+
+_search_data = {}  # per worker: views onto the shared X / y / validation mask
+
+def _attach_search_data(names: dict, n_rows: int, n_features: int):
+    """Pool initializer: map the parent's shared-memory blocks (no copy, nothing re-parsed)."""
+    from multiprocessing import shared_memory
+
+    # workers share the parent's resource tracker, and the parent unlinks the blocks when done
+    blocks = {key: shared_memory.SharedMemory(name=name) for key, name in names.items()}
+    _search_data["shm"] = blocks
+    _search_data["X"] = np.ndarray((n_rows, n_features), dtype=np.float32, buffer=blocks["X"].buf)
+    _search_data["y"] = np.ndarray((n_rows,), dtype=np.int8, buffer=blocks["y"].buf)
+    _search_data["val"] = np.ndarray((n_rows,), dtype=np.bool_, buffer=blocks["val"].buf)
+
+def _search_trial(trial: int, params: dict, rounds: int, threads: int, spw: float) -> dict:
+    """Worker: fit up to `rounds` trees with early stopping on the validation rows."""
+    from sklearn.metrics import log_loss
+
+    X, y, val = _search_data["X"], _search_data["y"], _search_data["val"]
+    t0 = time.perf_counter()
+    est = XGBClassifier(
+        **{**XGB_PARAMS, **params, "n_estimators": rounds},
+        objective="binary:logistic", eval_metric="logloss", early_stopping_rounds=SEARCH_EARLY_STOPPING,
+        n_jobs=threads, random_state=SEED, scale_pos_weight=spw,
+    )
+    est.fit(X[~val], y[~val], eval_set=[(X[val], y[val])], verbose=False)
+    p = est.predict_proba(X[val])[:, 1]
+    return {
+        "trial": trial,
+        "params": params,
+        "rounds": rounds,
+        "best_iteration": int(est.best_iteration),
+        "val_logloss": float(log_loss(y[val], p)),
+        "val_roc_auc": float(roc_auc_score(y[val], p)),
+        "seconds": time.perf_counter() - t0,
+    }
+
+def _hyperband_brackets(candidates: int, min_rounds: int, max_rounds: int, eta: int, brackets: int):
+    """[(n configs, [rounds per rung])] -- brackets=1 is plain successive halving."""
+    s_max = max(0, int(np.floor(np.log(max_rounds / min_rounds) / np.log(eta) + 1e-9)))
+    out = []
+    for s in range(s_max, max(s_max - brackets, -1), -1):
+        n = int(np.ceil(candidates * (s_max + 1) / (s + 1) * float(eta) ** (s - s_max)))
+        rungs = [int(round(max_rounds * float(eta) ** (i - s))) for i in range(s + 1)]
+        out.append((n, rungs))
+    return out
+
+def run_search(workers: int, candidates: int = 27, eta: int = 3, min_rounds: int = 100,
+               max_rounds: int = 900, brackets: int = 1, seed: int = SEED):
+    """Search XGB_PARAMS on a validation fold of the training split, refit the winner with isotonic
+    calibration and compare it with the defaults on the test split.
+
+    Returns (model, scaler, feature_order, one_hot_cols, pi_train, Xtr, Xte, report); trials go to
+    .train_cache/search-<time>/trials.jsonl, the summary to report.json next to it.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import shared_memory
+
+    t_all = time.perf_counter()
+    X, y, feature_order, one_hot_cols, data_key = load_encoded_cached(CSV_PATH)
+    pi_train = float(y.mean())
+    Xtr, Xte, ytr, yte, scaler = split_and_scale(X, y)
+    _, val_idx = next(StratifiedKFold(n_splits=N_FOLDS, shuffle=True, random_state=SEED).split(Xtr, ytr))
+    pos = int(ytr.sum())
+    spw = (len(ytr) - pos) / max(pos, 1) if pos else 1.0
+
+    # encoded training split -> shared memory, once; workers map it read-only
+    arrays = {
+        "X": np.ascontiguousarray(Xtr[feature_order].to_numpy(dtype=np.float32)),
+        "y": ytr.to_numpy().astype(np.int8),
+        "val": np.isin(np.arange(len(ytr)), val_idx),
+    }
+    blocks = {k: shared_memory.SharedMemory(create=True, size=max(a.nbytes, 1)) for k, a in arrays.items()}
+    for k, a in arrays.items():
+        np.ndarray(a.shape, dtype=a.dtype, buffer=blocks[k].buf)[...] = a
+
+    run_dir = os.path.join(CACHE_DIR, f"search-{time.strftime('%Y%m%d-%H%M%S')}")
+    os.makedirs(run_dir, exist_ok=True)
+    trials_path = os.path.join(run_dir, "trials.jsonl")
+    workers = max(1, workers)
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    rng = np.random.default_rng(seed)
+    plan = _hyperband_brackets(candidates, min_rounds, max_rounds, eta, brackets)
+    print(f"Search: {len(plan)} bracket(s) {plan} | {workers} workers x {threads} threads | "
+          f"{len(ytr) - len(val_idx)} train / {len(val_idx)} validation rows", flush=True)
+
+    trials, next_id, best = [], 0, None
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach_search_data,
+                                 initargs=({k: b.name for k, b in blocks.items()}, len(ytr), len(feature_order))) as pool, \
+                open(trials_path, "w") as log:
+            for b, (n, rungs) in enumerate(plan):
+                configs = [{k: f(rng) for k, f in SEARCH_SPACE.items()} for _ in range(n)]
+                if b == 0:
+                    configs[0] = {k: v for k, v in XGB_PARAMS.items() if k != "n_estimators"}
+                for rung, rounds in enumerate(rungs):
+                    futures = [pool.submit(_search_trial, next_id + i, c, rounds, threads, spw) for i, c in enumerate(configs)]
+                    next_id += len(configs)
+                    results = [f.result() for f in futures]
+                    for r in results:
+                        r.update(bracket=b, rung=rung)
+                        log.write(json.dumps(r) + "\n")
+                        print(f"  trial {r['trial']:>3} b{b} r{rung} rounds={rounds:<5} best_it={r['best_iteration']:<5} "
+                              f"logloss={r['val_logloss']:.5f} auc={r['val_roc_auc']:.4f} ({r['seconds']:.1f}s)", flush=True)
+                    log.flush()
+                    trials.extend(results)
+                    results.sort(key=lambda r: r["val_logloss"])
+                    if rung == len(rungs) - 1:
+                        if best is None or results[0]["val_logloss"] < best["val_logloss"]:
+                            best = results[0]
+                    else:
+                        configs = [r["params"] for r in results[:max(1, len(results) // eta)]]
+    finally:
+        for blk in blocks.values():
+            blk.close()
+            blk.unlink()
+    t_search = time.perf_counter() - t_all
+
+    # refit only the winner with 5-fold isotonic calibration (trees = its early-stopped count)
+    best_params = dict(best["params"], n_estimators=best["best_iteration"] + 1)
+    print(f"Best: trial {best['trial']} {best_params} (val logloss {best['val_logloss']:.5f})", flush=True)
+    timings = {}
+    model = train_calibrated_xgb_parallel(Xtr, ytr, data_key, workers, timings, params=best_params)
+    default = train_calibrated_xgb_parallel(Xtr, ytr, data_key, workers, timings)
+    print("Test split, default configuration:", flush=True)
+    m_default = evaluate(default, Xte, yte)
+    print("Test split, searched configuration:", flush=True)
+    m_best = evaluate(model, Xte, yte)
+
+    def as_dict(m):
+        return {"roc_auc": m[0], "pr_auc": m[1], "brier": m[2]}
+
+    report = {
+        "data_key": data_key,
+        "plan": plan,
+        "trials": len(trials),
+        "search_seconds": t_search,
+        "total_seconds": time.perf_counter() - t_all,
+        "best_trial": best,
+        "best_params": best_params,
+        "default_params": XGB_PARAMS,
+        "test_default": as_dict(m_default),
+        "test_best": as_dict(m_best),
+        "trials_log": trials_path,
+    }
+    with open(os.path.join(run_dir, "report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Search: {len(trials)} trials in {t_search:.1f}s (total {report['total_seconds']:.1f}s) -> {run_dir}", flush=True)
+    print(f"  {'':<10} {'ROC-AUC':>8} {'PR-AUC':>8} {'Brier':>8}", flush=True)
+    for name, m in (("default", report["test_default"]), ("searched", report["test_best"])):
+        print(f"  {name:<10} {m['roc_auc']:8.4f} {m['pr_auc']:8.4f} {m['brier']:8.4f}", flush=True)
+    return model, scaler, feature_order, one_hot_cols, pi_train, Xtr, Xte, yte, report
+
+# -------------------
+# Incremental retraining: encoded-row store, warm-started fold boosters, refitted calibrators
+# -------------------
+STORE_DIR = os.path.join(CACHE_DIR, "store")
+INCREMENTAL_ROUNDS = 100
+# running vs serving scaler: |mean shift| in serving-std units, or |std ratio - 1|, past which
+# the frozen standardization no longer describes the data and a full retrain is due
+SCALER_DRIFT_LIMIT = 0.1
+TREE_GROWTH_LIMIT = 2.0  # trees per fold vs the full training run before a full retrain is due
+
+def calibration_metrics(y, p, bins: int = 10) -> dict:
+    """ROC-AUC, Brier, log loss and expected calibration error (equal-width bins) of p for labels y."""
+    y = np.asarray(y, dtype=np.float64)
+    p = np.asarray(p, dtype=np.float64)
+    b = np.minimum((p * bins).astype(np.int64), bins - 1)
+    n = np.bincount(b, minlength=bins)
+    gap = np.abs(np.bincount(b, weights=y, minlength=bins) - np.bincount(b, weights=p, minlength=bins))
+    q = np.clip(p, 1e-15, 1 - 1e-15)
+    return {
+        "roc_auc": float(roc_auc_score(y, p)),
+        "brier": float(brier_score_loss(y, p)),
+        "log_loss": float(-np.mean(y * np.log(q) + (1 - y) * np.log(1 - q))),
+        "ece": float(gap.sum() / max(n.sum(), 1)),
+    }
+
+def _store_frame(X_raw: np.ndarray, feature_order, dtypes: dict, scaler) -> pd.DataFrame:
+    """Stored unscaled rows -> model matrix (serving scaler applied, the dtypes the boosters were fit on)."""
+    X = pd.DataFrame(X_raw, columns=feature_order).astype(dtypes)
+    X.loc[:, NUMERIC_COLS] = scaler.transform(X[NUMERIC_COLS])
+    return X
+
+def _encode_span(path: str, start: int, end: int, feature_order) -> tuple:
+    """Byte span of the CSV -> (unscaled X in feature_order as float64, y)."""
+    df = read_raw_csv(path, start, end)
+    return encode_features(df)[feature_order].to_numpy(dtype=np.float64), TARGET_ENCODER.encode(df[TARGET])
+
+def _bootstrap_store(store: EncodedStore, workers: int, build_table: bool, compile_artifacts: bool = True):
+    """Full training run whose rows, train/test split and calibration folds seed the store."""
+    timings = {}
+    end = complete_rows_end(CSV_PATH)
+    t0 = time.perf_counter()
+    X, y, feature_order, one_hot_cols = load_dataframe(read_raw_csv(CSV_PATH, end=end))
+    hashes = row_hashes(X.to_numpy(dtype=np.float64), y.to_numpy())
+    timings["load_encode"] = time.perf_counter() - t0
+    pi_train = float(y.mean())
+    print(f"Training prevalence (pi_train): {pi_train:.4f}", flush=True)
+    Xtr, Xte, ytr, yte, scaler = split_and_scale(X, y)
+    t0 = time.perf_counter()
+    model = train_calibrated_xgb_parallel(Xtr, ytr, dataset_key(CSV_PATH), workers, timings)
+    timings["train_folds"] = time.perf_counter() - t0
+    evaluate(model, Xte, yte)
+
+    # the split and folds the model was trained with, by CSV row
+    fold = np.full(len(y), -1, dtype=np.int8)
+    skf = StratifiedKFold(n_splits=N_FOLDS, shuffle=True, random_state=SEED)
+    for k, (_, cal_idx) in enumerate(skf.split(Xtr, ytr)):
+        fold[X.index.get_indexer(Xtr.index[cal_idx])] = k
+    test = np.zeros(len(y), dtype=bool)
+    test[X.index.get_indexer(Xte.index)] = True
+    fold_seconds = [timings[f"fold_{k}"] for k in range(N_FOLDS) if f"fold_{k}" in timings]
+    store.create(
+        CSV_PATH, end, schema_key(), feature_order, X.to_numpy(dtype=np.float64), y.to_numpy(),
+        test, fold, hashes, copy.deepcopy(scaler),
+        feature_dtypes={c: str(t) for c, t in X.dtypes.items()},
+        full_train={
+            "rows": int(len(y)), "train_rows": int(len(ytr)),
+            "encode_seconds": timings["load_encode"],
+            # summed fold fits, comparable whatever the worker count (None: folds came from checkpoints)
+            "fold_seconds": float(sum(fold_seconds)) if len(fold_seconds) == N_FOLDS else None,
+            "trees_per_fold": model.calibrated_classifiers_[0].estimator.get_booster().num_boosted_rounds(),
+        },
+    )
+    print(f"Store: {store.rows} encoded rows -> {STORE_DIR}", flush=True)
+    publish_model(model, scaler, Xtr, Xte, feature_order, one_hot_cols, pi_train)
+    store.state.update(model_digest=_sha1_file(MODEL_PATH), trained_rows=store.rows)
+    store.save_state()
+    if compile_artifacts:
+        compile_serving_artifacts(model, scaler, Xte, yte, feature_order, pi_train, build_table, workers)
+    return model
+
+def _continue_fold(cc, X, y, train_idx, cal_idx, rounds: int, threads: int):
+    """Worker: `rounds` more trees on one fold's booster (all its training rows, old and new),
+    then a fresh isotonic calibrator on the fold's held-out rows."""
+    t0 = time.perf_counter()
+    est = cc.estimator
+    est.set_params(n_estimators=rounds, n_jobs=threads)
+    est.fit(X.iloc[train_idx], y[train_idx], xgb_model=est.get_booster())
+    est.set_params(n_estimators=est.get_booster().num_boosted_rounds())
+    pair = calibrate_fitted(est, X.iloc[cal_idx], y[cal_idx])
+    est.set_params(n_jobs=-1)
+    return pair, time.perf_counter() - t0
+
+def continue_calibrated_xgb(model, X, y, train, fold, rounds: int, workers: int, timings: dict):
+    """Warm-start every fold booster of a fitted CalibratedClassifierCV; only the calibrators are refit."""
+    from concurrent.futures import ProcessPoolExecutor
+
+    workers = max(1, min(workers, N_FOLDS))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    print(f"Continuing {N_FOLDS} fold boosters by {rounds} rounds with {workers} workers x {threads} threads…", flush=True)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(_continue_fold, cc, X, y, np.flatnonzero(train & (fold != k)),
+                        np.flatnonzero(fold == k), rounds, threads)
+            for k, cc in enumerate(model.calibrated_classifiers_)
+        ]
+        pairs = []
+        for k, fut in enumerate(futures):
+            pair, timings[f"fold_{k}"] = fut.result()
+            pairs.append(pair)
+            print(f"  fold {k} done in {timings[f'fold_{k}']:.1f}s", flush=True)
+    model.calibrated_classifiers_ = pairs
+    return model
+
+def run_incremental(workers: int, rounds: int = INCREMENTAL_ROUNDS, compare: bool = False,
+                    build_table: bool = False, compile_artifacts: bool = True):
+    """Append the CSV's new rows to the store, continue the fold boosters, refit the calibrators,
+    publish, and report the speedup and calibration drift vs a full retrain.
+
+    model.pkl is published (and the store marked as trained) before the evaluation bootstrap and
+    the fused / explainer / compact compiles, which take most of the wall time; with
+    compile_artifacts=False those are skipped and left to `--compile-only` / `--evaluate-only`."""
+    if not os.path.exists(CSV_PATH):
+        raise FileNotFoundError(f"CSV not found at: {CSV_PATH}")
+    store = EncodedStore(STORE_DIR)
+    reason = None
+    if not store.exists():
+        reason = "no encoded-row store yet"
+    elif store.state["schema_key"] != schema_key():
+        reason = "schema/encoding changed since the store was built"
+    elif not os.path.exists(MODEL_PATH) or _sha1_file(MODEL_PATH) != store.state.get("model_digest"):
+        reason = "model.pkl was not produced from the store"
+    if reason:
+        print(f"Incremental: {reason}; full training to (re)build it", flush=True)
+        return _bootstrap_store(store, workers, build_table, compile_artifacts)
+
+    timings = {}
+    t_all = time.perf_counter()
+    feature_order = store.state["feature_order"]
+    one_hot_cols = feature_order[len(NUMERIC_COLS) + len(BINARY_COLS):]
+    scaler = joblib.load(SCALER_PATH)
+
+    t0 = time.perf_counter()
+    pend = store.pending(CSV_PATH, lambda path, start, end: _encode_span(path, start, end, feature_order))
+    if pend["missing"]:
+        print(f"WARNING: {pend['missing']} stored rows are no longer in {CSV_PATH}; they stay in "
+              "the training data until a full retrain", flush=True)
+    new_rows = 0 if pend["X"] is None else len(pend["y"])
+    if new_rows:
+        y_new = pend["y"]
+        test_new, fold_new = assign_split(y_new, TEST_SIZE, N_FOLDS, seed=[SEED, store.rows])
+        running = store.scaler_running()
+        if (~test_new).any():
+            num = [feature_order.index(c) for c in NUMERIC_COLS]
+            running.partial_fit(pd.DataFrame(pend["X"][~test_new][:, num], columns=NUMERIC_COLS))
+        store.append(CSV_PATH, pend["offset"], pend["X"], y_new, test_new, fold_new, pend["row_hash"], running)
+    timings["load_encode_new"] = time.perf_counter() - t0
+    untrained = store.rows - int(store.state.get("trained_rows", store.rows))
+    print(f"Incremental ({pend['mode']} check): {new_rows} new rows, {untrained} not trained on yet, "
+          f"{store.rows} in the store", flush=True)
+    if untrained <= 0:
+        print("Nothing to train.", flush=True)
+        return None
+
+    t0 = time.perf_counter()
+    data = store.load()
+    dtypes = store.state["feature_dtypes"]
+    X = _store_frame(data["X"], feature_order, dtypes, scaler)
+    y = data["y"].astype(np.int64)
+    test, fold = data["test"], data["fold"]
+    train = ~test
+    timings["load_store"] = time.perf_counter() - t0
+    pi_train = float(y.mean())
+
+    model = joblib.load(MODEL_PATH)
+    previous = calibration_metrics(y[test], model.predict_proba(X[test])[:, 1])
+    t0 = time.perf_counter()
+    model = continue_calibrated_xgb(model, X, y, train, fold, rounds, workers, timings)
+    timings["train_folds"] = time.perf_counter() - t0
+    fold_seconds = float(sum(timings[f"fold_{k}"] for k in range(N_FOLDS)))
+    p_inc = model.predict_proba(X[test])[:, 1]
+    evaluate(model, X[test], y[test])
+    incremental = calibration_metrics(y[test], p_inc)
+
+    full = store.state["full_train"]
+    trees = model.calibrated_classifiers_[0].estimator.get_booster().num_boosted_rounds()
+    report = {
+        "time": time.time(), "mode": pend["mode"], "new_rows": new_rows, "rows": store.rows,
+        "train_rows": int(train.sum()), "test_rows": int(test.sum()), "rounds": rounds,
+        "trees_per_fold": trees, "fold_seconds": fold_seconds,
+        "test_previous": previous, "test_incremental": incremental,
+    }
+    if full.get("fold_seconds"):
+        # full-retrain cost grows with the training rows at a fixed tree count
+        scale = report["train_rows"] / full["train_rows"]
+        report["speedup_estimate"] = {
+            "train": full["fold_seconds"] * scale / fold_seconds,
+            "encode": full["encode_seconds"] * store.rows / full["rows"] / max(timings["load_encode_new"], 1e-9),
+        }
+    if compare:
+        print("Full retrain on the same rows for comparison…", flush=True)
+        t0 = time.perf_counter()
+        Xf = pd.DataFrame(data["X"], columns=feature_order).astype(dtypes)
+        scaler_full = StandardScaler().fit(Xf.loc[train, NUMERIC_COLS])
+        Xf.loc[:, NUMERIC_COLS] = scaler_full.transform(Xf[NUMERIC_COLS])
+        ytr_full = pd.Series(y[train])
+        run_dir = _run_dir(f"store-{store.rows}", make_xgb(ytr_full))
+        shutil.rmtree(run_dir, ignore_errors=True)  # time a real fit, not checkpoint reuse
+        full_timings = {}
+        full_model = train_calibrated_xgb_parallel(Xf[train], ytr_full, f"store-{store.rows}", workers, full_timings)
+        full_seconds = time.perf_counter() - t0
+        shutil.rmtree(run_dir, ignore_errors=True)
+        p_full = full_model.predict_proba(Xf[test])[:, 1]
+        report["test_full_retrain"] = calibration_metrics(y[test], p_full)
+        report["speedup_measured"] = {
+            "train": sum(full_timings[f"fold_{k}"] for k in range(N_FOLDS)) / fold_seconds,
+            "wall": full_seconds / timings["train_folds"],
+        }
+        report["vs_full_retrain"] = {
+            **{f"{m}_delta": incremental[m] - report["test_full_retrain"][m] for m in incremental},
+            "mean_abs_p_diff": float(np.mean(np.abs(p_inc - p_full))),
+            "max_abs_p_diff": float(np.max(np.abs(p_inc - p_full))),
+        }
+
+    drift = store.scaler_drift(scaler)
+    report["scaler_drift"] = drift
+    reasons = [
+        f"{c}: mean shift {d['mean_shift_std']:+.3f} std, std ratio {d['std_ratio']:.3f}"
+        for c, d in drift.items()
+        if abs(d["mean_shift_std"]) > SCALER_DRIFT_LIMIT or abs(d["std_ratio"] - 1) > SCALER_DRIFT_LIMIT
+    ]
+    if trees > TREE_GROWTH_LIMIT * full["trees_per_fold"]:
+        reasons.append(f"{trees} trees per fold vs {full['trees_per_fold']} after the full training run")
+    report["full_retrain_recommended"] = reasons
+
+    publish_model(model, scaler, X[train], X[test], feature_order, one_hot_cols, pi_train)
+    store.state.update(model_digest=_sha1_file(MODEL_PATH), trained_rows=store.rows)
+    store.save_state()
+    timings["published"] = time.perf_counter() - t_all
+    if compile_artifacts:
+        t0 = time.perf_counter()
+        compile_serving_artifacts(model, scaler, X[test], y[test], feature_order, pi_train, build_table, workers)
+        timings["compile"] = time.perf_counter() - t0
+    timings["total"] = time.perf_counter() - t_all
+    report["timings"] = timings
+    store.record_run(report)
+
+    print(f"Incremental retrain: {report['train_rows']} training rows, +{rounds} rounds "
+          f"({trees} trees per fold), folds {fold_seconds:.1f}s, model.pkl published at {timings['published']:.1f}s, "
+          f"total {timings['total']:.1f}s", flush=True)
+    if not compile_artifacts:
+        print("  --no-compile: evaluation.json and the compiled artifacts still describe the previous model "
+              "(run: python lungcancer.py --compile-only and --evaluate-only)", flush=True)
+    for name in ("speedup_estimate", "speedup_measured"):
+        if name in report:
+            print(f"  {name}: " + ", ".join(f"{k} {v:.1f}x" for k, v in report[name].items()), flush=True)
+    print(f"  {'':<14} {'ROC-AUC':>8} {'Brier':>8} {'LogLoss':>8} {'ECE':>8}", flush=True)
+    for name in ("test_previous", "test_incremental", "test_full_retrain"):
+        if name in report:
+            m = report[name]
+            print(f"  {name[5:]:<14} {m['roc_auc']:8.4f} {m['brier']:8.4f} {m['log_loss']:8.4f} {m['ece']:8.4f}", flush=True)
+    if "vs_full_retrain" in report:
+        print(f"  vs full retrain: mean |dp| {report['vs_full_retrain']['mean_abs_p_diff']:.4f}, "
+              f"max |dp| {report['vs_full_retrain']['max_abs_p_diff']:.4f}", flush=True)
+    for r in reasons:
+        print(f"  full retrain recommended: {r}", flush=True)
+    return model
+
 # -------------------
 # Evaluate
 # -------------------
@@ -358,14 +982,213 @@ def save_artifacts(scaler, model, feature_order, one_hot_cols, pi_train: float):
     print(f"✅ Saved: {MODEL_PATH}", flush=True)
     print(f"✅ Saved: {META_PATH}", flush=True)
 
+def save_drift_reference(model, scaler, Xtr, Xte, feature_order, pi_train: float):
+    """Binned profile of the training inputs + test-split p_raw, the baseline of the API's drift monitor."""
+    ref = build_reference(
+        Xtr[feature_order].to_numpy(), feature_order, NUMERIC_COLS, BINARY_COLS,
+        {"radon_exposure": [f"radon_{l}" for l in RADON_LEVELS],
+         "alcohol_consumption": [f"alcohol_{l}" for l in ALCOHOL_LEVELS]},
+        scaler.mean_, scaler.scale_, model.predict_proba(Xte[feature_order])[:, 1], pi_train,
+    )
+    save_reference(dict(ref, model_digest=file_digest(MODEL_PATH)), DRIFT_PATH)
+    print(f"✅ Saved: {DRIFT_PATH}", flush=True)
+
+def save_evaluation_report(model, Xte, yte, feature_order, pi_train: float, workers: int = 1):
+    """Operating points, bootstrap intervals and reliability bins of the test split -> evaluation.json."""
+    report = evaluate_scores(np.asarray(yte), model.predict_proba(Xte[feature_order])[:, 1], pi_train,
+                             EVAL_PI_DEPLOYS, resamples=EVAL_RESAMPLES, workers=workers, seed=SEED)
+    save_evaluation(dict(report, model_digest=file_digest(MODEL_PATH)), EVAL_PATH)
+    boot = report["bootstrap"]
+    print(f"Test split, {int(boot['confidence'] * 100)}% bootstrap intervals ({boot['resamples']} resamples, "
+          f"{boot['workers']} workers, {boot['seconds']:.1f}s):", flush=True)
+    for name, m in report["metrics"].items():
+        print(f"  {name:<9} {m['value']:.4f}  [{m['lo']:.4f}, {m['hi']:.4f}]", flush=True)
+    print(f"✅ Saved: {EVAL_PATH}", flush=True)
+    return report
+
+# -------------------
+# Compile fused predictor
+# -------------------
+def synthetic_check_matrix(n: int = 20000, seed: int = 0) -> pd.DataFrame:
+    """Random rows in model space: standardized numerics + every binary / one-hot combination."""
+    rng = np.random.default_rng(seed)
+    one_hot_cols = [f"radon_{l}" for l in RADON_LEVELS] + [f"alcohol_{l}" for l in ALCOHOL_LEVELS]
+    n_num, n_bin = len(NUMERIC_COLS), len(BINARY_COLS)
+    X = np.zeros((n, n_num + n_bin + len(one_hot_cols)))
+    X[:, :n_num] = rng.normal(0.0, 1.5, size=(n, n_num))
+    X[:, n_num:n_num + n_bin] = rng.integers(0, 2, size=(n, n_bin))
+    rows = np.arange(n)
+    X[rows, n_num + n_bin + rng.integers(0, len(RADON_LEVELS), n)] = 1.0
+    X[rows, n_num + n_bin + len(RADON_LEVELS) + rng.integers(0, len(ALCOHOL_LEVELS), n)] = 1.0
+    return pd.DataFrame(X, columns=NUMERIC_COLS + BINARY_COLS + one_hot_cols)
+
+def compile_fused(model, X_check) -> FusedPredictor:
+    """Export the calibrated ensemble to FUSED_PATH and verify it against model.predict_proba."""
+    print("Compiling fused predictor…", flush=True)
+    arrays = export_fused(model)
+    fused = FusedPredictor(arrays)
+    X_check = np.asarray(X_check, dtype=np.float32)
+    ref = model.predict_proba(X_check)[:, 1]
+    got = fused.predict_proba(X_check)[:, 1]
+    max_diff = float(np.max(np.abs(ref - got))) if len(ref) else 0.0
+    print(
+        f"Fused: {fused.n_trees} trees x depth {fused.depth} over {fused.n_folds} folds | "
+        f"max |p - p_model| = {max_diff:.2e} on {len(ref)} rows",
+        flush=True,
+    )
+    if max_diff > FUSED_TOLERANCE:
+        raise RuntimeError(
+            f"Fused predictor disagrees with model.predict_proba (max diff {max_diff:.2e} > {FUSED_TOLERANCE:g})"
+        )
+    save_fused(stamp_digest(arrays, file_digest(MODEL_PATH)), FUSED_PATH)
+    print(f"✅ Saved: {FUSED_PATH}", flush=True)
+    return fused
+
+def compile_explainer(model, X_check, check_rows: int = 200) -> TreeShapExplainer:
+    """Compile the TreeSHAP lookup tables and check them against xgboost's native pred_contribs."""
+    print("Compiling TreeSHAP explainer…", flush=True)
+    one_hot_cols = [f"radon_{l}" for l in RADON_LEVELS] + [f"alcohol_{l}" for l in ALCOHOL_LEVELS]
+    cols = (NUMERIC_COLS + BINARY_COLS + one_hot_cols, NUMERIC_COLS, BINARY_COLS)
+    arrays = build_explainer(model, *cols, log=lambda msg: print(msg, flush=True))
+    explainer = TreeShapExplainer(arrays)
+    X_check = np.asarray(X_check, dtype=np.float32)
+    X_check = X_check[np.random.default_rng(0).permutation(len(X_check))[:check_rows]]
+    report = check_explainer(explainer, model, X_check, *cols)
+    print(
+        f"Explainer vs native TreeSHAP: max diff {report['max_abs_diff_vs_native']:.2e} "
+        f"on {report['rows']} rows ({report['ms_per_row']:.3f} ms/row)",
+        flush=True,
+    )
+    if not report["matches_native"]:
+        raise RuntimeError(f"Explainer disagrees with native TreeSHAP: {report}")
+    save_explainer(stamp_digest(arrays, file_digest(MODEL_PATH)), EXPLAIN_PATH)
+    print(f"✅ Saved: {EXPLAIN_PATH}", flush=True)
+    return explainer
+
+def build_risk_table(model, X_check) -> RiskTable:
+    """Build the exact lookup table and check it against model.predict_proba."""
+    print("Building risk lookup table…", flush=True)
+    one_hot_cols = [f"radon_{l}" for l in RADON_LEVELS] + [f"alcohol_{l}" for l in ALCOHOL_LEVELS]
+    feature_order = NUMERIC_COLS + BINARY_COLS + one_hot_cols
+    arrays = build_table(
+        model, feature_order, NUMERIC_COLS, BINARY_COLS, RADON_LEVELS, ALCOHOL_LEVELS,
+        log=lambda msg: print(msg, flush=True),
+    )
+    table = RiskTable(arrays)
+    X_check = np.asarray(X_check, dtype=np.float32)
+    mismatches = int(np.count_nonzero(model.predict_proba(X_check)[:, 1] != table.predict_proba(X_check)[:, 1]))
+    print(f"Risk table vs model: {mismatches} mismatches on {len(X_check)} rows", flush=True)
+    if mismatches:
+        raise RuntimeError(f"Risk table disagrees with model.predict_proba on {mismatches} rows")
+    save_table(stamp_digest(arrays, file_digest(MODEL_PATH)), TABLE_PATH)
+    print(f"✅ Saved: {TABLE_PATH}", flush=True)
+    return table
+
+def compile_compact(scaler, model) -> CompactArtifact:
+    """Pack scaler, meta and the compiled arrays into model_compact.bin (run after the other artifacts)."""
+    path = build_compact(BASE_DIR, scaler, model, file_digest(MODEL_PATH))
+    art = CompactArtifact.open(path)
+    print(f"✅ Saved: {path} ({art.nbytes / 1e6:.1f} MB; sections: {', '.join(art.sections())})", flush=True)
+    return art
+
+def publish_model(model, scaler, Xtr, Xte, feature_order, one_hot_cols, pi_train: float):
+    """scaler.pkl + model.pkl + meta.json + drift reference: all the API needs to serve the new model."""
+    save_artifacts(scaler, model, feature_order, one_hot_cols, pi_train)
+    save_drift_reference(model, scaler, Xtr, Xte, feature_order, pi_train)
+
+def compile_serving_artifacts(model, scaler, Xte, yte, feature_order, pi_train: float,
+                              build_table: bool = False, workers: int = 1):
+    """Evaluation + fused/explain (+ table) + compact for the published model.pkl, all checked against the model."""
+    save_evaluation_report(model, Xte, yte, feature_order, pi_train, workers)
+    X_check = pd.concat([Xte[feature_order], synthetic_check_matrix()[feature_order]])
+    compile_fused(model, X_check)
+    compile_explainer(model, X_check)
+    if build_table:
+        build_risk_table(model, X_check)
+    compile_compact(scaler, model)
+
+def publish_artifacts(model, scaler, Xtr, Xte, yte, feature_order, one_hot_cols, pi_train: float,
+                      build_table: bool = False, workers: int = 1):
+    """Save + drift reference + evaluation + fused/explain (+ table) + compact, all checked against the model."""
+    publish_model(model, scaler, Xtr, Xte, feature_order, one_hot_cols, pi_train)
+    compile_serving_artifacts(model, scaler, Xte, yte, feature_order, pi_train, build_table, workers)
+
 # -------------------
 # Main
 # -------------------
 if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Train the calibrated XGBoost lung-cancer model.")
+    ap.add_argument("--evaluate-only", action="store_true",
+                    help="skip training; write evaluation.json for the existing model.pkl on the test split")
+    ap.add_argument("--compile-only", action="store_true",
+                    help="skip training; export model_fused.npz + model_explain.npz from the existing model.pkl")
+    ap.add_argument("--build-table", action="store_true",
+                    help="also build the exact risk lookup table (risk_table.npz)")
+    ap.add_argument("--orchestrate", action="store_true",
+                    help="cached encoded data + parallel, checkpointed folds + per-stage timings")
+    ap.add_argument("--workers", type=int, default=min(N_FOLDS, os.cpu_count() or 1),
+                    help="fold worker processes for --orchestrate/--incremental / trial workers for --search; "
+                         "bootstrap workers for evaluation.json")
+    ap.add_argument("--search", action="store_true",
+                    help="successive-halving search of the XGBoost parameters, refit + compare the winner")
+    ap.add_argument("--search-candidates", type=int, default=27, help="configurations in the widest bracket")
+    ap.add_argument("--search-eta", type=int, default=3, help="keep 1/eta of the trials per rung")
+    ap.add_argument("--search-min-rounds", type=int, default=100)
+    ap.add_argument("--search-max-rounds", type=int, default=900)
+    ap.add_argument("--search-brackets", type=int, default=1, help="Hyperband brackets (1 = successive halving)")
+    ap.add_argument("--search-save", action="store_true",
+                    help="save the searched model as the artifacts (default: report only)")
+    ap.add_argument("--incremental", action="store_true",
+                    help="append the CSV's new rows to the encoded store, continue the fold boosters, refit calibration")
+    ap.add_argument("--incremental-rounds", type=int, default=INCREMENTAL_ROUNDS,
+                    help="extra boosting rounds per fold")
+    ap.add_argument("--incremental-compare", action="store_true",
+                    help="also run a full retrain on the same rows and report measured speedup + calibration drift")
+    ap.add_argument("--no-compile", action="store_true",
+                    help="with --incremental: publish model.pkl only; skip evaluation.json and the compiled artifacts")
+    args = ap.parse_args()
+
+    if args.compile_only:
+        model = joblib.load(MODEL_PATH)
+        compile_fused(model, synthetic_check_matrix())
+        compile_explainer(model, synthetic_check_matrix())
+        if args.build_table:
+            build_risk_table(model, synthetic_check_matrix())
+        compile_compact(joblib.load(SCALER_PATH), model)
+        raise SystemExit(0)
+
+    if args.evaluate_only:
+        X, y, feature_order, _ = load_dataframe()
+        _, Xte, _, yte, _ = split_and_scale(X, y)
+        save_evaluation_report(joblib.load(MODEL_PATH), Xte, yte, feature_order, float(y.mean()), args.workers)
+        raise SystemExit(0)
+
     print(">>> START lungcancer.py", flush=True)
     print(f"Using Python at: {os.sys.executable}", flush=True)
     print(f"BASE_DIR: {BASE_DIR}", flush=True)
 
+    if args.search:
+        model, scaler, feature_order, one_hot_cols, pi_train, Xtr, Xte, yte, _ = run_search(
+            args.workers, args.search_candidates, args.search_eta, args.search_min_rounds,
+            args.search_max_rounds, args.search_brackets,
+        )
+        if args.search_save:
+            publish_artifacts(model, scaler, Xtr, Xte, yte, feature_order, one_hot_cols, pi_train, args.build_table,
+                              args.workers)
+        print(">>> DONE", flush=True)
+        raise SystemExit(0)
+
+    if args.incremental:
+        run_incremental(args.workers, args.incremental_rounds, args.incremental_compare, args.build_table,
+                        not args.no_compile)
+        print(">>> DONE", flush=True)
+        raise SystemExit(0)
+
+    if args.orchestrate:
+        run_orchestrated(args.workers, build_table=args.build_table)
+        print(">>> DONE", flush=True)
+        raise SystemExit(0)
+
     X, y, feature_order, one_hot_cols = load_dataframe()
     pi_train = float(y.mean())
     print(f"Training prevalence (pi_train): {pi_train:.4f}", flush=True)
@@ -373,6 +1196,7 @@ if __name__ == "__main__":
     Xtr, Xte, ytr, yte, scaler = split_and_scale(X, y)
     model = train_calibrated_xgb(Xtr, ytr)
     evaluate(model, Xte, yte)
-    save_artifacts(scaler, model, feature_order, one_hot_cols, pi_train)
+    publish_artifacts(model, scaler, Xtr, Xte, yte, feature_order, one_hot_cols, pi_train, args.build_table,
+                      args.workers)
 
     print(">>> DONE", flush=True)
@@ -0,0 +1,204 @@
+"""
+Low-overhead metrics for the API, rendered in Prometheus text format (no client library).
+
+- `Counter`, `Gauge`, `CallbackCounter`, `Histogram` with label values passed positionally; an observation
+  is a bisect + a few additions under a lock (~1 µs)
+- `process_metrics()`: process CPU seconds, resident memory, start time
+- `StackSampler`: opt-in wall-clock stack sampler for a live worker; returns folded
+  stacks ("frame;frame;frame count" per line), which flamegraph.pl, speedscope and
+  inferno read directly
+"""
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import collections
+import os
+import resource
+import sys
+import threading
+import time
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384)
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, *labels) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_fmt_labels(self.labelnames, k)} {_num(v)}" for k, v in items]
+
+class Gauge(_Metric):
+    """Set explicitly, or computed at scrape time by `fn` returning {label values: value}."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 fn: Optional[Callable[[], Dict[Tuple, float]]] = None):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self.fn = fn
+
+    def set(self, value: float, *labels) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self) -> List[str]:
+        if self.fn is not None:
+            items = list(self.fn().items())
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return self.header() + [f"{self.name}{_fmt_labels(self.labelnames, k)} {_num(v)}" for k, v in items]
+
+class CallbackCounter(Gauge):
+    """Counter whose values are read at scrape time (e.g. counters kept by another object)."""
+    kind = "counter"
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, List] = {}  # labels -> [per-bucket counts (+Inf last), sum, count]
+
+    def observe(self, value: float, *labels) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            s[0][i] += 1
+            s[1] += value
+            s[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = [(k, list(v[0]), v[1], v[2]) for k, v in self._series.items()]
+        out = self.header()
+        for labels, counts, total, n in series:
+            acc = 0
+            for le, c in zip(self.buckets + (float("inf"),), counts):
+                acc += c
+                le_label = 'le="%s"' % _num(le)
+                out.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, labels, le_label)} {acc}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.labelnames, labels)} {_num(total)}")
+            out.append(f"{self.name}_count{_fmt_labels(self.labelnames, labels)} {n}")
+        return out
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for m in self.metrics:
+            lines.extend(m.render())
+        lines.extend(process_metrics())
+        return "\n".join(lines) + "\n"
+
+_START_TIME = time.time()
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:  # not Linux: peak RSS is the best portable number
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+def process_metrics() -> List[str]:
+    ru = resource.getrusage(resource.RUSAGE_SELF)
+    return [
+        "# HELP process_cpu_seconds_total Total user and system CPU time spent in seconds.",
+        "# TYPE process_cpu_seconds_total counter",
+        f"process_cpu_seconds_total {_num(ru.ru_utime + ru.ru_stime)}",
+        "# HELP process_resident_memory_bytes Resident memory size in bytes.",
+        "# TYPE process_resident_memory_bytes gauge",
+        f"process_resident_memory_bytes {_rss_bytes()}",
+        "# HELP process_start_time_seconds Start time of the process since unix epoch in seconds.",
+        "# TYPE process_start_time_seconds gauge",
+        f"process_start_time_seconds {_num(_START_TIME)}",
+        "# HELP python_threads Live Python threads.",
+        "# TYPE python_threads gauge",
+        f"python_threads {threading.active_count()}",
+    ]
+
+class StackSampler:
+    """Samples every thread's Python stack at a fixed interval; one capture at a time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _frame_name(code) -> str:
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def sample(self, seconds: float, interval: float = 0.005) -> Tuple[str, Dict[str, float]]:
+        """Blocks for `seconds`; returns (folded stacks, capture stats). Raises RuntimeError if busy."""
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("a profile capture is already running")
+        try:
+            me = threading.get_ident()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            stacks: "collections.Counter[str]" = collections.Counter()
+            n, t_end = 0, time.perf_counter() + seconds
+            cpu0 = time.process_time()
+            while time.perf_counter() < t_end:
+                for ident, frame in sys._current_frames().items():
+                    if ident == me:
+                        continue
+                    parts = []
+                    while frame is not None:
+                        parts.append(self._frame_name(frame.f_code))
+                        frame = frame.f_back
+                    if ident not in names:  # started during the capture
+                        names = {t.ident: t.name for t in threading.enumerate()}
+                    parts.append(f"thread:{names.get(ident, ident)}")
+                    stacks[";".join(reversed(parts))] += 1
+                n += 1
+                time.sleep(interval)
+            folded = "\n".join(f"{k} {v}" for k, v in stacks.most_common())
+            return folded + "\n", {"samples": n, "stacks": len(stacks), "seconds": seconds,
+                                   "interval": interval, "process_cpu_seconds": time.process_time() - cpu0}
+        finally:
+            self._lock.release()
@@ -0,0 +1,147 @@
+"""
+Packed binary wire format for POST /predict/packed (high-volume machine-to-machine callers).
+
+Request body: N fixed-width little-endian records, no header, no padding
+(Content-Type: application/x-lungcancer-records; v=1):
+
+  offset  type  field
+   0      f8    age                        raw years (standardized on the server)
+   8      f8    pack_years                 raw
+  16      u1    gender                     0 = female, 1 = male
+  17      u1    asbestos_exposure          0/1
+  18      u1    secondhand_smoke_exposure  0/1
+  19      u1    copd_diagnosis             0/1
+  20      u1    family_history             0/1
+  21      u1    radon                      index into RADON_LEVELS   (low, medium, high)
+  22      u1    alcohol                    index into ALCOHOL_LEVELS (none, moderate, heavy)
+  = 23 bytes per row
+
+Response body: N little-endian float32 risks in request order (Content-Type:
+application/x-lungcancer-risks); prevalence-adjusted when a pi_deploy applies, raw
+otherwise -- the X-Risk header says which, X-Model-Version / X-Pi-Train / X-Pi-Deploy /
+X-Rows carry what /predict repeats per row.
+
+The server wraps the body with np.frombuffer (no copy, no per-field parsing) and
+validates it with array ops: binaries must be 0/1, level codes in range, numerics
+finite; anything else is a 400 naming the first bad row. pack_records turns
+PatientInput-style dicts (any spelling /predict accepts, see encoding.py) into a body,
+so a client can convert once and send many times.
+
+Parity check (packed path == JSON path, bit for bit, on the artifacts next to this file):
+  python packed.py [--rows 5000]
+"""
+from typing import Any, Dict, List, Mapping, Sequence
+
+import numpy as np
+
+from encoding import ALCOHOL_LEVELS, RADON_LEVELS, parse_records
+
+FORMAT_VERSION = 1
+CONTENT_TYPE = "application/x-lungcancer-records"
+RESPONSE_CONTENT_TYPE = "application/x-lungcancer-risks"
+
+NUMERIC_FIELDS = ("age", "pack_years")
+BINARY_FIELDS = ("gender", "asbestos_exposure", "secondhand_smoke_exposure", "copd_diagnosis", "family_history")
+LEVEL_FIELDS = {"radon": RADON_LEVELS, "alcohol": ALCOHOL_LEVELS}
+RECORD_DTYPE = np.dtype(
+    [(f, "<f8") for f in NUMERIC_FIELDS] + [(f, "u1") for f in BINARY_FIELDS] + [(f, "u1") for f in LEVEL_FIELDS]
+)
+RISK_DTYPE = np.dtype("<f4")
+
+class PackedFormatError(ValueError):
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+def check_content_type(content_type: str) -> None:
+    """Accept CONTENT_TYPE with an optional v=FORMAT_VERSION parameter; anything else is a 415."""
+    media, *params = [p.strip() for p in (content_type or "").split(";")]
+    if media.lower() != CONTENT_TYPE:
+        raise PackedFormatError(f"Content-Type must be {CONTENT_TYPE}; v={FORMAT_VERSION}", status=415)
+    for p in params:
+        key, _, value = p.partition("=")
+        if key.strip().lower() == "v" and value.strip() != str(FORMAT_VERSION):
+            raise PackedFormatError(f"Unsupported record format version {value.strip()} (server speaks v={FORMAT_VERSION})",
+                                    status=415)
+
+def _first(bad: np.ndarray) -> int:
+    return int(np.flatnonzero(bad)[0])
+
+def decode_records(body) -> np.ndarray:
+    """Request body -> structured (N,) RECORD_DTYPE array viewing the same memory, validated."""
+    if len(body) % RECORD_DTYPE.itemsize:
+        raise PackedFormatError(
+            f"Body is {len(body)} bytes, not a multiple of the {RECORD_DTYPE.itemsize}-byte record")
+    rec = np.frombuffer(body, dtype=RECORD_DTYPE)
+    for f in NUMERIC_FIELDS:
+        bad = ~np.isfinite(rec[f])
+        if bad.any():
+            raise PackedFormatError(f"Row {_first(bad)}: {f} is not a finite number")
+    for f in BINARY_FIELDS:
+        bad = rec[f] > 1
+        if bad.any():
+            raise PackedFormatError(f"Row {_first(bad)}: {f} must be 0 or 1, got {int(rec[f][_first(bad)])}")
+    for f, levels in LEVEL_FIELDS.items():
+        bad = rec[f] >= len(levels)
+        if bad.any():
+            raise PackedFormatError(f"Row {_first(bad)}: {f} code must be < {len(levels)} ({', '.join(levels)})")
+    return rec
+
+def decode_risks(body) -> np.ndarray:
+    return np.frombuffer(body, dtype=RISK_DTYPE)
+
+def engine_columns(rec: np.ndarray) -> Dict[str, Any]:
+    """Decoded records as InferenceEngine.encode_coded columns."""
+    cols: Dict[str, Any] = {f: rec[f] for f in NUMERIC_FIELDS + BINARY_FIELDS}
+    cols.update(radon_level=(rec["radon"], RADON_LEVELS), alcohol_level=(rec["alcohol"], ALCOHOL_LEVELS))
+    return cols
+
+def pack_columns(columns: Mapping[str, Sequence[Any]]) -> bytes:
+    """Already encoded columns (numerics, 0/1 binaries, radon/alcohol codes) -> request body."""
+    n = len(columns[NUMERIC_FIELDS[0]])
+    rec = np.empty(n, dtype=RECORD_DTYPE)
+    for f in RECORD_DTYPE.names:
+        rec[f] = columns[f]
+    return rec.tobytes()
+
+def pack_records(records: List[Mapping[str, Any]]) -> bytes:
+    """PatientInput-style dicts (any spelling /predict accepts) -> request body."""
+    parsed = parse_records(records)
+    radon = {lvl: i for i, lvl in enumerate(RADON_LEVELS)}
+    alcohol = {lvl: i for i, lvl in enumerate(ALCOHOL_LEVELS)}
+    columns: Dict[str, List[Any]] = {f: [r[f] for r in parsed] for f in NUMERIC_FIELDS + BINARY_FIELDS}
+    columns["radon"] = [radon[r["radon_level"]] for r in parsed]
+    columns["alcohol"] = [alcohol[r["alcohol_level"]] for r in parsed]
+    return pack_columns(columns)
+
+# -------------------
+# Parity check: packed records vs the JSON path's parse_records + encode_batch
+# -------------------
+def check_packed(engine, n_rows: int = 5000, seed: int = 0) -> Dict[str, Any]:
+    from encoding import fuzz_records
+
+    records = fuzz_records(n_rows, seed)
+    json_x = engine.encode_batch(parse_records(records)).copy()
+    body = pack_records(records)
+    packed_x = engine.encode_coded(engine_columns(decode_records(body))).copy()
+    return {
+        "rows": n_rows,
+        "bytes_per_row": RECORD_DTYPE.itemsize,
+        "identical": bool(np.array_equal(json_x.view(np.uint32), packed_x.view(np.uint32))),
+        "rows_differing": int(np.count_nonzero((json_x != packed_x).any(axis=1))),
+    }
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import os
+
+    from registry import load_version
+
+    ap = argparse.ArgumentParser(description="Check the packed record path against the JSON encoding path.")
+    ap.add_argument("--rows", type=int, default=5000)
+    args = ap.parse_args()
+    mv = load_version(os.path.dirname(os.path.abspath(__file__)))
+    report = check_packed(mv.engine, args.rows)
+    print(json.dumps(report, indent=2))
+    raise SystemExit(0 if report["identical"] else 1)
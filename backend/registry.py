@@ -0,0 +1,490 @@
+"""
+Versioned model registry for the API.
+
+A version is one artifact set (scaler.pkl, model.pkl, meta.json and optionally
+model_fused.npz / risk_table.npz) loaded together with everything derived from it:
+schema lists, pi_train, the chosen predictor and its InferenceEngine. Requests take
+one `ModelVersion` reference at the start and use it to the end, so swapping the
+active version is a single reference assignment: in-flight requests finish on the
+version they started with, new ones get the new one, nothing pauses.
+
+Sources:
+- the live directory next to app.py (what lungcancer.py writes); it is watched and
+  re-loaded when its artifacts change (see `ArtifactWatcher`)
+- named sets under models/<version>/, loaded at startup or through the admin API
+
+With an up-to-date model_compact.bin (see compact.py) a version is served from the
+memory-mapped arrays: no unpickling, sklearn/xgboost not imported, pages shared by all
+workers; model.pkl is only loaded (`LazyModel`) when something needs the real model.
+
+`ShadowScorer` re-scores live traffic with a candidate version on a background thread
+and keeps agreement statistics; it never affects responses.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from compact import COMPACT_NAME, CompactArtifact, ScalerStats, built_from, file_digest
+from drift import load_reference
+from evaluation import load_evaluation
+from explain import TreeShapExplainer, build_explainer
+from fused import FusedPredictor, RoutedPredictor
+from inference import InferenceEngine
+from risk_table import RiskTable
+from serving import set_booster_threads
+
+ARTIFACT_FILES = ("scaler.pkl", "model.pkl", "meta.json", "model_fused.npz", "risk_table.npz", "model_explain.npz",
+                  COMPACT_NAME, "drift_reference.json", "evaluation.json")
+
+# fallbacks if meta.json is missing (shouldn’t happen once you retrain)
+DEFAULT_FEATURE_ORDER = [
+    "age","pack_years","gender","asbestos_exposure","secondhand_smoke_exposure",
+    "copd_diagnosis","family_history",
+    "radon_low","radon_medium","radon_high",
+    "alcohol_none","alcohol_moderate","alcohol_heavy",
+]
+DEFAULT_NUMERIC_COLS = ["age","pack_years"]
+DEFAULT_BINARY_COLS = ["gender","asbestos_exposure","secondhand_smoke_exposure","copd_diagnosis","family_history"]
+DEFAULT_ONE_HOT_COLS = ["radon_low","radon_medium","radon_high","alcohol_none","alcohol_moderate","alcohol_heavy"]
+DEFAULT_RADON_LEVELS = ["low","medium","high"]
+DEFAULT_ALCOHOL_LEVELS = ["none","moderate","heavy"]
+
+def arrays_digest(arrays: Dict[str, np.ndarray]) -> str:
+    """Digest of a set of named arrays (a model_compact.bin section)."""
+    h = hashlib.sha1()
+    for key in sorted(arrays):
+        a = np.ascontiguousarray(arrays[key])
+        h.update(f"{key}:{a.dtype.str}:{a.shape};".encode())
+        h.update(a.data)
+    return h.hexdigest()[:12]
+
+def artifact_signature(path: str) -> Tuple:
+    """(name, mtime_ns, size) of every artifact present in a directory; changes on any rewrite."""
+    sig = []
+    for name in ARTIFACT_FILES:
+        try:
+            st = os.stat(os.path.join(path, name))
+        except FileNotFoundError:
+            continue
+        sig.append((name, st.st_mtime_ns, st.st_size))
+    return tuple(sig)
+
+class LazyModel:
+    """model.pkl unpickled on first use (that is when sklearn + xgboost get imported)."""
+
+    def __init__(self, path: str, booster_threads: Optional[int] = None):
+        self.path = path
+        self.booster_threads = booster_threads
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def get(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import joblib
+                    model = joblib.load(self.path)
+                    if self.booster_threads:
+                        set_booster_threads(model, self.booster_threads)
+                    self._model = model
+        return self._model
+
+    def predict_proba(self, X):
+        return self.get().predict_proba(X)
+
+class ModelVersion:
+    """One loaded artifact set plus its predictor and encoder."""
+
+    def __init__(self, version: str, path: str, scaler, model, meta: Dict[str, Any],
+                 predictor, predictor_name: str, pi_train: Optional[float], sweep_predictor=None,
+                 model_name: Optional[str] = None, compact: Optional[CompactArtifact] = None,
+                 predictor_digest: Optional[str] = None, model_digest: Optional[str] = None):
+        self.version = version
+        self.path = path
+        self.scaler = scaler
+        self._model = model  # fitted model or LazyModel
+        self.compact = compact
+        self.meta = meta
+        self.feature_order = meta.get("feature_order") or DEFAULT_FEATURE_ORDER
+        self.numeric_cols = meta.get("numeric_cols", DEFAULT_NUMERIC_COLS)
+        self.binary_cols = meta.get("binary_cols", DEFAULT_BINARY_COLS)
+        self.one_hot_cols = meta.get("one_hot_cols", DEFAULT_ONE_HOT_COLS)
+        self.radon_levels = meta.get("radon_levels", DEFAULT_RADON_LEVELS)
+        self.alcohol_levels = meta.get("alcohol_levels", DEFAULT_ALCOHOL_LEVELS)
+        self.pi_train = pi_train
+        self.predictor = predictor
+        self.predictor_name = predictor_name
+        # digest of the artifact the predictor was actually built from (model.pkl, model_fused.npz,
+        # risk_table.npz or a model_compact.bin section); the same version can be re-loaded with
+        # a different predictor, so anything caching predictor output keys on this too
+        self.predictor_digest = predictor_digest or version
+        # digest of model.pkl: compiled artifacts / reports are only used when built from it
+        self.model_digest = model_digest or version
+        # schema + scaler statistics resolved once; requests are encoded without pandas
+        self.engine = InferenceEngine(predictor, scaler, self.feature_order, self.numeric_cols,
+                                      self.binary_cols, self.radon_levels, self.alcohol_levels)
+        # grid sweeps (app /predict/sweep) are large batches: the exact risk table when available
+        self.sweep_predictor = sweep_predictor
+        self.model_name = model_name or getattr(getattr(model, "estimator", model), "__class__", type(model)).__name__
+        self._explainer: Optional[TreeShapExplainer] = None
+        self._explainer_lock = threading.Lock()
+        # training profile for the drift monitor (drift.py), when it matches model.pkl
+        ref_path = os.path.join(path, "drift_reference.json")
+        self.drift_reference = load_reference(ref_path) if built_from(ref_path, self.model_digest) else None
+        # held-out operating points / bootstrap intervals (evaluation.py), when they match model.pkl
+        eval_path = os.path.join(path, "evaluation.json")
+        self.evaluation = load_evaluation(eval_path) if built_from(eval_path, self.model_digest) else None
+        self.loaded_at = time.time()
+        self.signature = artifact_signature(path)
+
+    def sweep_raw(self, x: np.ndarray) -> np.ndarray:
+        """predict_raw for big what-if grids (risk table lookup when loaded, else the predictor)."""
+        if self.sweep_predictor is None:
+            return self.engine.predict_raw(x)
+        return np.clip(self.sweep_predictor.predict_proba(x)[:, 1].astype(float), 1e-12, 1.0 - 1e-12)
+
+    @property
+    def model(self):
+        """The fitted CalibratedClassifierCV (unpickled now if this version was served compact)."""
+        return self._model.get() if isinstance(self._model, LazyModel) else self._model
+
+    @property
+    def model_loaded(self) -> bool:
+        return not isinstance(self._model, LazyModel) or self._model.loaded
+
+    @property
+    def has_compiled_explainer(self) -> bool:
+        return ((self.compact is not None and "explain" in self.compact.header["sections"])
+                or built_from(os.path.join(self.path, "model_explain.npz"), self.model_digest))
+
+    @property
+    def explainer(self) -> TreeShapExplainer:
+        """TreeSHAP tables: mapped from model_compact.bin, model_explain.npz when it was built
+        from model.pkl, else compiled once in memory (~10 s; app.py does that at load time)."""
+        if self._explainer is None:
+            with self._explainer_lock:
+                if self._explainer is None:
+                    path = os.path.join(self.path, "model_explain.npz")
+                    arrays = self.compact.section("explain") if self.compact is not None else None
+                    if arrays is not None:
+                        self._explainer = TreeShapExplainer(arrays)
+                    elif built_from(path, self.model_digest):
+                        self._explainer = TreeShapExplainer.load(path)
+                    else:
+                        # in memory only: the server never writes into the artifact directory (it may
+                        # be read-only, and a new file there would trigger the artifact watcher)
+                        print(f"{path} missing or built from another model.pkl: compiling the TreeSHAP explainer in memory "
+                              "(persist it with: python lungcancer.py --compile-only)…", flush=True)
+                        arrays = build_explainer(self.model, self.feature_order, self.numeric_cols, self.binary_cols)
+                        self._explainer = TreeShapExplainer(arrays)
+        return self._explainer
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "path": self.path,
+            "predictor": self.predictor_name,
+            "predictor_digest": self.predictor_digest,
+            "sweep_predictor": "table" if self.sweep_predictor is not None else self.predictor_name,
+            "model_class": self.model_name,
+            "pi_train": self.pi_train,
+            "n_features": len(self.feature_order),
+            "explainer_loaded": self._explainer is not None,
+            "compact": self.compact.path if self.compact is not None else None,
+            "model_pkl_loaded": self.model_loaded,
+            "drift_reference": self.drift_reference is not None,
+            "evaluation": self.evaluation is not None,
+            "loaded_at": self.loaded_at,
+        }
+
+def load_version(path: str, version: Optional[str] = None, predictor: str = "auto",
+                 fused_max_rows: int = 32, pi_train_override: Optional[float] = None,
+                 sweep_table: bool = True, compact: bool = True,
+                 booster_threads: Optional[int] = None) -> ModelVersion:
+    """Load an artifact directory. version defaults to the model.pkl digest.
+
+    predictor: "model" = CalibratedClassifierCV, "fused" = fused.py kernel (model.pkl only
+    for big batches), "table" = exact risk_table.py lookup (risk_table.npz must be built from
+    this model.pkl), "auto" = fused when model_fused.npz was built from model.pkl, else model.pkl.
+    sweep_table: also load risk_table.npz for grid sweeps when it was built from model.pkl.
+    compact: serve from a model_compact.bin built from this model.pkl / scaler.pkl
+    (memory-mapped; model.pkl is then only unpickled on first use).
+    "Built from" compares the model_digest recorded in each artifact with file_digest(model.pkl).
+    booster_threads: xgboost nthread for model.pkl predictions (None: xgboost's default, all cores).
+    """
+    scaler_path = os.path.join(path, "scaler.pkl")
+    model_path = os.path.join(path, "model.pkl")
+    meta_path = os.path.join(path, "meta.json")
+    fused_path = os.path.join(path, "model_fused.npz")
+    table_path = os.path.join(path, "risk_table.npz")
+    compact_path = os.path.join(path, COMPACT_NAME)
+
+    missing = [p for p in [scaler_path, model_path] if not os.path.exists(p)]
+    if missing:
+        raise FileNotFoundError(f"Missing artifacts: {', '.join(os.path.basename(p) for p in missing)}")
+
+    model_digest = file_digest(model_path)
+    predictor = predictor.strip().lower()
+    art: Optional[CompactArtifact] = None
+    if compact and predictor != "model" and os.path.exists(compact_path):
+        art = CompactArtifact.open(compact_path)
+        if (art.header.get("model_digest") != model_digest
+                or art.header.get("scaler_digest") != file_digest(scaler_path)):
+            art = None
+    if art is not None:
+        scaler = ScalerStats(art.header["scaler"])
+        model = LazyModel(model_path, booster_threads)
+        meta: Dict[str, Any] = art.header["meta"]
+        fused_arrays, table_arrays = art.section("fused"), art.section("table")
+    else:
+        import joblib
+        scaler = joblib.load(scaler_path)
+        model = joblib.load(model_path)
+        if booster_threads:
+            set_booster_threads(model, booster_threads)
+        meta = {}
+        if os.path.exists(meta_path):
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+        fused_arrays = table_arrays = None
+    pi_train = float(meta.get("pi_train")) if "pi_train" in meta else None
+    if pi_train_override is not None:
+        pi_train = pi_train_override
+
+    # an npz built from another model.pkl belongs to the previous model (lungcancer.py writes
+    # model.pkl first, the compiled artifacts seconds later): never serve it under the new one
+    fused_fresh = built_from(fused_path, model_digest)
+    if predictor == "fused" and fused_arrays is None and not fused_fresh:
+        raise FileNotFoundError("PREDICTOR=fused but model_fused.npz is missing or built from another model.pkl "
+                                "(run: python lungcancer.py --compile-only)")
+    if predictor == "table" and table_arrays is not None:
+        pred, name, digest = RiskTable(table_arrays), "table", arrays_digest(table_arrays)
+    elif predictor == "table":
+        # building takes minutes on a real model: never inside startup or a hot reload
+        if not built_from(table_path, model_digest):
+            raise FileNotFoundError("PREDICTOR=table but risk_table.npz is missing or built from another model.pkl "
+                                    "(run: python lungcancer.py --compile-only --build-table)")
+        pred, name, digest = RiskTable.load(table_path), "table", file_digest(table_path)
+    elif predictor in ("fused", "auto") and fused_arrays is not None:
+        pred, name = RoutedPredictor(FusedPredictor(fused_arrays), model, max_rows=fused_max_rows), "fused"
+        digest = arrays_digest(fused_arrays)
+    elif predictor in ("fused", "auto") and fused_fresh:
+        pred, name = RoutedPredictor(FusedPredictor.load(fused_path), model, max_rows=fused_max_rows), "fused"
+        digest = file_digest(fused_path)
+    else:
+        pred, name, digest = model.get() if isinstance(model, LazyModel) else model, "model", model_digest
+
+    sweep = None
+    if name == "table":
+        sweep = pred
+    elif sweep_table and table_arrays is not None:
+        sweep = RiskTable(table_arrays)
+    elif sweep_table and built_from(table_path, model_digest):
+        sweep = RiskTable.load(table_path)
+
+    return ModelVersion(version or model_digest, os.path.abspath(path), scaler, model, meta,
+                        pred, name, pi_train, sweep,
+                        model_name=art.header.get("model_class") if art is not None else None, compact=art,
+                        predictor_digest=f"{name}:{digest}", model_digest=model_digest)
+
+class ModelRegistry:
+    """Loaded versions by name plus the active one; all mutations are single swaps under a lock."""
+
+    def __init__(self):
+        self._versions: Dict[str, ModelVersion] = {}
+        self._active: Optional[ModelVersion] = None
+        self._lock = threading.Lock()
+        self.swaps = 0
+
+    @property
+    def active(self) -> ModelVersion:
+        mv = self._active
+        if mv is None:
+            raise RuntimeError("no active model version")
+        return mv
+
+    def get(self, version: Optional[str] = None) -> ModelVersion:
+        """The named version, or the active one; KeyError for unknown names."""
+        if not version:
+            return self.active
+        return self._versions[version]
+
+    def add(self, mv: ModelVersion, activate: bool = False) -> ModelVersion:
+        with self._lock:
+            self._versions[mv.version] = mv
+            if activate or self._active is None:
+                self._set_active(mv)
+        return mv
+
+    def activate(self, version: str) -> ModelVersion:
+        with self._lock:
+            mv = self._versions[version]
+            self._set_active(mv)
+        return mv
+
+    def _set_active(self, mv: ModelVersion) -> None:
+        if self._active is not mv:
+            self._active = mv
+            self.swaps += 1
+
+    def remove(self, version: str) -> ModelVersion:
+        with self._lock:
+            mv = self._versions[version]
+            if mv is self._active:
+                raise ValueError(f"version {version} is active; activate another one first")
+            del self._versions[version]
+        return mv
+
+    def retire_superseded(self, keep: ModelVersion, protect: Tuple[ModelVersion, ...] = ()) -> List[ModelVersion]:
+        """Remove the other versions loaded from keep's directory (earlier loads of the same
+        artifact set, i.e. what a hot reload replaced) unless active or in protect; versions
+        loaded from their own models/<version>/ directory are never touched."""
+        with self._lock:
+            old = [mv for mv in self._versions.values()
+                   if mv.path == keep.path and mv is not keep and mv is not self._active
+                   and not any(mv is p for p in protect)]
+            for mv in old:
+                del self._versions[mv.version]
+        return old
+
+    def versions(self) -> List[str]:
+        return list(self._versions)
+
+    def info(self) -> Dict[str, Any]:
+        active = self._active
+        return {
+            "active_version": active.version if active is not None else None,
+            "swaps": self.swaps,
+            "versions": [dict(mv.info(), active=mv is active) for mv in list(self._versions.values())],
+        }
+
+class ArtifactWatcher:
+    """Polls a directory's artifact signature; reports a change once it is stable.
+
+    lungcancer.py rewrites several files one after another, so a new signature must be
+    seen on two consecutive polls before it counts (no half-written artifact sets).
+    """
+
+    def __init__(self, path: str, signature: Tuple):
+        self.path = path
+        self.loaded = signature
+        self._pending: Optional[Tuple] = None
+        self.reloads = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+    def poll(self) -> bool:
+        sig = artifact_signature(self.path)
+        if sig == self.loaded:
+            self._pending = None
+            return False
+        if sig != self._pending:
+            self._pending = sig
+            return False
+        return True
+
+    def mark_loaded(self, signature: Tuple) -> None:
+        self.loaded = signature
+        self._pending = None
+        self.reloads += 1
+
+    def mark_failed(self, error: Exception) -> None:
+        # keep serving the old version; retry only after the files change again
+        self.loaded = self._pending
+        self._pending = None
+        self.failures += 1
+        self.last_error = str(error)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"path": self.path, "reloads": self.reloads, "failures": self.failures, "last_error": self.last_error}
+
+class ShadowScorer:
+    """Scores a copy of live traffic with a candidate version in the background.
+
+    Work goes to one daemon thread; when `max_pending` batches are already waiting new
+    ones are dropped rather than queued, so shadowing can never build up memory or
+    slow the primary path.
+    """
+
+    def __init__(self, max_pending: int = 8):
+        self.max_pending = max(1, int(max_pending))
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        self._lock = threading.Lock()
+        self.version: Optional[ModelVersion] = None
+        self._reset()
+
+    def _reset(self) -> None:
+        self.pending = 0
+        self.rows = 0
+        self.batches = 0
+        self.dropped = 0
+        self.errors = 0
+        self.sum_abs_diff = 0.0
+        self.max_abs_diff = 0.0
+        self.sum_primary = 0.0
+        self.sum_shadow = 0.0
+
+    def set_version(self, mv: Optional[ModelVersion]) -> None:
+        with self._lock:
+            self.version = mv
+            self._reset()
+
+    def submit(self, primary: ModelVersion, x: np.ndarray, p_primary: np.ndarray) -> None:
+        mv = self.version
+        if mv is None or mv is primary:
+            return
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.dropped += len(x)
+                return
+            self.pending += 1
+        self._executor.submit(self._run, mv, x.copy(), np.array(p_primary, dtype=float))
+
+    def _run(self, mv: ModelVersion, x: np.ndarray, p_primary: np.ndarray) -> None:
+        try:
+            p = mv.engine.predict_raw(x)
+        except Exception:
+            with self._lock:
+                self.pending -= 1
+                self.errors += 1
+            return
+        d = np.abs(p - p_primary)
+        with self._lock:
+            self.pending -= 1
+            if mv is not self.version:
+                return  # candidate changed while this batch was running
+            self.batches += 1
+            self.rows += len(p)
+            self.sum_abs_diff += float(d.sum())
+            self.max_abs_diff = max(self.max_abs_diff, float(d.max(initial=0.0)))
+            self.sum_primary += float(p_primary.sum())
+            self.sum_shadow += float(p.sum())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            n = self.rows
+            return {
+                "version": self.version.version if self.version is not None else None,
+                "rows": n,
+                "batches": self.batches,
+                "pending": self.pending,
+                "dropped_rows": self.dropped,
+                "errors": self.errors,
+                "mean_abs_diff": self.sum_abs_diff / n if n else None,
+                "max_abs_diff": self.max_abs_diff if n else None,
+                "mean_p_primary": self.sum_primary / n if n else None,
+                "mean_p_shadow": self.sum_shadow / n if n else None,
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
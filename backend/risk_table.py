@@ -0,0 +1,204 @@
+"""
+Exact lookup table for the calibrated model.
+
+Apart from age and pack_years every feature is categorical: 5 binaries x 3 radon
+levels x 3 alcohol levels = 288 combinations. Every tree splits the two numeric
+features at a finite set of float32 thresholds, so for a fixed combination the model
+output is constant on each cell of the grid those thresholds cut the (age, pack_years)
+plane into. The table stores the model's P(y=1) for every (combination, age cell,
+pack_years cell), evaluated at one point inside the cell, which makes a lookup exactly
+equal to `model.predict_proba` for any input.
+
+Build (also: python lungcancer.py --build-table) and verify against the live model:
+  python risk_table.py --build
+  python risk_table.py --verify [--rows 20000]
+"""
+from typing import Any, Dict, Sequence
+import time
+
+import numpy as np
+
+from fused import export_fused
+
+TABLE_FORMAT_VERSION = 1
+
+class RiskTable:
+    """`predict_proba` by table lookup on the engine's encoded float32 rows."""
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.numeric_idx = arrays["numeric_idx"]          # (2,) columns of the two numeric features
+        self.binary_idx = arrays["binary_idx"]            # (5,)
+        self.radon_idx = arrays["radon_idx"]              # (3,) one-hot slots in level order
+        self.alcohol_idx = arrays["alcohol_idx"]          # (3,)
+        self.thresholds = [arrays["thr_0"], arrays["thr_1"]]  # sorted unique float32 split values
+        self.values = arrays["values"]                    # (n_combos, n_cells_0, n_cells_1) float64
+        self.n_features = int(arrays["n_features"])
+
+    @property
+    def n_combos(self) -> int:
+        return self.values.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.values.nbytes)
+
+    @classmethod
+    def load(cls, path: str) -> "RiskTable":
+        with np.load(path, allow_pickle=False) as z:
+            arrays = {k: z[k] for k in z.files}
+        if int(arrays.get("format_version", 0)) != TABLE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported risk table version in {path}")
+        return cls(arrays)
+
+    def combo_index(self, X: np.ndarray) -> np.ndarray:
+        """Categorical part of each encoded row -> combination id."""
+        n_bin = len(self.binary_idx)
+        combo = np.zeros(X.shape[0], dtype=np.int64)
+        for j, c in enumerate(self.binary_idx):
+            combo |= (X[:, c] >= 0.5).astype(np.int64) << j
+        radon = np.argmax(X[:, self.radon_idx], axis=1)
+        alcohol = np.argmax(X[:, self.alcohol_idx], axis=1)
+        return combo + (radon + len(self.radon_idx) * alcohol) * (1 << n_bin)
+
+    def cell_index(self, X: np.ndarray, k: int) -> np.ndarray:
+        """Cell of numeric feature k: xgboost goes left iff x < threshold."""
+        x = np.asarray(X[:, self.numeric_idx[k]], dtype=np.float32)
+        return np.searchsorted(self.thresholds[k], x, side="right")
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32)
+        p1 = self.values[self.combo_index(X), self.cell_index(X, 0), self.cell_index(X, 1)]
+        return np.column_stack([1.0 - p1, p1])
+
+def _cell_points(thr: np.ndarray) -> np.ndarray:
+    """One float32 point per cell: below the first threshold, then each threshold itself."""
+    if len(thr) == 0:
+        return np.zeros(1, dtype=np.float32)
+    return np.concatenate([[thr[0] - np.float32(1.0)], thr]).astype(np.float32)
+
+def build_table(
+    model,
+    feature_order: Sequence[str],
+    numeric_cols: Sequence[str],
+    binary_cols: Sequence[str],
+    radon_levels: Sequence[str],
+    alcohol_levels: Sequence[str],
+    chunk_rows: int = 262144,
+    log=print,
+) -> Dict[str, np.ndarray]:
+    """Evaluate `model` once per (combination, age cell, pack_years cell)."""
+    col = {c: i for i, c in enumerate(feature_order)}
+    numeric_idx = np.array([col[c] for c in numeric_cols], dtype=np.int64)
+    if len(numeric_idx) != 2:
+        raise ValueError("The risk table expects exactly two numeric features")
+    binary_idx = np.array([col[c] for c in binary_cols], dtype=np.int64)
+    radon_idx = np.array([col[f"radon_{l}"] for l in radon_levels], dtype=np.int64)
+    alcohol_idx = np.array([col[f"alcohol_{l}"] for l in alcohol_levels], dtype=np.int64)
+
+    fused = export_fused(model)
+    feat, thr = fused["split_feature"].ravel(), fused["split_threshold"].ravel()
+    real = np.isfinite(thr)  # padded dummy splits carry +inf
+    thresholds = [np.unique(thr[real & (feat == c)]).astype(np.float32) for c in numeric_idx]
+    points = [_cell_points(t) for t in thresholds]
+
+    n_bin = len(binary_idx)
+    n_combos = (1 << n_bin) * len(radon_idx) * len(alcohol_idx)
+    shape = (n_combos, len(points[0]), len(points[1]))
+    log(
+        f"Risk table: {n_combos} combinations x {shape[1]} age cells x {shape[2]} pack_years cells "
+        f"= {np.prod(shape):,} model evaluations ({np.prod(shape) * 8 / 1e6:.1f} MB)"
+    )
+
+    grid = np.empty((shape[1] * shape[2], len(feature_order)), dtype=np.float32)
+    g0, g1 = np.meshgrid(points[0], points[1], indexing="ij")
+    values = np.empty(shape, dtype=np.float64)
+    combos_per_chunk = max(1, chunk_rows // len(grid))
+    t0 = time.perf_counter()
+    for start in range(0, n_combos, combos_per_chunk):
+        ids = range(start, min(start + combos_per_chunk, n_combos))
+        X = np.concatenate([_combo_grid(grid, c, g0, g1, numeric_idx, binary_idx, radon_idx, alcohol_idx) for c in ids])
+        values[start:start + len(ids)] = model.predict_proba(X)[:, 1].reshape(len(ids), shape[1], shape[2])
+    log(f"Risk table built in {time.perf_counter() - t0:.1f}s")
+
+    return {
+        "format_version": np.array(TABLE_FORMAT_VERSION, dtype=np.int32),
+        "n_features": np.array(len(feature_order), dtype=np.int32),
+        "numeric_idx": numeric_idx,
+        "binary_idx": binary_idx,
+        "radon_idx": radon_idx,
+        "alcohol_idx": alcohol_idx,
+        "thr_0": thresholds[0],
+        "thr_1": thresholds[1],
+        "values": values,
+    }
+
+def _combo_grid(grid, combo, g0, g1, numeric_idx, binary_idx, radon_idx, alcohol_idx) -> np.ndarray:
+    n_bin = len(binary_idx)
+    grid.fill(0.0)
+    grid[:, numeric_idx[0]] = g0.ravel()
+    grid[:, numeric_idx[1]] = g1.ravel()
+    for j, c in enumerate(binary_idx):
+        grid[:, c] = (combo >> j) & 1
+    cat = combo >> n_bin
+    grid[:, radon_idx[cat % len(radon_idx)]] = 1.0
+    grid[:, alcohol_idx[cat // len(radon_idx)]] = 1.0
+    return grid.copy()
+
+def save_table(arrays: Dict[str, np.ndarray], path: str) -> None:
+    with open(path, "wb") as f:
+        np.savez_compressed(f, **arrays)
+
+def verify_table(table: RiskTable, model, engine, radon_levels, alcohol_levels,
+                 n_rows: int = 20000, seed: int = 0) -> Dict[str, Any]:
+    """Random parsed inputs through the engine; table lookup must equal the live model."""
+    from inference import random_parsed_rows
+
+    X = engine.encode_batch(random_parsed_rows(n_rows, radon_levels, alcohol_levels, seed=seed)).copy()
+    # also probe exactly at and just below every threshold
+    rng = np.random.default_rng(seed)
+    probes = []
+    for k in range(2):
+        for t in table.thresholds[k]:
+            for v in (t, np.nextafter(t, np.float32(-np.inf))):
+                row = X[rng.integers(0, len(X))].copy()
+                row[table.numeric_idx[k]] = v
+                probes.append(row)
+    if probes:
+        X = np.vstack([X, np.asarray(probes, dtype=np.float32)])
+    ref = model.predict_proba(X)[:, 1]
+    got = table.predict_proba(X)[:, 1]
+    return {
+        "rows": int(len(X)),
+        "mismatches": int(np.count_nonzero(ref != got)),
+        "max_abs_diff": float(np.max(np.abs(ref - got))) if len(X) else 0.0,
+    }
+
+if __name__ == "__main__":
+    import argparse, json, os, sys
+    import joblib
+
+    from compact import file_digest, stamp_digest
+    from inference import InferenceEngine
+
+    ap = argparse.ArgumentParser(description="Build / verify the exact risk lookup table.")
+    ap.add_argument("--build", action="store_true", help="(re)build risk_table.npz from model.pkl")
+    ap.add_argument("--verify", action="store_true", help="compare the table with model.predict_proba")
+    ap.add_argument("--rows", type=int, default=20000)
+    args = ap.parse_args()
+
+    base = os.path.dirname(os.path.abspath(__file__))
+    path = os.path.join(base, "risk_table.npz")
+    with open(os.path.join(base, "meta.json")) as f:
+        meta = json.load(f)
+    model_path = os.path.join(base, "model.pkl")
+    model = joblib.load(model_path)
+    schema = (meta["feature_order"], meta["numeric_cols"], meta["binary_cols"], meta["radon_levels"], meta["alcohol_levels"])
+
+    if args.build or not os.path.exists(path):
+        save_table(stamp_digest(build_table(model, *schema), file_digest(model_path)), path)
+        print(f"✅ Saved: {path}")
+    if args.verify:
+        engine = InferenceEngine(model, joblib.load(os.path.join(base, "scaler.pkl")), *schema)
+        report = verify_table(RiskTable.load(path), model, engine, meta["radon_levels"], meta["alcohol_levels"], args.rows)
+        print(json.dumps(report, indent=2))
+        sys.exit(0 if report["mismatches"] == 0 else 1)
@@ -0,0 +1,208 @@
+r"""
+Bulk scoring of large CSV / Parquet files with bounded memory.
+
+The input is streamed in chunks; each chunk goes through the training encoders
+(lungcancer.encode_features: the encoding.py lookup tables applied once per
+distinct value), the saved scaler.pkl and model.pkl, the optional prevalence
+adjustment, and is appended to the output right away. Only `--workers * 2` chunks
+are ever in flight, so memory does not depend on the file size.
+
+Output columns: any --keep columns (e.g. patient_id), then
+  risk_raw, risk_adjusted (only with --pi-deploy), risk_percentage,
+  shap_<input> per user-facing input (only with --explain; TreeSHAP log-odds, see explain.py)
+
+Run:
+  python score.py registry.csv scores.csv
+  python score.py registry.parquet scores.parquet --pi-deploy 0.002 --workers 4 --keep patient_id
+  python score.py registry.csv explained.csv --explain
+"""
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from typing import Iterator, List, Optional
+import argparse
+import json
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from inference import prior_adjust_array
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SCALER_PATH = os.path.join(BASE_DIR, "scaler.pkl")
+MODEL_PATH = os.path.join(BASE_DIR, "model.pkl")
+EXPLAIN_PATH = os.path.join(BASE_DIR, "model_explain.npz")
+META_PATH = os.path.join(BASE_DIR, "meta.json")
+
+# -------------------
+# Scoring (one copy of the artifacts per process)
+# -------------------
+_state = {}
+
+def _load_artifacts(n_threads: Optional[int] = None, explain: bool = False) -> None:
+    if _state:
+        if explain and "explainer" not in _state:
+            _state["explainer"] = _load_explainer()
+        return
+    import lungcancer  # training encoders (imports sklearn/xgboost)
+
+    model = joblib.load(MODEL_PATH)
+    if n_threads:
+        for cc in getattr(model, "calibrated_classifiers_", []):
+            cc.estimator.set_params(n_jobs=n_threads)
+    meta = {}
+    if os.path.exists(META_PATH):
+        with open(META_PATH) as f:
+            meta = json.load(f)
+    _state.update(
+        encode=lungcancer.encode_features,
+        scaler=joblib.load(SCALER_PATH),
+        model=model,
+        feature_order=meta.get("feature_order") or lungcancer.NUMERIC_COLS + lungcancer.BINARY_COLS
+        + [f"radon_{l}" for l in lungcancer.RADON_LEVELS] + [f"alcohol_{l}" for l in lungcancer.ALCOHOL_LEVELS],
+        numeric_cols=meta.get("numeric_cols", lungcancer.NUMERIC_COLS),
+        pi_train=meta.get("pi_train"),
+    )
+    if explain:
+        _state["explainer"] = _load_explainer()
+
+def _load_explainer():
+    from compact import built_from, file_digest
+    from explain import TreeShapExplainer
+
+    if not built_from(EXPLAIN_PATH, file_digest(MODEL_PATH)):
+        raise FileNotFoundError("--explain needs an up-to-date model_explain.npz (run: python explain.py --build)")
+    return TreeShapExplainer.load(EXPLAIN_PATH)
+
+def score_chunk(df: pd.DataFrame, pi_deploy: Optional[float], keep: List[str], explain: bool = False) -> pd.DataFrame:
+    _load_artifacts(explain=explain)
+    s = _state
+    X = s["encode"](df)
+    X[s["numeric_cols"]] = s["scaler"].transform(X[s["numeric_cols"]])
+    x = X[s["feature_order"]].to_numpy(np.float32)
+    p_raw = np.clip(s["model"].predict_proba(x)[:, 1], 1e-12, 1.0 - 1e-12)
+
+    out = pd.DataFrame({c: df[c].to_numpy() for c in keep})
+    out["risk_raw"] = p_raw
+    p_main = p_raw
+    if pi_deploy is not None:
+        if s["pi_train"] is None:
+            raise ValueError("--pi-deploy needs pi_train in meta.json")
+        p_main = prior_adjust_array(p_raw, float(s["pi_train"]), pi_deploy)
+        out["risk_adjusted"] = p_main
+    out["risk_percentage"] = np.round(np.clip(p_main, 0.0, 0.9999) * 100.0, 2)
+    if explain:
+        contrib = s["explainer"].contributions(x)
+        for j, name in enumerate(s["explainer"].input_names):
+            out[f"shap_{name}"] = contrib[:, j]
+    return out
+
+def _init_worker(n_threads: int, explain: bool) -> None:
+    _load_artifacts(n_threads, explain)
+
+# -------------------
+# Streaming I/O
+# -------------------
+def _fmt(path: str, override: Optional[str]) -> str:
+    if override:
+        return override
+    return "parquet" if path.lower().endswith((".parquet", ".pq")) else "csv"
+
+def iter_chunks(path: str, fmt: str, chunksize: int) -> Iterator[pd.DataFrame]:
+    if fmt == "parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Parquet needs pyarrow: pip install pyarrow") from e
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize)
+
+class ChunkWriter:
+    def __init__(self, path: str, fmt: str):
+        self.path, self.fmt = path, fmt
+        self._pq_writer = None
+        self._first = True
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self.fmt == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._pq_writer is None:
+                self._pq_writer = pq.ParquetWriter(self.path, table.schema)
+            self._pq_writer.write_table(table)
+        else:
+            df.to_csv(self.path, mode="w" if self._first else "a", header=self._first, index=False)
+        self._first = False
+
+    def close(self) -> None:
+        if self._pq_writer is not None:
+            self._pq_writer.close()
+        elif self._first and self.fmt == "csv":
+            open(self.path, "w").close()
+
+def score_file(src: str, dst: str, chunksize: int = 100_000, pi_deploy: Optional[float] = None,
+               workers: int = 1, keep: Optional[List[str]] = None,
+               in_fmt: Optional[str] = None, out_fmt: Optional[str] = None, explain: bool = False) -> int:
+    keep = keep or []
+    writer = ChunkWriter(dst, _fmt(dst, out_fmt))
+    chunks = iter_chunks(src, _fmt(src, in_fmt), chunksize)
+    n_rows, t0 = 0, time.perf_counter()
+
+    def log(n):
+        dt = time.perf_counter() - t0
+        print(f"scored {n:,} rows ({n / max(dt, 1e-9):,.0f} rows/s)", flush=True)
+
+    try:
+        if workers <= 1:
+            for df in chunks:
+                writer.write(score_chunk(df, pi_deploy, keep, explain))
+                n_rows += len(df)
+                log(n_rows)
+        else:
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(threads, explain)) as pool:
+                pending = deque()
+                for df in chunks:
+                    pending.append(pool.submit(score_chunk, df, pi_deploy, keep, explain))
+                    # bounded in-flight work; results are written in input order
+                    while len(pending) >= 2 * workers:
+                        out = pending.popleft().result()
+                        writer.write(out)
+                        n_rows += len(out)
+                        log(n_rows)
+                while pending:
+                    out = pending.popleft().result()
+                    writer.write(out)
+                    n_rows += len(out)
+                    log(n_rows)
+    finally:
+        writer.close()
+    return n_rows
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Stream-score a CSV/Parquet file with the saved model.")
+    ap.add_argument("input")
+    ap.add_argument("output")
+    ap.add_argument("--chunksize", type=int, default=100_000)
+    ap.add_argument("--pi-deploy", type=float, default=None, help="deployment prevalence (0..1) for prior adjustment")
+    ap.add_argument("--workers", type=int, default=1, help="process pool size (model loaded once per worker)")
+    ap.add_argument("--keep", default="", help="comma-separated input columns copied to the output")
+    ap.add_argument("--input-format", choices=["csv", "parquet"], default=None)
+    ap.add_argument("--output-format", choices=["csv", "parquet"], default=None)
+    ap.add_argument("--explain", action="store_true", help="add shap_<input> TreeSHAP columns (model_explain.npz)")
+    args = ap.parse_args()
+
+    if args.pi_deploy is not None and not (0.0 < args.pi_deploy < 1.0):
+        sys.exit("--pi-deploy must be in (0, 1)")
+    n = score_file(
+        args.input, args.output, args.chunksize, args.pi_deploy, args.workers,
+        [c for c in args.keep.split(",") if c], args.input_format, args.output_format, args.explain,
+    )
+    print(f"✅ Wrote {n:,} rows to {args.output}", flush=True)
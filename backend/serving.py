@@ -0,0 +1,176 @@
+"""
+Serving configuration: uvicorn workers x inference threads x booster threads, sized to the CPU budget.
+
+xgboost's predict_proba runs OpenMP over every core it can see, while each worker scores
+several requests at once; in a container with a CPU quota that multiplies into many more
+runnable threads than CPUs and the p99 latency goes with it. The three settings are
+chosen together so that workers x inference_threads x booster_threads stays near the budget:
+
+- cpu budget: min(CPU affinity, cgroup quota) -- cgroup v2 cpu.max, v1 cpu.cfs_quota_us /
+  cpu.cfs_period_us; a fractional quota counts as one CPU
+- workers: 1 by default. The registry (/models/activate, /models/load, /models/unload),
+  /cache/invalidate, /admin/profile, the /metrics counters and the drift monitor are all
+  state of one process: with several workers an admin call only reaches the worker that
+  happens to receive it, and every scrape of /metrics or /monitor/drift sees a different
+  worker's numbers. More CPUs go to the inference pool and the booster threads instead;
+  SERVING_WORKERS > 1 (or a tuned config, see benchmarks/tune_serving.py --max-workers)
+  is for deployments that accept that, e.g. a fixed model with hot reload as the only
+  way to change it (every worker watches the artifact directory on its own)
+- inference_threads: size of each worker's fixed inference pool; app.py runs every scoring
+  call there instead of on the shared anyio threadpool (up to 40 threads); 2 by default
+- booster_threads: xgboost nthread (and OMP/BLAS threads) for model.pkl predictions, i.e.
+  big batches, PREDICTOR=model and the sweep fallback; the fused / table kernels are
+  single-threaded NumPy either way. Default: the CPUs divided among the inference threads
+
+Precedence: environment (SERVING_WORKERS, INFERENCE_THREADS, BOOSTER_THREADS; BOOSTER_THREADS=0
+keeps xgboost's all-cores default) > serving_config.json written by benchmarks/tune_serving.py,
+when it was tuned for the same CPU budget > the defaults above.
+
+  python serving.py                                   # detected budget + resolved config
+  python serving.py --serve [--host 0.0.0.0] [--port 8000]   # uvicorn with that config
+"""
+from typing import Any, Dict, Optional, Tuple
+import argparse
+import json
+import math
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_PATH = os.getenv("SERVING_CONFIG") or os.path.join(BASE_DIR, "serving_config.json")
+DEFAULT_INFERENCE_THREADS = 2  # one long batch does not hold up the single-row requests behind it
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def cgroup_cpu_quota() -> Optional[float]:
+    """CPUs allowed by the cgroup CPU quota (None: no quota or no cgroup fs)."""
+    v2 = _read("/sys/fs/cgroup/cpu.max")
+    if v2:
+        quota, _, period = v2.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+    for root in ("/sys/fs/cgroup/cpu", "/sys/fs/cgroup/cpu,cpuacct"):
+        quota, period = _read(f"{root}/cpu.cfs_quota_us"), _read(f"{root}/cpu.cfs_period_us")
+        if quota and period and int(quota) > 0:
+            return int(quota) / int(period)
+    return None
+
+def cpu_budget() -> Tuple[int, Dict[str, Any]]:
+    """(whole CPUs this process may use, how that was derived)."""
+    try:
+        affinity = len(os.sched_getaffinity(0))
+    except AttributeError:  # not on Linux
+        affinity = os.cpu_count() or 1
+    quota = cgroup_cpu_quota()
+    cpus = affinity if quota is None else max(1, min(affinity, math.ceil(quota - 1e-9)))
+    return cpus, {"cpu_count": os.cpu_count(), "affinity": affinity, "cgroup_quota": quota, "cpus": cpus}
+
+class ServingConfig:
+    def __init__(self, workers: int, inference_threads: int, booster_threads: int, cpus: int,
+                 source: str, detected: Optional[Dict[str, Any]] = None):
+        self.workers = max(1, int(workers))
+        self.inference_threads = max(1, int(inference_threads))
+        self.booster_threads = max(0, int(booster_threads))  # 0: library default (all cores)
+        self.cpus = cpus
+        self.source = source
+        self.detected = detected or {}
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "inference_threads": self.inference_threads,
+            "booster_threads": self.booster_threads,
+            "cpus": self.cpus,
+            "source": self.source,
+            "detected": self.detected,
+        }
+
+    def env(self) -> Dict[str, str]:
+        """Variables a worker process needs (set before numpy / xgboost start their thread pools)."""
+        env = {v: str(self.booster_threads) for v in THREAD_ENV_VARS} if self.booster_threads else {}
+        env.update(SERVING_WORKERS=str(self.workers), INFERENCE_THREADS=str(self.inference_threads),
+                   BOOSTER_THREADS=str(self.booster_threads))
+        return env
+
+def default_config(cpus: int) -> Tuple[int, int, int]:
+    # one worker: admin and monitoring state is per process (see above)
+    return 1, DEFAULT_INFERENCE_THREADS, max(1, cpus // DEFAULT_INFERENCE_THREADS)
+
+def _env_int(name: str) -> Optional[int]:
+    value = os.getenv(name, "").strip()
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+def resolve(config_path: str = CONFIG_PATH) -> ServingConfig:
+    cpus, detected = cpu_budget()
+    workers, threads, booster = default_config(cpus)
+    source = "default"
+    tuned = _read(config_path)
+    if tuned:
+        try:
+            cfg = json.loads(tuned)
+            if int(cfg.get("cpus", -1)) == cpus:
+                workers, threads, booster = cfg["workers"], cfg["inference_threads"], cfg["booster_threads"]
+                source = "tuned"
+        except (ValueError, KeyError, TypeError):
+            pass
+    overrides = {k: _env_int(k) for k in ("SERVING_WORKERS", "INFERENCE_THREADS", "BOOSTER_THREADS")}
+    if any(v is not None for v in overrides.values()):
+        source = "env" if source == "default" else f"{source}+env"
+    for name, value in overrides.items():
+        if value is not None:
+            if name == "SERVING_WORKERS":
+                workers = value
+            elif name == "INFERENCE_THREADS":
+                threads = value
+            else:
+                booster = value
+    return ServingConfig(workers, threads, booster, cpus, source, detected)
+
+def apply_thread_env(cfg: ServingConfig) -> None:
+    """OMP / BLAS thread counts for this process, unless already set (only effective before they load)."""
+    if not cfg.booster_threads:
+        return
+    for var in THREAD_ENV_VARS:
+        os.environ.setdefault(var, str(cfg.booster_threads))
+
+def set_booster_threads(model, n_threads: int) -> None:
+    """xgboost nthread of every fold booster of a CalibratedClassifierCV (or a bare XGBClassifier)."""
+    folds = getattr(model, "calibrated_classifiers_", None)
+    estimators = [cc.estimator for cc in folds] if folds is not None else [model]
+    for est in estimators:
+        if hasattr(est, "get_booster"):
+            est.set_params(n_jobs=n_threads)  # forwarded to the booster's nthread
+
+def serve(cfg: ServingConfig, host: str, port: int, **kw) -> None:
+    import uvicorn
+
+    os.environ.update(cfg.env())
+    print(f"Serving with {json.dumps(cfg.as_dict())}", flush=True)
+    if cfg.workers > 1:
+        print(f"{cfg.workers} workers: /models/*, /cache/invalidate, /admin/profile, /metrics and /monitor/drift "
+              "act on / report one worker per request", flush=True)
+    uvicorn.run("app:app", host=host, port=port, workers=cfg.workers, app_dir=BASE_DIR, **kw)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Resolve (and optionally serve with) the worker/thread configuration.")
+    ap.add_argument("--serve", action="store_true", help="start uvicorn app:app with the resolved configuration")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8000)
+    args = ap.parse_args()
+
+    cfg = resolve()
+    if not args.serve:
+        json.dump(cfg.as_dict(), sys.stdout, indent=2)
+        print()
+        raise SystemExit(0)
+    serve(cfg, args.host, args.port)
@@ -0,0 +1,38 @@
+"""
+Shared fixtures. The backend modules use flat imports (`from inference import ...`), so the
+backend directory goes on sys.path. scaler.pkl and meta.json are committed; model.pkl and the
+compiled artifacts are not (run `python lungcancer.py` first), so tests that need them skip.
+
+Run:
+  python -m pytest -q backend/tests
+"""
+import json
+import os
+import sys
+
+import joblib
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+@pytest.fixture(scope="session")
+def base_dir() -> str:
+    return BASE_DIR
+
+@pytest.fixture(scope="session")
+def meta():
+    with open(os.path.join(BASE_DIR, "meta.json")) as f:
+        return json.load(f)
+
+@pytest.fixture(scope="session")
+def scaler():
+    return joblib.load(os.path.join(BASE_DIR, "scaler.pkl"))
+
+@pytest.fixture(scope="session")
+def model():
+    path = os.path.join(BASE_DIR, "model.pkl")
+    if not os.path.exists(path):
+        pytest.skip("model.pkl not found (run: python lungcancer.py)")
+    return joblib.load(path)
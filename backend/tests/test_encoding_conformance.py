@@ -0,0 +1,44 @@
+"""Fuzzed raw rows through the reference encoding, the trainer and the API: identical model inputs
+(see encoding.check_conformance). Needs only the committed scaler.pkl / meta.json."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import lungcancer
+from encoding import FIELDS, fuzz_records, parse_record, parse_records, reference_features
+from inference import InferenceEngine
+
+N_ROWS = 5000
+
+@pytest.fixture(scope="module")
+def engine(scaler, meta):
+    return InferenceEngine(None, scaler, meta["feature_order"], meta["numeric_cols"], meta["binary_cols"],
+                           meta["radon_levels"], meta["alcohol_levels"])
+
+def _scaled(x: pd.DataFrame, scaler, feature_order) -> np.ndarray:
+    x = x.copy()
+    x[lungcancer.NUMERIC_COLS] = scaler.transform(x[lungcancer.NUMERIC_COLS])
+    return x[feature_order].to_numpy(dtype=np.float32)
+
+def _differing_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    assert a.shape == b.shape
+    return np.flatnonzero(np.any(a.view(np.uint32) != b.view(np.uint32), axis=1))
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_trainer_and_api_match_reference(seed, engine, scaler):
+    records = fuzz_records(N_ROWS, seed)
+    # a DataFrame column per input, as read_raw_csv hands it over
+    df = pd.DataFrame({f: pd.Series([r[f] for r in records], dtype=object) for f in FIELDS})
+    x_ref = _scaled(reference_features(df), scaler, engine.feature_order)
+
+    x_train = _scaled(lungcancer.encode_features(df), scaler, engine.feature_order)
+    bad = _differing_rows(x_ref, x_train)
+    assert not len(bad), [records[i] for i in bad[:5]]
+
+    x_batch = engine.encode_batch(parse_records(records)).copy()
+    bad = _differing_rows(x_ref, x_batch)
+    assert not len(bad), [records[i] for i in bad[:5]]
+
+    x_single = np.vstack([engine.encode_row(parse_record(r)).copy() for r in records[:1000]])
+    bad = _differing_rows(x_ref[:1000], x_single)
+    assert not len(bad), [records[i] for i in bad[:5]]
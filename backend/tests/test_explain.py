@@ -0,0 +1,28 @@
+"""Compiled TreeSHAP tables vs xgboost's native pred_contribs, and the latency budget
+(1,000 rows under 1 s), see explain.check_explainer. Skipped without model.pkl /
+a model_explain.npz built from it (run: python lungcancer.py --compile-only)."""
+import os
+
+import pytest
+
+from compact import built_from, file_digest
+from explain import TreeShapExplainer, check_explainer
+from inference import InferenceEngine, random_parsed_rows
+
+N_ROWS = 1000
+BUDGET_SECONDS = 1.0
+
+@pytest.fixture(scope="module")
+def explainer(base_dir, model):
+    path = os.path.join(base_dir, "model_explain.npz")
+    if not built_from(path, file_digest(os.path.join(base_dir, "model.pkl"))):
+        pytest.skip("model_explain.npz missing or built from another model.pkl (run: python lungcancer.py --compile-only)")
+    return TreeShapExplainer.load(path)
+
+def test_explainer_matches_native_within_budget(explainer, model, scaler, meta):
+    cols = (meta["feature_order"], meta["numeric_cols"], meta["binary_cols"])
+    engine = InferenceEngine(model, scaler, *cols, meta["radon_levels"], meta["alcohol_levels"])
+    X = engine.encode_batch(random_parsed_rows(N_ROWS, meta["radon_levels"], meta["alcohol_levels"])).copy()
+    report = check_explainer(explainer, model, X, *cols, budget_seconds=BUDGET_SECONDS)
+    assert report["matches_native"], report
+    assert report["within_budget"], report
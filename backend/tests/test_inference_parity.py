@@ -0,0 +1,18 @@
+"""InferenceEngine (NumPy) vs the legacy DataFrame + scaler.transform path, see inference.check_parity."""
+from inference import InferenceEngine, check_parity
+
+def _engine(model, scaler, meta) -> InferenceEngine:
+    return InferenceEngine(model, scaler, meta["feature_order"], meta["numeric_cols"], meta["binary_cols"],
+                           meta["radon_levels"], meta["alcohol_levels"])
+
+def test_features_match_dataframe_path(scaler, meta):
+    report = check_parity(_engine(None, scaler, meta), scaler, meta["radon_levels"], meta["alcohol_levels"], 5000)
+    assert report["features_equal"], report
+    assert report["single_row_equal"], report
+    assert report["predictions_equal"] is None
+
+def test_predictions_match_dataframe_path(model, scaler, meta):
+    report = check_parity(_engine(model, scaler, meta), scaler, meta["radon_levels"], meta["alcohol_levels"], 5000)
+    assert report["features_equal"], report
+    assert report["single_row_equal"], report
+    assert report["predictions_equal"], report
@@ -0,0 +1,212 @@
+"""
+Persisted encoded training data for incremental retraining (lungcancer.py --incremental).
+
+The store keeps every CSV row that has been trained on, already encoded (unscaled, in
+FEATURE_ORDER) together with its label, its train/test assignment and its calibration
+fold, so a retrain only parses the rows that arrived since the last one:
+
+  .train_cache/store/
+    state.json          CSV byte offset + SHA-1 of the bytes up to it, row count, schema key,
+                        model digest, full-train timings, run history
+    chunk-00000.npz     X (float64), y (int8), test (bool), fold (int8, -1 = test row),
+    chunk-00001.npz     row_hash (uint64)  -- one chunk per ingest, append-only
+    scaler_running.pkl  StandardScaler updated with partial_fit on every ingested training row
+
+New rows are found by file offset when the CSV only grew (the bytes before the stored
+offset still hash the same): only the tail is read. When the file was rewritten the
+whole CSV is read, encoded and compared by row hash (encoded values + label) as a
+multiset: a row that appears k times is new from its (k+1)-th occurrence on; stored rows
+missing from the file are counted but stay in the store.
+"""
+from typing import Any, Dict, List, Tuple
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+STORE_FORMAT_VERSION = 1
+
+def sha1_prefix(path: str, nbytes: int) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        left = nbytes
+        while left > 0:
+            block = f.read(min(1 << 20, left))
+            if not block:
+                break
+            h.update(block)
+            left -= len(block)
+    return h.hexdigest()
+
+def complete_rows_end(path: str) -> int:
+    """Byte offset just past the last newline: a row still being appended is left for the next run."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        pos = size
+        while pos > 0:
+            step = min(1 << 16, pos)
+            f.seek(pos - step)
+            block = f.read(step)
+            nl = block.rfind(b"\n")
+            if nl >= 0:
+                return pos - step + nl + 1
+            pos -= step
+    return 0
+
+def row_hashes(X: np.ndarray, y) -> np.ndarray:
+    """uint64 per encoded row + label: how the CSV spells a value ("79" / "79.0", "Yes" / "yes") does not matter."""
+    import pandas as pd
+
+    M = np.column_stack([np.asarray(X, dtype=np.float64), np.asarray(y, dtype=np.float64)])
+    return pd.util.hash_pandas_object(pd.DataFrame(M), index=False).to_numpy(dtype=np.uint64)
+
+def _occurrence(h: np.ndarray) -> np.ndarray:
+    """0 for the first row with a given hash, 1 for the second, ... (in row order)."""
+    order = np.argsort(h, kind="stable")
+    hs = h[order]
+    starts = np.r_[0, np.flatnonzero(hs[1:] != hs[:-1]) + 1]
+    run_start = np.repeat(starts, np.diff(np.r_[starts, len(hs)]))
+    occ = np.empty(len(h), dtype=np.int64)
+    occ[order] = np.arange(len(hs)) - run_start
+    return occ
+
+def _count_of(keys: np.ndarray, uniq: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """counts of each key in (uniq, counts) from np.unique; 0 for keys not in uniq."""
+    if not len(uniq):
+        return np.zeros(len(keys), dtype=np.int64)
+    pos = np.minimum(np.searchsorted(uniq, keys), len(uniq) - 1)
+    return np.where(uniq[pos] == keys, counts[pos], 0)
+
+def assign_split(y: np.ndarray, test_size: float, n_folds: int, seed) -> Tuple[np.ndarray, np.ndarray]:
+    """Stratified test flags and calibration folds (-1 for test rows) for newly arrived rows."""
+    rng = np.random.default_rng(seed)
+    test = np.zeros(len(y), dtype=bool)
+    fold = np.full(len(y), -1, dtype=np.int8)
+    for cls in np.unique(y):
+        idx = rng.permutation(np.flatnonzero(y == cls))
+        n_test = int(round(test_size * len(idx)))
+        test[idx[:n_test]] = True
+        rest = idx[n_test:]
+        fold[rest] = (int(rng.integers(0, n_folds)) + np.arange(len(rest))) % n_folds
+    return test, fold
+
+class EncodedStore:
+    def __init__(self, root: str):
+        self.root = root
+        self.state_path = os.path.join(root, "state.json")
+        self.scaler_path = os.path.join(root, "scaler_running.pkl")
+        self.state: Dict[str, Any] = {}
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                self.state = json.load(f)
+
+    def exists(self) -> bool:
+        return bool(self.state) and self.state.get("format_version") == STORE_FORMAT_VERSION
+
+    @property
+    def rows(self) -> int:
+        return int(self.state.get("rows", 0))
+
+    # ----- writing -----
+    def _write_chunk(self, X: np.ndarray, y, test, fold, hashes) -> str:
+        name = f"chunk-{len(self.state.get('chunks', [])):05d}.npz"
+        tmp = os.path.join(self.root, name + ".tmp.npz")
+        np.savez(tmp, X=np.asarray(X, dtype=np.float64), y=np.asarray(y, dtype=np.int8),
+                 test=np.asarray(test, dtype=bool), fold=np.asarray(fold, dtype=np.int8),
+                 row_hash=np.asarray(hashes, dtype=np.uint64))
+        os.replace(tmp, os.path.join(self.root, name))
+        return name
+
+    def save_state(self) -> None:
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp, self.state_path)
+
+    def create(self, csv_path: str, offset: int, schema_key: str, feature_order: List[str],
+               X: np.ndarray, y, test, fold, hashes, scaler_running, **meta) -> None:
+        """A new store holding the rows of a full training run (replaces an existing one); meta goes into state.json."""
+        import joblib
+
+        os.makedirs(self.root, exist_ok=True)
+        for name in os.listdir(self.root):
+            if name.startswith("chunk-"):
+                os.remove(os.path.join(self.root, name))
+        self.state = {"format_version": STORE_FORMAT_VERSION, "created_at": time.time(), "chunks": []}
+        self.state["chunks"].append(self._write_chunk(X, y, test, fold, hashes))
+        self.state.update(csv_path=os.path.abspath(csv_path), offset=int(offset),
+                          prefix_sha1=sha1_prefix(csv_path, offset), rows=int(len(y)),
+                          schema_key=schema_key, feature_order=list(feature_order), runs=[], **meta)
+        joblib.dump(scaler_running, self.scaler_path)
+        self.save_state()
+
+    def append(self, csv_path: str, offset: int, X: np.ndarray, y, test, fold, hashes, scaler_running) -> None:
+        import joblib
+
+        self.state["chunks"].append(self._write_chunk(X, y, test, fold, hashes))
+        self.state.update(csv_path=os.path.abspath(csv_path), offset=int(offset),
+                          prefix_sha1=sha1_prefix(csv_path, offset), rows=self.rows + int(len(y)))
+        joblib.dump(scaler_running, self.scaler_path)
+        self.save_state()
+
+    def record_run(self, run: Dict[str, Any]) -> None:
+        self.state.setdefault("runs", []).append(run)
+        self.save_state()
+
+    # ----- reading -----
+    def load(self) -> Dict[str, np.ndarray]:
+        parts: Dict[str, List[np.ndarray]] = {k: [] for k in ("X", "y", "test", "fold", "row_hash")}
+        for name in self.state["chunks"]:
+            with np.load(os.path.join(self.root, name), allow_pickle=False) as z:
+                for k in parts:
+                    parts[k].append(z[k])
+        return {k: np.concatenate(v) for k, v in parts.items()}
+
+    def scaler_running(self):
+        import joblib
+
+        return joblib.load(self.scaler_path)
+
+    def pending(self, csv_path: str, load_span) -> Dict[str, Any]:
+        """Rows of csv_path not in the store yet, encoded.
+
+        load_span(path, start, end) -> (X, y): encoded rows in that byte span of the file
+        (start=0: the whole file including its header). Only newline-terminated rows count.
+        Returns {"mode": "offset" | "row_hash", "X", "y", "row_hash", "offset", "missing"}
+        (X/y None when there is nothing new).
+        """
+        end = complete_rows_end(csv_path)
+        offset = int(self.state["offset"])
+        same_file = os.path.abspath(csv_path) == self.state.get("csv_path")
+        if same_file and end >= offset and sha1_prefix(csv_path, offset) == self.state["prefix_sha1"]:
+            if end == offset:
+                return {"mode": "offset", "X": None, "y": None, "row_hash": None, "offset": end, "missing": 0}
+            X, y = load_span(csv_path, offset, end)
+            return {"mode": "offset", "X": X, "y": y, "row_hash": row_hashes(X, y), "offset": end, "missing": 0}
+
+        # rewritten (or another) file: multiset difference by row hash
+        X, y = load_span(csv_path, 0, end)
+        h = row_hashes(X, y)
+        stored, stored_counts = np.unique(self.load()["row_hash"], return_counts=True)
+        in_file, file_counts = np.unique(h, return_counts=True)
+        new = _occurrence(h) >= _count_of(h, stored, stored_counts)
+        missing = int(np.maximum(stored_counts - _count_of(stored, in_file, file_counts), 0).sum())
+        if not new.any():
+            return {"mode": "row_hash", "X": None, "y": None, "row_hash": None, "offset": end, "missing": missing}
+        return {"mode": "row_hash", "X": X[new], "y": np.asarray(y)[new], "row_hash": h[new],
+                "offset": end, "missing": missing}
+
+    def scaler_drift(self, scaler) -> Dict[str, Dict[str, float]]:
+        """Running vs frozen (serving) scaler per numeric column: mean shift in frozen std units, std ratio."""
+        run = self.scaler_running()
+        names = [str(c) for c in getattr(scaler, "feature_names_in_", range(len(scaler.mean_)))]
+        return {
+            name: {
+                "mean_shift_std": float((run.mean_[j] - scaler.mean_[j]) / scaler.scale_[j]),
+                "std_ratio": float(run.scale_[j] / scaler.scale_[j]),
+                "rows_seen": int(np.max(run.n_samples_seen_)),
+            }
+            for j, name in enumerate(names)
+        }